@@ -0,0 +1,43 @@
+import io
+import zipfile
+
+from context_ai.config import settings
+from context_ai.ingest.sources import archive_sources
+
+
+def _archive(names):
+    buf = io.BytesIO()
+    with zipfile.ZipFile(buf, "w") as zf:
+        for name in names:
+            zf.writestr(name, b"x")
+    return zipfile.ZipFile(buf)
+
+
+def test_archive_sources_keeps_text_members_and_skips_binaries(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "ingest_skip_dirs", "node_modules,.git")
+    zf = _archive([
+        "repo-abc/README.markdown",
+        "repo-abc/notes.txt",
+        "repo-abc/config.yml",
+        "repo-abc/src/App.tsx",
+        "repo-abc/src/main.go",
+        "repo-abc/Makefile",
+        "repo-abc/docs/guide.pdf",
+        "repo-abc/assets/logo.PNG",
+        "repo-abc/model.onnx",
+        "repo-abc/node_modules/lib/index.js",
+    ])
+
+    sources = archive_sources(zf, "github://o/r", str(tmp_path))
+
+    assert sorted(s.source_path for s in sources) == [
+        "github://o/r/Makefile",
+        "github://o/r/README.markdown",
+        "github://o/r/config.yml",
+        "github://o/r/docs/guide.pdf",
+        "github://o/r/notes.txt",
+        "github://o/r/src/App.tsx",
+        "github://o/r/src/main.go",
+    ]
+    only_go = archive_sources(zf, "github://o/r", str(tmp_path), extensions={"go"})
+    assert [s.source_path for s in only_go] == ["github://o/r/src/main.go"]
@@ -0,0 +1,53 @@
+from context_ai.chunking.code_parser import chunk_python_code
+
+BIG_CLASS = '''import os
+
+
+class Big(Base):
+    """Big class."""
+    attr = 1
+
+    def first(self):
+''' + "        x = 1\n" * 80 + '''
+    SECRET_CONSTANT = "keep me"
+
+    # a comment between methods
+    class Inner:
+        nested = True
+
+        def helper(self):
+            return 2
+
+    @property
+    def second(self) -> int:
+        return 3
+
+    TRAILING = 4
+'''
+
+
+def test_large_class_outline_keeps_non_method_statements():
+    chunks = chunk_python_code(BIG_CLASS, max_tokens=200)
+    outline = next(c for c in chunks if c["metadata"]["symbol"] == "Big")
+    text = outline["text"]
+    for expected in ('"""Big class."""', "attr = 1", 'SECRET_CONSTANT = "keep me"', "# a comment between methods",
+                     "class Inner:", "nested = True", "return 2", "TRAILING = 4"):
+        assert expected in text
+    assert "x = 1" not in text
+    assert text.index("def first(self):") < text.index("SECRET_CONSTANT") < text.index("class Inner:") < text.index("def second") < text.index("TRAILING")
+
+
+def test_large_class_methods_get_their_own_chunks():
+    chunks = chunk_python_code(BIG_CLASS, max_tokens=200)
+    symbols = [c["metadata"]["symbol"] for c in chunks]
+    assert symbols == ["Big", "Big.first", "Big.second"]
+    first = chunks[1]
+    assert first["metadata"]["parent_class"] == "Big"
+    assert first["text"].count("x = 1") == 80
+
+
+def test_small_class_stays_whole():
+    src = "class Small:\n    A = 1\n\n    def m(self):\n        return self.A\n"
+    chunks = chunk_python_code(src, max_tokens=1500)
+    assert len(chunks) == 1
+    assert "A = 1" in chunks[0]["text"] and "return self.A" in chunks[0]["text"]
@@ -0,0 +1,116 @@
+import threading
+
+import numpy as np
+import pytest
+
+from context_ai.config import settings
+from context_ai.retrieval.index_faiss import FaissIndex
+
+DIM = 8
+N = 300
+
+
+def _vectors(n, seed=0):
+    return np.random.default_rng(seed).standard_normal((n, DIM)).astype(np.float32)
+
+
+@pytest.fixture
+def ann_settings(monkeypatch):
+    monkeypatch.setattr(settings, "faiss_train_min_vectors", 100)
+    monkeypatch.setattr(settings, "faiss_nprobe", 64)
+    # One PQ sub-quantizer keeps ivf_pq training fast on a few hundred vectors.
+    monkeypatch.setattr(settings, "faiss_pq_m", 1)
+
+
+def _run(fn, *args, timeout=30):
+    """Run ``fn`` on a thread so a lock-up fails the test instead of hanging it."""
+    errors = []
+
+    def target():
+        try:
+            fn(*args)
+        except Exception as e:
+            errors.append(e)
+
+    t = threading.Thread(target=target, daemon=True)
+    t.start()
+    t.join(timeout)
+    assert not t.is_alive(), f"{fn.__name__} did not return within {timeout}s"
+    if errors:
+        raise errors[0]
+
+
+@pytest.mark.parametrize("index_type", ["ivf_flat", "ivf_pq", "hnsw"])
+def test_add_past_train_threshold_builds_ann_index(tmp_path, ann_settings, index_type):
+    index = FaissIndex(DIM, str(tmp_path), index_type=index_type)
+    vecs = _vectors(N)
+
+    _run(index.add, [f"c{i}" for i in range(N)], vecs)
+
+    assert index.kind == index_type
+    assert len(index) == N
+    assert "c7" in [cid for cid, _ in index.search(vecs[7], 5)]
+
+
+def test_stays_flat_below_train_threshold(tmp_path, ann_settings):
+    index = FaissIndex(DIM, str(tmp_path), index_type="hnsw")
+    index.add([f"c{i}" for i in range(50)], _vectors(50))
+    assert index.kind == "flat"
+    assert len(index) == 50
+
+
+@pytest.mark.parametrize("index_type", ["flat", "ivf_flat", "ivf_pq", "hnsw"])
+def test_add_remove_search_and_reload(tmp_path, ann_settings, index_type):
+    index = FaissIndex(DIM, str(tmp_path), index_type=index_type)
+    vecs = _vectors(N)
+    ids = [f"c{i}" for i in range(N)]
+    index.add(ids, vecs)
+    removed = ids[:10]
+
+    assert index.remove(removed) == 10
+    assert len(index) == N - 10
+    assert "c0" not in index and "c10" in index
+    for i in (0, 5):
+        assert ids[i] not in [cid for cid, _ in index.search(vecs[i], 10)]
+    assert "c20" in [cid for cid, _ in index.search(vecs[20], 5)]
+
+    reloaded = FaissIndex(DIM, str(tmp_path), index_type=index_type)
+    assert reloaded.kind == index.kind
+    assert len(reloaded) == N - 10
+    assert reloaded.ids() == set(ids[10:])
+
+
+@pytest.mark.parametrize("index_type", ["ivf_flat", "ivf_pq"])
+def test_ivf_remove_drops_vectors(tmp_path, ann_settings, index_type):
+    index = FaissIndex(DIM, str(tmp_path), index_type=index_type)
+    index.add([f"c{i}" for i in range(N)], _vectors(N))
+    index.remove([f"c{i}" for i in range(10)])
+    assert index._tombstones == 0
+    assert index.index.ntotal == N - 10
+
+
+def test_hnsw_tombstones_compact(tmp_path, ann_settings):
+    index = FaissIndex(DIM, str(tmp_path), index_type="hnsw")
+    vecs = _vectors(N)
+    index.add([f"c{i}" for i in range(N)], vecs)
+
+    index.remove([f"c{i}" for i in range(10)])
+    assert index._tombstones == 10
+    assert index.index.ntotal == N
+    assert "c0" not in [cid for cid, _ in index.search(vecs[0], 10)]
+
+    # Past _TOMBSTONE_RATIO of stored vectors the graph is rebuilt without them.
+    index.remove([f"c{i}" for i in range(10, 80)])
+    assert index._tombstones == 0
+    assert index.index.ntotal == len(index) == N - 80
+    assert index.kind == "hnsw"
+    assert "c100" in [cid for cid, _ in index.search(vecs[100], 5)]
+
+
+def test_readding_an_id_replaces_its_vector(tmp_path, ann_settings):
+    index = FaissIndex(DIM, str(tmp_path), index_type="ivf_flat")
+    vecs = _vectors(N)
+    index.add([f"c{i}" for i in range(N)], vecs)
+    index.add(["c3"], vecs[200:201])
+    assert len(index) == N
+    assert "c3" in [cid for cid, _ in index.search(vecs[200], 2)]
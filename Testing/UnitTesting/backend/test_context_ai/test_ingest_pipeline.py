@@ -0,0 +1,120 @@
+import asyncio
+import hashlib
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+import fitz
+import mongomock
+import numpy as np
+import pytest
+
+from context_ai.chunking.pdf_parser import chunk_pdf
+from context_ai.config import settings
+from context_ai.ingest import pipeline
+from context_ai.ingest.pipeline import IngestPipeline
+from context_ai.storage import mongo_store
+from context_ai.storage.mongo_store import MongoStore
+
+
+class _HashEncoder:
+    """Deterministic stand-in for EmbeddingEncoder: one vector per text."""
+
+    model_name = "test-hash"
+    dim = 4
+
+    def encode(self, texts):
+        return np.array(
+            [np.frombuffer(hashlib.sha256(t.encode()).digest()[:16], dtype=np.float32) for t in texts]
+        )
+
+
+@pytest.fixture
+def mongo(monkeypatch):
+    monkeypatch.setattr(mongo_store, "MongoClient", mongomock.MongoClient)
+    return MongoStore(uri="mongodb://localhost", db_name="test_ingest")
+
+
+@pytest.fixture
+def inline_parsing(monkeypatch):
+    # Parse in threads so PDFs take the in-process, streamed path.
+    monkeypatch.setattr(settings, "ingest_parse_workers", 1)
+    monkeypatch.setattr(settings, "pdf_parse_workers", 1)
+    monkeypatch.setattr(settings, "embedding_batch_size", 4)
+    monkeypatch.setattr(pipeline, "_parse_pool", None)
+
+
+def _pdf(path, pages):
+    doc = fitz.open()
+    for p in range(pages):
+        page = doc.new_page()
+        page.insert_text((72, 72), f"SECTION {p}", fontsize=14)
+        page.insert_text((72, 110), f"Body text of page {p} long enough to be kept as a chunk.")
+    doc.save(str(path))
+    doc.close()
+
+
+def test_streamed_pdf_is_written_whole_and_in_order(tmp_path, mongo, inline_parsing):
+    path = tmp_path / "doc.pdf"
+    _pdf(path, 11)
+    expected = [c["text"] for c in chunk_pdf(str(path))]
+    assert len(expected) > settings.embedding_batch_size
+
+    stats = asyncio.run(IngestPipeline(mongo, _HashEncoder(), "p").run([str(path)]))
+
+    assert stats.files_processed == 1 and stats.files_failed == 0
+    assert stats.chunks_embedded == len(expected)
+    rows = list(mongo.col_chunks.find({"source_path": str(path)}).sort("_id", 1))
+    assert [r["text"] for r in rows] == expected
+    for r in rows:
+        assert np.frombuffer(r["embedding"], dtype=np.float32).tolist() == _HashEncoder().encode([r["text"]])[0].tolist()
+
+
+def test_streamed_pdf_embed_failure_writes_nothing(tmp_path, mongo, inline_parsing):
+    path = tmp_path / "doc.pdf"
+    _pdf(path, 11)
+
+    class _Failing(_HashEncoder):
+        calls = 0
+
+        def encode(self, texts):
+            self.calls += 1
+            if self.calls == 2:
+                raise RuntimeError("encoder down")
+            return super().encode(texts)
+
+    stats = asyncio.run(IngestPipeline(mongo, _Failing(), "p").run([str(path)]))
+
+    assert stats.files_failed == 1 and stats.files_processed == 0
+    assert mongo.col_chunks.count_documents({}) == 0
+
+
+def test_broken_parse_pool_is_replaced(tmp_path, mongo, monkeypatch):
+    monkeypatch.setattr(settings, "ingest_parse_workers", 2)
+    broken = ProcessPoolExecutor(max_workers=2, mp_context=multiprocessing.get_context("spawn"))
+    broken._broken = "a worker was killed"
+    monkeypatch.setattr(pipeline, "_parse_pool", broken)
+    path = tmp_path / "a.py"
+    path.write_text("def f():\n    return 1\n")
+
+    try:
+        stats = asyncio.run(IngestPipeline(mongo, _HashEncoder(), "p").run([str(path)]))
+        assert stats.files_processed == 1 and stats.files_failed == 0
+        assert pipeline._parse_pool is not None and pipeline._parse_pool is not broken
+    finally:
+        if pipeline._parse_pool is not None:
+            pipeline._parse_pool.shutdown()
+
+
+def test_failing_stage_cancels_the_others(tmp_path, mongo, monkeypatch):
+    async def boom(self, sources, out):
+        raise RuntimeError("read failed")
+
+    monkeypatch.setattr(IngestPipeline, "_read_and_parse", boom)
+
+    async def main():
+        with pytest.raises(RuntimeError, match="read failed"):
+            await IngestPipeline(mongo, _HashEncoder(), "p").run([])
+        await asyncio.sleep(0)
+        return [t for t in asyncio.all_tasks() if t is not asyncio.current_task()]
+
+    assert asyncio.run(main()) == []
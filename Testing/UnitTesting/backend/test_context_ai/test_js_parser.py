@@ -0,0 +1,20 @@
+from context_ai.chunking.js_parser import split_statements
+
+
+def _statements(js):
+    return [js[s:e] for s, e in split_statements(js)]
+
+
+def test_division_after_identifier_ending_in_keyword():
+    # "plugin" ends in "in"; the slash after it is a division, not a regex.
+    js = "const half = plugin / 2; const label = '/';\nfunction g() {\n  return 2;\n}\n"
+    assert _statements(js) == [
+        "const half = plugin / 2;",
+        "const label = '/';",
+        "function g() {\n  return 2;\n}",
+    ]
+
+
+def test_regex_after_return_keyword():
+    js = "function f(s) {\n  return /}/.test(s);\n}\nconst x = 1;\n"
+    assert _statements(js) == ["function f(s) {\n  return /}/.test(s);\n}", "const x = 1;"]
@@ -0,0 +1,41 @@
+import mongomock
+import pytest
+
+from context_ai.retrieval.lexical import LexicalScorer
+from context_ai.storage import mongo_store
+from context_ai.storage.mongo_store import MongoStore
+
+
+@pytest.fixture
+def mongo(monkeypatch):
+    monkeypatch.setattr(mongo_store, "MongoClient", mongomock.MongoClient)
+    return MongoStore(uri="mongodb://localhost", db_name="test_lexical")
+
+
+def _chunks(texts, project_id="p"):
+    return [{"text": t, "metadata": {"project_id": project_id}} for t in texts]
+
+
+def test_new_project_counts_are_used_without_rebuild(mongo):
+    mongo.insert_chunks("d1", "a.py", _chunks(["parse the config", "quick brown fox"]))
+    stats = mongo.lexical_stats("p", ["parse"])
+    assert stats["n_docs"] == 2
+    assert stats["df"] == {"parse": 1}
+
+
+def test_legacy_project_rebuilt_after_ingest_before_first_query(mongo):
+    # Chunks written before lexical statistics were kept carry no lex_tf.
+    mongo.col_chunks.insert_many(
+        [{"project_id": "p", "text": f"legacy parse chunk {i}"} for i in range(50)]
+    )
+    mongo.insert_chunks("d1", "new.py", _chunks(["fresh parse chunk"]))
+    assert mongo.lexical_stats("p", ["parse"]) is None
+
+    stats = LexicalScorer(mongo).stats("p", ["parse"])
+
+    assert stats["n_docs"] == 51
+    assert stats["df"] == {"parse": 51}
+    assert mongo.col_chunks.count_documents({"lex_tf": {"$exists": False}}) == 0
+    # Once rebuilt, later ingests keep the project marked.
+    mongo.insert_chunks("d2", "more.py", _chunks(["another parse chunk"]))
+    assert mongo.lexical_stats("p", ["parse"])["n_docs"] == 52
@@ -1,7 +1,13 @@
+import io
+import os
 from unittest.mock import patch
 from api.projects.utils import (
     send_invitation_email,
     send_invitations_background,
+    is_importable_repo_path,
+    looks_binary,
+    spool_response,
+    PrefixedReader,
 )
 from api.auth.models import User
 
@@ -104,3 +110,34 @@ def test_setup_project_calendar_success(
 
     assert cid == "calendar123"
     assert err is None
+
+def test_is_importable_repo_path_skips_vendored_and_binary():
+    assert is_importable_repo_path("src/app.py")
+    assert is_importable_repo_path("README.md")
+    assert not is_importable_repo_path("web/node_modules/react/index.js")
+    assert not is_importable_repo_path("pkg/__pycache__/mod.py")
+    assert not is_importable_repo_path("docs/logo.PNG")
+
+def test_looks_binary_detects_nul_bytes():
+    assert looks_binary(b"\x89PNG\x00\x00")
+    assert not looks_binary(b"def main():\n    pass\n")
+
+def test_prefixed_reader_replays_sniffed_head():
+    stream = io.BytesIO(b"0123456789")
+    reader = PrefixedReader(stream.read(4), stream)
+    assert reader.read(2) == b"01"
+    assert reader.read(5) == b"23456"
+    assert reader.read() == b"789"
+    assert reader.read(3) == b""
+
+def test_spool_response_writes_chunks_to_temp_file():
+    class FakeResponse:
+        def iter_content(self, chunk_size):
+            return [b"abc", b"", b"def"]
+
+    path = spool_response(FakeResponse())
+    try:
+        with open(path, "rb") as spool:
+            assert spool.read() == b"abcdef"
+    finally:
+        os.remove(path)
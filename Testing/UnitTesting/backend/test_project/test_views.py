@@ -178,7 +178,7 @@ class ProjectViewTests(APITestCase):
 
     @override_settings(AWS_STORAGE_BUCKET_NAME="test-bucket")
     @patch("api.projects.views.threading.Thread")
-    @patch("api.projects.views._get_s3_client")
+    @patch("api.projects.views.get_s3_client")
     @patch("api.projects.views.requests.get")
     @patch("api.projects.views.zipfile.ZipFile")
     def test_import_github_success_path(
@@ -192,7 +192,7 @@ class ProjectViewTests(APITestCase):
         # Fake Github response
         fake_response = MagicMock()
         fake_response.status_code = 200
-        fake_response.content = b"fake zip content"
+        fake_response.iter_content.return_value = [b"fake zip content"]
         fake_response.text = "OK"
         mock_requests_get.return_value = fake_response
 
@@ -204,7 +204,7 @@ class ProjectViewTests(APITestCase):
         fake_info.file_size = 123
 
         fake_zip.infolist.return_value = [fake_info]
-        fake_zip.open.return_value = io.BytesIO(b"file content")
+        fake_zip.open.side_effect = lambda *args, **kwargs: io.BytesIO(b"file content")
         mock_zipfile.return_value = fake_zip
 
         # Fake S3 client
@@ -228,3 +228,104 @@ class ProjectViewTests(APITestCase):
         self.assertEqual(response.status_code, 201)
         self.assertIn("files", response.data)
         self.assertEqual(response.data["ingest_started"], True)
+
+    @override_settings(AWS_STORAGE_BUCKET_NAME="test-bucket")
+    @patch("api.projects.views.File")
+    @patch("api.projects.views.threading.Thread")
+    @patch("api.projects.views.get_s3_client")
+    @patch("api.projects.views.requests.get")
+    @patch("api.projects.views.zipfile.ZipFile")
+    def test_import_github_reports_unsaved_file_records(
+        self,
+        mock_zipfile,
+        mock_requests_get,
+        mock_get_s3_client,
+        mock_thread,
+        mock_file
+    ):
+        fake_response = MagicMock()
+        fake_response.status_code = 200
+        fake_response.iter_content.return_value = [b"fake zip content"]
+        mock_requests_get.return_value = fake_response
+
+        fake_zip = MagicMock()
+        fake_info = MagicMock()
+        fake_info.is_dir.return_value = False
+        fake_info.filename = "repo/root/file.txt"
+        fake_info.file_size = 123
+        fake_zip.infolist.return_value = [fake_info]
+        fake_zip.open.side_effect = lambda *args, **kwargs: io.BytesIO(b"file content")
+        mock_zipfile.return_value = fake_zip
+        mock_s3 = MagicMock()
+        mock_get_s3_client.return_value = mock_s3
+
+        mock_file.objects.insert.side_effect = Exception("insert failed")
+        mock_file.objects.return_value.distinct.return_value = []
+        mock_file.return_value.save.side_effect = Exception("save failed")
+
+        response = self.client.post(
+            f"/api/projects/{self.project.id}/import-github/",
+            {"repo_url": "https://github.com/testowner/testrepo"},
+            format="json",
+            **self.auth
+        )
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data["files"], [])
+        self.assertEqual(response.data["failed_files"], [f"files/{self.project.id}/github/testowner_testrepo/root/file.txt"])
+        self.assertEqual(mock_s3.upload_fileobj.call_args.args[0].read(), b"file content")
+        self.assertEqual(fake_zip.open.call_count, 1)
+        self.project.reload()
+        self.assertEqual(self.project.github_import_metadata["imported_count"], 0)
+
+    @override_settings(AWS_STORAGE_BUCKET_NAME="test-bucket")
+    @patch("api.projects.views.requests.post")
+    @patch("api.projects.views.threading.Thread")
+    @patch("api.projects.views.get_s3_client")
+    @patch("api.projects.views.requests.get")
+    @patch("api.projects.views.zipfile.ZipFile")
+    def test_import_github_stores_ingest_job_id(
+        self,
+        mock_zipfile,
+        mock_requests_get,
+        mock_get_s3_client,
+        mock_thread,
+        mock_requests_post
+    ):
+        fake_response = MagicMock()
+        fake_response.status_code = 200
+        fake_response.iter_content.return_value = [b"fake zip content"]
+        mock_requests_get.return_value = fake_response
+
+        fake_zip = MagicMock()
+        fake_info = MagicMock()
+        fake_info.is_dir.return_value = False
+        fake_info.filename = "repo/root/file.txt"
+        fake_info.file_size = 123
+        fake_zip.infolist.return_value = [fake_info]
+        fake_zip.open.side_effect = lambda *args, **kwargs: io.BytesIO(b"file content")
+        mock_zipfile.return_value = fake_zip
+        mock_get_s3_client.return_value = MagicMock()
+
+        ingest_response = MagicMock()
+        ingest_response.json.return_value = {"job_id": "job-1", "status": "queued"}
+        mock_requests_post.return_value = ingest_response
+
+        response = self.client.post(
+            f"/api/projects/{self.project.id}/import-github/",
+            {"repo_url": "https://github.com/testowner/testrepo"},
+            format="json",
+            **self.auth
+        )
+        self.assertEqual(response.status_code, 201)
+
+        # Run the ingest callback the view handed to its background thread.
+        kwargs = mock_thread.call_args.kwargs
+        kwargs["target"](*kwargs["args"])
+
+        self.assertEqual(mock_requests_post.call_args.args[0], "http://localhost:5000/ingest/archive")
+        self.assertEqual(
+            mock_requests_post.call_args.kwargs["data"]["source_prefix"],
+            f"s3://test-bucket/files/{self.project.id}/github/testowner_testrepo",
+        )
+        self.project.reload()
+        self.assertEqual(self.project.github_import_metadata["ingest_job_id"], "job-1")
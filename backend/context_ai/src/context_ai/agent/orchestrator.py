@@ -1,5 +1,6 @@
 from __future__ import annotations
-from typing import Any, Dict, List, Optional, Callable
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional, Tuple
+import asyncio
 import json
 import os
 import smtplib
@@ -7,6 +8,7 @@ from email.message import EmailMessage
 from pathlib import Path
 
 from ..config import settings
+from ..utils.concurrency import run_io
 
 
 class AgentOrchestrator:
@@ -34,6 +36,9 @@ class AgentOrchestrator:
         self._system_prompt = system_prompt
         self._project_id = project_id
         self._use_langchain = bool(use_langchain)
+        # Set by complete_stream for the duration of one streamed completion.
+        self._emit: Optional[Callable[[str, Dict[str, Any]], None]] = None
+        self._usage: Dict[str, Any] = {}
 
     def _tool_defs(self) -> List[Dict[str, Any]]:
         tools = [
@@ -109,6 +114,10 @@ class AgentOrchestrator:
             tools = [t for t in tools if t.get("function", {}).get("name") in self._allowed_tools]
         return tools
 
+    async def _run_tool_async(self, name: str, arguments_json: str) -> Dict[str, Any]:
+        """``_run_tool`` on the I/O pool, so retrieval, SMTP and PDF work never block the event loop."""
+        return await run_io(self._run_tool, name, arguments_json)
+
     def _run_tool(self, name: str, arguments_json: str) -> Dict[str, Any]:
         try:
             args = json.loads(arguments_json or "{}")
@@ -258,9 +267,57 @@ class AgentOrchestrator:
         except ClientError as e:
             return f"local:{local_path} (S3 upload failed: {str(e)})"
 
+    def _add_step(self, steps: List[Dict[str, Any]], step: Dict[str, Any]):
+        steps.append(step)
+        # Final answers reach streaming clients as deltas instead.
+        if self._emit is not None and step.get("type") != "final":
+            self._emit("step", step)
+
+    async def _final_answer(self, prompt: str, context: str) -> str:
+        """The user-facing answer, streamed as ``delta`` events when a stream is attached."""
+        from ..api.main import _generate_answer, _stream_answer
+
+        if self._emit is None:
+            return await _generate_answer(prompt, context)
+        parts: List[str] = []
+        async for delta in _stream_answer(prompt, context, self._usage):
+            parts.append(delta)
+            self._emit("delta", {"text": delta})
+        return "".join(parts).strip()
+
+    async def complete_stream(self, prompt: str, top_k: int = 8, token_budget: Optional[int] = None) -> AsyncIterator[Tuple[str, Dict[str, Any]]]:
+        """
+        ``complete`` as (event, data) pairs: ``step`` for each tool call as it
+        finishes, ``delta`` for answer text, then ``done`` with the answer,
+        all steps and LLM token usage. Answers that are not generated as a
+        stream (e.g. an OpenAI tool-loop reply) arrive as a single delta.
+        """
+        events: asyncio.Queue = asyncio.Queue()
+        self._usage = {}
+        self._emit = lambda event, data: events.put_nowait((event, data))
+        streamed = False
+        task = asyncio.ensure_future(self.complete(prompt, top_k=top_k, token_budget=token_budget))
+        task.add_done_callback(lambda _: events.put_nowait(None))
+        try:
+            while True:
+                item = await events.get()
+                if item is None:
+                    break
+                streamed = streamed or item[0] == "delta"
+                yield item
+            result = task.result()
+            if not streamed and result.get("answer"):
+                yield "delta", {"text": result["answer"]}
+            yield "done", {"answer": result.get("answer"), "steps": result.get("steps", []), "usage": self._usage}
+        finally:
+            self._emit = None
+            if not task.done():
+                task.cancel()
+
     async def complete(self, prompt: str, top_k: int = 8, token_budget: Optional[int] = None) -> Dict[str, Any]:
         steps: List[Dict[str, Any]] = []
         if getattr(settings, "agent_planning_enabled", False):
+            final_prompt: Optional[str] = None
             try:
                 from ..api.main import _generate_answer
 
@@ -276,7 +333,7 @@ class AgentOrchestrator:
 
                 token_budget = token_budget or getattr(settings, "default_token_budget", 6000)
                 try:
-                    search_res = self._run_tool("search_context", json.dumps({"query": prompt, "top_k": top_k, "token_budget": token_budget}))
+                    search_res = await self._run_tool_async("search_context", json.dumps({"query": prompt, "top_k": top_k, "token_budget": token_budget}))
                     context_items = search_res.get("results", [])
                     def _truncate(s, n=2000):
                         return s if len(s) <= n else s[:n] + "..."
@@ -333,34 +390,37 @@ class AgentOrchestrator:
                         args_sub = _apply(args)
 
                         try:
-                            tool_out = self._run_tool(action, json.dumps(args_sub))
+                            tool_out = await self._run_tool_async(action, json.dumps(args_sub))
                         except Exception as e:
                             tool_out = {"error": str(e)}
 
                         outputs[sid] = tool_out
                         last_output = json.dumps(tool_out)
-                        steps.append({"type": "tool", "id": sid, "name": action, "args": args_sub, "output": tool_out})
+                        self._add_step(steps, {"type": "tool", "id": sid, "name": action, "args": args_sub, "output": tool_out})
 
                     summary_lines = [f"Step {s.get('id') or ''} ({s.get('name')}): {s.get('output')}" for s in steps if s.get('type') == 'tool']
                     summary = "\n".join(summary_lines)
                     final_prompt = f"Given the following step outputs:\n{summary}\n\nUser request: {prompt}\nProvide a concise final response summarizing results and next actions."
-                    final_answer = await _generate_answer(final_prompt, "")
-                    steps.append({"type": "final", "content": final_answer})
-                    return {"answer": final_answer, "steps": steps}
             except Exception as e:
-                steps.append({"type": "error", "content": f"planning_failed: {e}"})
+                self._add_step(steps, {"type": "error", "content": f"planning_failed: {e}"})
+
+            # Outside the try: once answer deltas may have been streamed, a
+            # failure must not fall through to a second answer.
+            if final_prompt is not None:
+                final_answer = await self._final_answer(final_prompt, "")
+                self._add_step(steps, {"type": "final", "content": final_answer})
+                return {"answer": final_answer, "steps": steps}
 
         if settings.llm_backend != "openai" and self._llm_step is None:
             token_budget = token_budget or 1000
-            context = self._run_tool(
+            context = await self._run_tool_async(
                 "search_context",
                 json.dumps({"query": prompt, "top_k": top_k, "token_budget": token_budget}),
             )
-            from ..api.main import _generate_answer
             context_text = "\n\n".join([it["text"] for it in context.get("results", [])])
-            answer = await _generate_answer(prompt, context_text)
-            steps.append({"type": "tool", "name": "search_context", "args": {"query": prompt, "top_k": top_k}, "output_count": len(context.get("results", []))})
-            steps.append({"type": "final", "content": answer})
+            self._add_step(steps, {"type": "tool", "name": "search_context", "args": {"query": prompt, "top_k": top_k}, "output_count": len(context.get("results", []))})
+            answer = await self._final_answer(prompt, context_text)
+            self._add_step(steps, {"type": "final", "content": answer})
             if "generate_pdf" in prompt.lower() or "generate a pdf" in prompt.lower():
                 try:
                     markdown_content = f"# Agent Report\n\n## Summary\n\n{answer}\n\n## Details\n\n- Generated via context search\n- Using HF model"
@@ -413,8 +473,8 @@ class AgentOrchestrator:
                     name = tc.get("function", {}).get("name")
                     arguments = tc.get("function", {}).get("arguments", "{}")
                     call_id = tc.get("id")
-                    tool_output = self._run_tool(name, arguments)
-                    steps.append({"type": "tool", "name": name, "args": json.loads(arguments or "{}"), "output": tool_output})
+                    tool_output = await self._run_tool_async(name, arguments)
+                    self._add_step(steps, {"type": "tool", "name": name, "args": json.loads(arguments or "{}"), "output": tool_output})
                     messages.append({"role": "assistant", "tool_calls": [tc]})
                     messages.append({
                         "role": "tool",
@@ -425,19 +485,18 @@ class AgentOrchestrator:
                 continue
 
             if content:
-                steps.append({"type": "final", "content": content})
+                self._add_step(steps, {"type": "final", "content": content})
                 return {"answer": content, "steps": steps}
 
             break
 
-        context = self._run_tool(
+        context = await self._run_tool_async(
             "search_context",
             json.dumps({"query": prompt, "top_k": top_k, "token_budget": token_budget}),
         )
         context_text = "\n\n".join([it["text"] for it in context.get("results", [])])
-        from ..api.main import _generate_answer
-        answer = await _generate_answer(prompt, context_text)
-        steps.append({"type": "final", "content": answer, "note": "fallback"})
+        answer = await self._final_answer(prompt, context_text)
+        self._add_step(steps, {"type": "final", "content": answer, "note": "fallback"})
         return {"answer": answer, "steps": steps}
 
     def _complete_with_langchain(self, prompt: str, top_k: int = 8, token_budget: Optional[int] = None) -> Dict[str, Any]:
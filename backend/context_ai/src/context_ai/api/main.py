@@ -1,7 +1,8 @@
 from __future__ import annotations
-from fastapi import FastAPI, HTTPException, Request
+from fastapi import FastAPI, File, Form, HTTPException, Request, UploadFile
+from fastapi.responses import StreamingResponse
 import logging
-from typing import Optional, List, Dict
+from typing import Any, AsyncIterator, Optional, List, Dict, Tuple
 from ..config import settings
 from ..models import (
     IngestRequest,
@@ -17,12 +18,24 @@ from ..models import (
 )
 from ..storage.mongo_store import MongoStore
 from ..embeddings.encoder import EmbeddingEncoder
+from ..embeddings.batcher import EmbeddingBatcher
 from ..retrieval.search import Retriever
-from ..chunking.pdf_parser import chunk_pdf
-from ..chunking.code_parser import chunk_code
-from ..utils.tokenization import approximate_token_count
+from ..utils.tokenization import chunk_token_counts
+from ..chunking.registry import CHUNKERS
 from ..agent.orchestrator import AgentOrchestrator
+from ..ingest.pipeline import IngestPipeline
+from ..ingest.jobs import IngestJobQueue
+from ..ingest.sources import S3Object, archive_sources, parse_s3_uri, tree_sources
+from ..utils.concurrency import cpu_pool, run_cpu, run_io
+import asyncio
+import json
+import queue
+import time
+from functools import lru_cache, partial
 import os
+import shutil
+import tempfile
+import zipfile
 from pathlib import Path
 from glob import glob
 from bson import ObjectId
@@ -34,155 +47,242 @@ logger = logging.getLogger("context_ai.api")
 
 _mongo: Optional[MongoStore] = None
 _encoder: Optional[EmbeddingEncoder] = None
+_batcher: Optional[EmbeddingBatcher] = None
 _retriever: Optional[Retriever] = None
 _agent: Optional[AgentOrchestrator] = None
+_jobs: Optional[IngestJobQueue] = None
 
 
 def _ensure_components():
-    global _mongo, _encoder, _retriever, _agent
+    global _mongo, _encoder, _batcher, _retriever, _agent, _jobs
     if _mongo is None:
         _mongo = MongoStore()
     if _encoder is None:
         _encoder = EmbeddingEncoder()
+    if _batcher is None:
+        _batcher = EmbeddingBatcher(_encoder)
     if _retriever is None:
-        _retriever = Retriever(_mongo, _encoder)
-        if settings.vector_backend == "faiss":
-            _retriever.index_all_from_mongo()
+        # Project shards of the FAISS index are loaded and synced on first query.
+        # Query embeddings from worker threads are coalesced by the batcher.
+        _retriever = Retriever(_mongo, _encoder, query_embedder=_batcher.encode_sync)
     if _agent is None and _retriever is not None:
         _agent = AgentOrchestrator(_retriever, use_langchain=getattr(settings, "use_langchain", False))
+    if _jobs is None:
+        _jobs = IngestJobQueue(_mongo)
 
 
 @app.get("/health")
 async def health():
     _ensure_components()
-    return {"status": "ok"}
+    assert _encoder is not None and _batcher is not None
+    return {"status": "ok", "embedding_cache": _encoder.cache_info(), "embedding_batches": _batcher.stats()}
 
 
-@app.post("/ingest")
-async def ingest(req: IngestRequest, request: Request):
-    _ensure_components()
-    assert _mongo and _encoder
-
+def _client_ip(request: Request) -> str:
     try:
-        client_ip = request.client.host if request.client else "unknown"
+        return request.client.host if request.client else "unknown"
     except Exception:
-        client_ip = "unknown"
+        return "unknown"
+
+
+def _validate_chunkers(chunkers: Optional[Dict[str, str]]):
+    unknown = sorted({name for name in (chunkers or {}).values() if name not in CHUNKERS})
+    if unknown:
+        raise HTTPException(400, f"Unknown chunker(s) {', '.join(unknown)}; available: {', '.join(sorted(CHUNKERS))}")
+
+
+def _s3_client():
+    """
+    S3 client for an ingest request. Resolving credentials can read files or
+    call the instance metadata service, so callers run this via ``run_io``.
+    """
     try:
-        logger.info("/ingest called from %s payload=%s", client_ip, req.dict())
-    except Exception:
-        logger.info("/ingest called from %s (payload could not be serialized)", client_ip)
+        import boto3
+        from botocore.config import Config
+    except ImportError:
+        logger.exception("boto3 not installed but S3 ingest enabled")
+        raise HTTPException(500, "Missing optional dependency 'boto3'. Install it with `pip install boto3` or `pip install -r requirements.txt`")
+
+    session = boto3.Session(
+        aws_access_key_id=settings.aws_access_key_id or os.getenv('AWS_ACCESS_KEY_ID'),
+        aws_secret_access_key=settings.aws_secret_access_key or os.getenv('AWS_SECRET_ACCESS_KEY'),
+        region_name=settings.aws_region or os.getenv('AWS_REGION', 'us-east-1'),
+    )
 
-    if not req.project_id:
-        raise HTTPException(400, "Provide 'project_id' in the ingest request to associate chunks with a project")
+    creds = session.get_credentials()
+    if not creds or not getattr(creds, "access_key", None) or not getattr(creds, "secret_key", None):
+        logger.warning("S3 ingest attempted but AWS credentials not found in settings or environment")
+        raise HTTPException(500, "AWS credentials not found. Set AWS_ACCESS_KEY_ID and AWS_SECRET_ACCESS_KEY in .env or environment, or configure AWS credentials.")
 
-    files: List[str] = []
-    temp_files: List[str] = []
-    
-    if req.s3_uris:
-        if not settings.s3_ingest_enabled:
-            logger.warning("Rejecting /ingest: s3_uris present but S3 ingest disabled in settings from %s: %s", client_ip, req.s3_uris)
-            raise HTTPException(400, "S3-based ingest is disabled. Enable it by setting `S3_INGEST_ENABLED=true` in .env or provide local files via the 'files' field or a 'directory')")
+    return session.client('s3', config=Config(max_pool_connections=max(10, settings.ingest_io_workers)))
 
-        try:
-            import boto3
-            from botocore.exceptions import ClientError
-        except ImportError:
-            logger.exception("boto3 not installed but S3 ingest enabled")
-            raise HTTPException(500, "Missing optional dependency 'boto3'. Install it with `pip install boto3` or `pip install -r requirements.txt`")
 
-        session = boto3.Session(
-            aws_access_key_id=settings.aws_access_key_id or os.getenv('AWS_ACCESS_KEY_ID'),
-            aws_secret_access_key=settings.aws_secret_access_key or os.getenv('AWS_SECRET_ACCESS_KEY'),
-            region_name=settings.aws_region or os.getenv('AWS_REGION', 'us-east-1'),
-        )
+async def _validate_ingest(req: IngestRequest, client_ip: str, endpoint: str):
+    """
+    Reject an ingest request that cannot run and return the S3 client it needs.
+    Returns None when the request has no ``s3_uris``.
+    """
+    try:
+        logger.info("%s called from %s payload=%s", endpoint, client_ip, req.dict())
+    except Exception:
+        logger.info("%s called from %s (payload could not be serialized)", endpoint, client_ip)
 
-        creds = session.get_credentials()
-        if not creds or not getattr(creds, "access_key", None) or not getattr(creds, "secret_key", None):
-            logger.warning("S3 ingest attempted but AWS credentials not found in settings or environment")
-            raise HTTPException(500, "AWS credentials not found. Set AWS_ACCESS_KEY_ID and AWS_SECRET_ACCESS_KEY in .env or environment, or configure AWS credentials.")
+    if not req.project_id:
+        raise HTTPException(400, "Provide 'project_id' in the ingest request to associate chunks with a project")
 
-        s3_client = session.client('s3')
+    _validate_chunkers(req.chunkers)
 
-        temp_dir = Path(settings.s3_temp_dir)
-        temp_dir.mkdir(parents=True, exist_ok=True)
+    if not req.s3_uris:
+        if not req.files and not req.directory:
+            logger.warning("Rejecting %s: no files or directory provided from %s payload=%s", endpoint, client_ip, req.dict())
+            raise HTTPException(400, "Provide 'files' or 'directory' to ingest from")
+        return None
 
-        for s3_uri in req.s3_uris:
-            if not s3_uri.startswith('s3://'):
-                raise HTTPException(400, f"Invalid S3 URI: {s3_uri}. Must start with s3://")
+    if not settings.s3_ingest_enabled:
+        logger.warning("Rejecting %s: s3_uris present but S3 ingest disabled in settings from %s: %s", endpoint, client_ip, req.s3_uris)
+        raise HTTPException(400, "S3-based ingest is disabled. Enable it by setting `S3_INGEST_ENABLED=true` in .env or provide local files via the 'files' field or a 'directory')")
 
-            parts = s3_uri[5:].split('/', 1)
-            if len(parts) != 2:
-                raise HTTPException(400, f"Invalid S3 URI format: {s3_uri}")
+    for s3_uri in req.s3_uris:
+        try:
+            parse_s3_uri(s3_uri)
+        except ValueError as e:
+            raise HTTPException(400, str(e))
 
-            bucket, key = parts
+    return await run_io(_s3_client)
 
-            filename = os.path.basename(key)
-            local_path = temp_dir / filename
 
-            try:
-                s3_client.download_file(bucket, key, str(local_path))
-                files.append(str(local_path))
-                temp_files.append(str(local_path))
-            except ClientError as e:
-                logger.exception("Failed to download %s from S3", s3_uri)
-                raise HTTPException(500, f"Failed to download {s3_uri}: {str(e)}")
-    
+async def _run_ingest(req: IngestRequest, s3_client, on_progress=None):
+    """Download, parse, embed and store the files of a validated ingest request."""
+    assert _mongo and _encoder
+    # S3 objects are fetched concurrently by the pipeline's I/O stage and
+    # parsed as each one lands.
+    sources: List[object] = [S3Object(s3_client, uri, settings.s3_temp_dir) for uri in req.s3_uris or []]
+
     if req.files:
-        files.extend(req.files)
+        sources.extend(req.files)
     elif req.directory:
         patterns = req.patterns or ["**/*"]
+        paths: List[str] = []
         for pat in patterns:
-            files.extend(glob(os.path.join(req.directory, pat), recursive=req.recursive))
-    
-    if not files:
-        logger.warning("Rejecting /ingest: no files or directory provided from %s payload=%s", client_ip, req.dict())
+            paths.extend(glob(os.path.join(req.directory, pat), recursive=req.recursive))
+        if req.source_prefix:
+            sources.extend(tree_sources(req.directory, paths, req.source_prefix))
+        else:
+            sources.extend(paths)
+
+    if not sources:
         raise HTTPException(400, "Provide 'files' or 'directory' to ingest from")
 
-    processed = 0
-    for path in files:
-        if not os.path.isfile(path):
-            continue
-        ext = Path(path).suffix.lower().lstrip('.')
-        language = None
-        if ext == 'pdf':
-            chunks = chunk_pdf(path)
-        else:
-            with open(path, "r", encoding="utf-8", errors="ignore") as f:
-                text = f.read()
-            chunks = []
-            if ext in ("py", "js", "ts", "md"):
-                chunks = chunk_code(path, text)
-                language = 'python' if ext == 'py' else ('javascript' if ext in ('js','ts') else None)
-            else:
-                chunks = [{
-                    "chunk_id": "0",
-                    "text": text,
-                    "file_ext": ext,
-                    "metadata": {"token_count": approximate_token_count(text), "file_ext": ext}
-                }]
-        for c in chunks:
-            meta = c.setdefault("metadata", {})
-            meta["project_id"] = req.project_id
-
-        doc_id = _mongo.upsert_document(source_path=path, file_ext=ext, language=language, metadata={"project_id": req.project_id})
-        embeddings = _encoder.encode([c["text"] for c in chunks])
-        _mongo.insert_chunks(doc_id=doc_id, source_path=path, chunks=chunks, embeddings=embeddings)
-        processed += 1
-
-
-    for temp_file in temp_files:
-        try:
-            os.remove(temp_file)
-        except Exception:
-            pass
+    stats = await IngestPipeline(_mongo, _encoder, req.project_id, on_progress=on_progress, chunkers=req.chunkers).run(sources)
 
-    return {"processed": processed}
+    if stats.files_processed and _retriever is not None:
+        _retriever.mark_stale(req.project_id)
+    return stats
 
 
-@app.post("/query", response_model=QueryResponse)
-async def query(req: QueryRequest):
+@app.post("/ingest")
+async def ingest(req: IngestRequest, request: Request):
     _ensure_components()
-    assert _mongo and _encoder and _retriever
+    assert _mongo and _encoder
+
+    s3_client = await _validate_ingest(req, _client_ip(request), "/ingest")
+    stats = await _run_ingest(req, s3_client)
+    return {"processed": stats.files_processed, "skipped": stats.files_skipped, **stats.as_dict()}
+
+
+@app.post("/ingest/jobs", status_code=202)
+async def submit_ingest_job(req: IngestRequest, request: Request):
+    """Queue an ingest request and return its job id without waiting for it to run."""
+    _ensure_components()
+    assert _jobs is not None
+
+    s3_client = await _validate_ingest(req, _client_ip(request), "/ingest/jobs")
+    job_id = await _jobs.submit(req.project_id, req.dict(), lambda on_progress: _run_ingest(req, s3_client, on_progress))
+    return {"job_id": job_id, "status": "queued"}
+
+
+@app.post("/ingest/archive", status_code=202)
+async def ingest_archive(
+    request: Request,
+    project_id: str = Form(...),
+    source_prefix: str = Form(...),
+    archive: UploadFile = File(...),
+    strip_components: int = Form(1),
+    chunkers: Optional[str] = Form(None),
+):
+    """
+    Queue ingest of a zip archive from the bytes the caller already holds.
+    Members are stored under ``source_prefix`` plus their path inside the
+    archive, so a caller that also uploads them to S3 can pass the matching
+    ``s3://bucket/prefix`` and documents line up with S3-based ingest.
+    ``chunkers`` is an optional JSON object of per-extension chunker overrides,
+    stored for the project like ``IngestRequest.chunkers``.
+    """
+    _ensure_components()
+    assert _jobs is not None and _mongo and _encoder
+    logger.info("/ingest/archive called from %s project_id=%s source_prefix=%s", _client_ip(request), project_id, source_prefix)
+    try:
+        chunker_overrides = json.loads(chunkers) if chunkers else None
+    except ValueError:
+        raise HTTPException(400, "'chunkers' must be a JSON object mapping extensions to chunker names")
+    if chunker_overrides is not None and not isinstance(chunker_overrides, dict):
+        raise HTTPException(400, "'chunkers' must be a JSON object mapping extensions to chunker names")
+    _validate_chunkers(chunker_overrides)
+
+    # The upload is closed once the response is sent, so the job gets its own copy.
+    def _save_upload() -> str:
+        os.makedirs(settings.s3_temp_dir, exist_ok=True)
+        fd, path = tempfile.mkstemp(dir=settings.s3_temp_dir, suffix=".zip")
+        with os.fdopen(fd, "wb") as f:
+            shutil.copyfileobj(archive.file, f, 1 << 20)
+        return path
+
+    archive_path = await run_io(_save_upload)
+    if not zipfile.is_zipfile(archive_path):
+        os.remove(archive_path)
+        raise HTTPException(400, "Uploaded archive is not a zip file")
+
+    async def _run(on_progress):
+        try:
+            with zipfile.ZipFile(archive_path) as zf:
+                sources = archive_sources(zf, source_prefix, settings.s3_temp_dir, strip_components=strip_components)
+                stats = await IngestPipeline(
+                    _mongo, _encoder, project_id, on_progress=on_progress, chunkers=chunker_overrides
+                ).run(sources)
+        finally:
+            os.remove(archive_path)
+        if stats.files_processed and _retriever is not None:
+            _retriever.mark_stale(project_id)
+        return stats
+
+    request_doc = {"project_id": project_id, "source_prefix": source_prefix, "archive": archive.filename, "chunkers": chunker_overrides}
+    job_id = await _jobs.submit(project_id, request_doc, _run)
+    return {"job_id": job_id, "status": "queued"}
+
+
+@app.get("/ingest/{job_id}")
+async def get_ingest_job(job_id: str):
+    _ensure_components()
+    assert _jobs is not None
+
+    job = await _jobs.get(job_id)
+    if not job:
+        raise HTTPException(404, "Ingest job not found")
+    return {
+        "job_id": str(job["_id"]),
+        "project_id": job.get("project_id"),
+        "status": job.get("status"),
+        "stats": job.get("stats") or {},
+        "error": job.get("error"),
+        "created_at": job.get("created_at"),
+        "started_at": job.get("started_at"),
+        "finished_at": job.get("finished_at"),
+    }
+
+
+async def _retrieve_for_query(req: QueryRequest) -> Tuple[List[Dict], Any, str]:
+    """Retrieval and conversation memory for a query. Returns (chunks, query vector, full context)."""
+    assert _mongo and _encoder and _retriever and _batcher
 
     filters: Dict[str, object] = {}
     if req.filters:
@@ -205,7 +305,17 @@ async def query(req: QueryRequest):
 
     filters["project_id"] = req.project_id
 
-    chunks = _retriever.retrieve(query=req.query, top_k=req.top_k, token_budget=req.token_budget or settings.default_token_budget, filters=filters)
+    query_vector = await _batcher.encode(req.query)
+    chunks, query_vector = await run_cpu(
+        _retriever.retrieve_with_vector,
+        query=req.query,
+        top_k=req.top_k,
+        token_budget=req.token_budget or settings.default_token_budget,
+        filters=filters,
+        nprobe=req.nprobe,
+        ef_search=req.ef_search,
+        query_vector=query_vector,
+    )
 
     context_text = "\n\n".join([c["text"] for c in chunks])
 
@@ -214,8 +324,9 @@ async def query(req: QueryRequest):
     conversation_context = ""
     if req.user_id and settings.conversation_memory_enabled:
         try:
-            query_embedding = _encoder.encode([req.query])[0].tolist()
-            past_conversations = _mongo.search_conversations(
+            query_embedding = query_vector.tolist()
+            past_conversations = await run_io(
+                _mongo.search_conversations,
                 user_id=req.user_id,
                 query_embedding=query_embedding,
                 top_k=settings.conversation_retrieval_top_k,
@@ -238,25 +349,31 @@ async def query(req: QueryRequest):
             print(f"Error retrieving conversation history: {e}")
 
     full_context = conversation_context + context_text if conversation_context else context_text
-    answer = await _generate_answer(req.query, full_context)
+    return chunks, query_vector, full_context
 
+
+async def _save_query_conversation(req: QueryRequest, answer: str, query_vector, endpoint: str):
+    assert _mongo is not None
     if req.user_id and settings.conversation_memory_enabled:
         try:
             conv_messages = [
                 {"role": "user", "content": req.query},
                 {"role": "assistant", "content": answer},
             ]
-            query_embedding = _encoder.encode([req.query])[0].tolist()
-            _mongo.save_conversation(
+            query_embedding = query_vector.tolist()
+            await run_io(
+                _mongo.save_conversation,
                 user_id=req.user_id,
                 messages=conv_messages,
                 query_embedding=query_embedding,
-                metadata={"endpoint": "query"},
+                metadata={"endpoint": endpoint},
             )
         except Exception as e:
             print(f"Error saving conversation: {e}")
 
-    out_chunks = [ChunkRecord(**{
+
+def _chunk_records(chunks: List[Dict]) -> List[ChunkRecord]:
+    return [ChunkRecord(**{
         "_id": str(c["_id"]),
         "doc_id": str(c.get("doc_id")) if c.get("doc_id") else None,
         "source_path": c.get("source_path"),
@@ -266,9 +383,61 @@ async def query(req: QueryRequest):
         "metadata": c.get("metadata", {}),
     }) for c in chunks]
 
-    tokens_used = sum([c.metadata.get("token_count", approximate_token_count(c.text)) for c in out_chunks])
 
-    return QueryResponse(answer=answer, context=out_chunks, used_backend=settings.vector_backend, tokens_used=tokens_used)
+@app.post("/query", response_model=QueryResponse)
+async def query(req: QueryRequest):
+    _ensure_components()
+
+    chunks, query_vector, full_context = await _retrieve_for_query(req)
+    answer = await _generate_answer(req.query, full_context)
+    await _save_query_conversation(req, answer, query_vector, "query")
+
+    tokens_used = sum(chunk_token_counts(chunks))
+
+    return QueryResponse(answer=answer, context=_chunk_records(chunks), used_backend=settings.vector_backend, tokens_used=tokens_used)
+
+
+@app.post("/query/stream")
+async def query_stream(req: QueryRequest):
+    """
+    ``/query`` as Server-Sent Events: a ``context`` event with the retrieved
+    chunks as soon as retrieval finishes, ``delta`` events with answer text
+    as the LLM produces it, then ``done`` with token usage and timings (or
+    ``error`` if generation fails part-way).
+    """
+    _ensure_components()
+    started = time.perf_counter()
+    chunks, query_vector, full_context = await _retrieve_for_query(req)
+
+    async def events() -> AsyncIterator[str]:
+        yield _sse("context", {
+            "context": [r.dict(exclude={"embedding"}) for r in _chunk_records(chunks)],
+            "used_backend": settings.vector_backend,
+            "tokens_used": sum(chunk_token_counts(chunks)),
+            "retrieval_ms": round((time.perf_counter() - started) * 1000, 1),
+        })
+        usage: Dict[str, Any] = {}
+        parts: List[str] = []
+        first_token_ms = None
+        try:
+            async for delta in _stream_answer(req.query, full_context, usage):
+                if first_token_ms is None:
+                    first_token_ms = round((time.perf_counter() - started) * 1000, 1)
+                parts.append(delta)
+                yield _sse("delta", {"text": delta})
+        except Exception as e:
+            logger.exception("Streaming answer failed")
+            yield _sse("error", {"detail": getattr(e, "detail", None) or str(e)})
+            return
+        answer = "".join(parts).strip()
+        await _save_query_conversation(req, answer, query_vector, "query/stream")
+        yield _sse("done", {
+            "usage": usage,
+            "time_to_first_token_ms": first_token_ms,
+            "elapsed_ms": round((time.perf_counter() - started) * 1000, 1),
+        })
+
+    return StreamingResponse(events(), media_type="text/event-stream", headers=_SSE_HEADERS)
 
 
 @app.post("/generate_report")
@@ -280,7 +449,7 @@ async def generate_report(req: GenerateReportRequest):
     if not req.project_id:
         raise HTTPException(400, "project_id is required")
 
-    chunks = _mongo.find_chunks({"project_id": req.project_id}, limit=10000)
+    chunks = await run_io(_mongo.find_chunks, {"project_id": req.project_id}, limit=10000)
     if not chunks:
         raise HTTPException(404, "No chunks found for project_id")
 
@@ -297,6 +466,45 @@ async def generate_report(req: GenerateReportRequest):
     out_dir = Path(settings.pdf_output_dir)
     out_dir.mkdir(parents=True, exist_ok=True)
     out_path = out_dir / (req.output_name or (title.replace(" ", "_") + ".pdf"))
+    await run_cpu(_render_report, out_path, title, full_text)
+
+    try:
+        try:
+            import boto3
+            from botocore.exceptions import ClientError
+        except ImportError:
+            raise HTTPException(500, "Missing optional dependency 'boto3'. Install it with `pip install boto3` or `pip install -r requirements.txt`")
+
+        bucket = settings.s3_bucket or os.getenv("S3_BUCKET")
+        if not bucket:
+            bucket = f"context-ai-reports-{settings.aws_region}"
+
+        s3_client = await run_io(
+            boto3.client,
+            's3',
+            aws_access_key_id=settings.aws_access_key_id or os.getenv('AWS_ACCESS_KEY_ID'),
+            aws_secret_access_key=settings.aws_secret_access_key or os.getenv('AWS_SECRET_ACCESS_KEY'),
+            region_name=settings.aws_region or os.getenv('AWS_REGION', 'us-east-1')
+        )
+
+        creds = await run_io(lambda: boto3.Session().get_credentials())
+        if not creds or not getattr(creds, "access_key", None) or not getattr(creds, "secret_key", None):
+            raise HTTPException(500, "AWS credentials not found. Set AWS_ACCESS_KEY_ID and AWS_SECRET_ACCESS_KEY environment variables, configure the AWS CLI (aws configure), or provide an IAM role.")
+
+        filename = os.path.basename(str(out_path))
+        s3_key = f"projects/{req.project_id}/reports/{filename}"
+
+        await run_io(s3_client.upload_file, str(out_path), bucket, s3_key)
+        s3_uri = f"s3://{bucket}/{s3_key}"
+
+        return {"pdf_path": str(out_path), "s3_uri": s3_uri}
+    except HTTPException:
+        raise
+    except Exception as e:
+        return {"pdf_path": str(out_path), "s3_error": str(e)}
+
+
+def _render_report(out_path: Path, title: str, full_text: str):
     doc = fitz.open()
     try:
         page = doc.new_page()
@@ -312,40 +520,6 @@ async def generate_report(req: GenerateReportRequest):
     finally:
         doc.close()
 
-        try:
-            try:
-                import boto3
-                from botocore.exceptions import ClientError
-            except ImportError:
-                raise HTTPException(500, "Missing optional dependency 'boto3'. Install it with `pip install boto3` or `pip install -r requirements.txt`")
-
-            bucket = settings.s3_bucket or os.getenv("S3_BUCKET")
-            if not bucket:
-                bucket = f"context-ai-reports-{settings.aws_region}"
-
-            s3_client = boto3.client(
-                's3',
-                aws_access_key_id=settings.aws_access_key_id or os.getenv('AWS_ACCESS_KEY_ID'),
-                aws_secret_access_key=settings.aws_secret_access_key or os.getenv('AWS_SECRET_ACCESS_KEY'),
-                region_name=settings.aws_region or os.getenv('AWS_REGION', 'us-east-1')
-            )
-
-            creds = boto3.Session().get_credentials()
-            if not creds or not getattr(creds, "access_key", None) or not getattr(creds, "secret_key", None):
-                raise HTTPException(500, "AWS credentials not found. Set AWS_ACCESS_KEY_ID and AWS_SECRET_ACCESS_KEY environment variables, configure the AWS CLI (aws configure), or provide an IAM role.")
-
-            filename = os.path.basename(str(out_path))
-            s3_key = f"projects/{req.project_id}/reports/{filename}"
-
-            s3_client.upload_file(str(out_path), bucket, s3_key)
-            s3_uri = f"s3://{bucket}/{s3_key}"
-
-            return {"pdf_path": str(out_path), "s3_uri": s3_uri}
-        except HTTPException:
-            raise
-        except Exception as e:
-            return {"pdf_path": str(out_path), "s3_error": str(e)}
-
 
 @app.post("/agent/complete", response_model=AgentResponse)
 async def agent_complete(req: AgentRequest):
@@ -369,6 +543,38 @@ async def agent_complete(req: AgentRequest):
     return AgentResponse(answer=result["answer"], steps=result.get("steps", []))
 
 
+@app.post("/agent/complete/stream")
+async def agent_complete_stream(req: AgentRequest):
+    """``/agent/complete`` as Server-Sent Events: ``step``, ``delta``, then ``done`` (or ``error``)."""
+    _ensure_components()
+
+    if not req.project_id:
+        raise HTTPException(400, "Provide 'project_id' in the agent request to scope context search")
+
+    orchestrator = AgentOrchestrator(
+        _retriever,
+        allowed_tools=None,
+        system_prompt=None,
+        project_id=req.project_id,
+    )
+    started = time.perf_counter()
+
+    async def events() -> AsyncIterator[str]:
+        first_token_ms = None
+        try:
+            async for event, data in orchestrator.complete_stream(prompt=req.prompt, top_k=req.top_k, token_budget=req.token_budget):
+                if event == "delta" and first_token_ms is None:
+                    first_token_ms = round((time.perf_counter() - started) * 1000, 1)
+                if event == "done":
+                    data = {**data, "time_to_first_token_ms": first_token_ms, "elapsed_ms": round((time.perf_counter() - started) * 1000, 1)}
+                yield _sse(event, data)
+        except Exception as e:
+            logger.exception("Streaming agent completion failed")
+            yield _sse("error", {"detail": getattr(e, "detail", None) or str(e)})
+
+    return StreamingResponse(events(), media_type="text/event-stream", headers=_SSE_HEADERS)
+
+
 @app.post("/agent", response_model=CreateAgentResponse)
 async def create_agent(req: CreateAgentRequest):
     _ensure_components()
@@ -384,7 +590,7 @@ async def create_agent(req: CreateAgentRequest):
         "tools": req.tools or ["search_context", "send_email", "edit_pdf", "generate_pdf_report"],
         "project_id": req.project_id,
     }
-    agent_id = _mongo.save_agent(doc)
+    agent_id = await run_io(_mongo.save_agent, doc)
     return CreateAgentResponse(agent_id=agent_id)
 
 
@@ -392,7 +598,7 @@ async def create_agent(req: CreateAgentRequest):
 async def run_agent(agent_id: str, req: RunAgentRequest):
     _ensure_components()
     assert _mongo is not None and _retriever is not None and _encoder is not None
-    cfg = _mongo.get_agent_by_id(agent_id)
+    cfg = await run_io(_mongo.get_agent_by_id, agent_id)
     if not cfg:
         raise HTTPException(404, "Agent not found")
     
@@ -412,46 +618,63 @@ async def run_agent(agent_id: str, req: RunAgentRequest):
     return AgentResponse(answer=result["answer"], steps=result.get("steps", []))
 
 
+_ANSWER_SYSTEM_PROMPT = "You are a helpful assistant answering with provided context. Cite filenames or function names when relevant."
+
+_SSE_HEADERS = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+
+
+def _sse(event: str, data: Dict[str, Any]) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n"
+
+
+def _openai_answer_request(query: str, context: str) -> Tuple[Dict[str, str], Dict[str, Any]]:
+    key = settings.openai_api_key or os.getenv("OPENAI_API_KEY")
+    if not key:
+        raise HTTPException(500, "OPENAI_API_KEY not configured")
+    user_prompt = f"Question: {query}\n\nContext:\n{context}"
+    headers = {"Authorization": f"Bearer {key}", "Content-Type": "application/json"}
+    body = {
+        "model": settings.openai_model,
+        "messages": [
+            {"role": "system", "content": _ANSWER_SYSTEM_PROMPT},
+            {"role": "user", "content": user_prompt}
+        ],
+        "max_tokens": settings.max_answer_tokens,
+        "temperature": 0.2,
+    }
+    return headers, body
+
+
+def _gemini_answer_request(query: str, context: str):
+    key = settings.gemini_api_key or os.getenv("GEMINI_API_KEY")
+    if not key:
+        raise HTTPException(500, "GEMINI_API_KEY not configured")
+    model = _gemini_model(key, settings.gemini_model)
+    user_prompt = f"Question: {query}\n\nContext:\n{context}"
+    return model, f"{_ANSWER_SYSTEM_PROMPT}\n\n{user_prompt}"
+
+
+def _hf_prompt(query: str, context: str) -> str:
+    return f"You are a helpful assistant. Use the provided context to answer succinctly.\n\nContext:\n{context}\n\nQuestion: {query}\nAnswer:"
+
+
 async def _generate_answer(query: str, context: str) -> str:
     if settings.llm_backend == "openai":
-        import os
         import httpx
-        key = settings.openai_api_key or os.getenv("OPENAI_API_KEY")
-        if not key:
-            raise HTTPException(500, "OPENAI_API_KEY not configured")
-        sys_prompt = "You are a helpful assistant answering with provided context. Cite filenames or function names when relevant."
-        user_prompt = f"Question: {query}\n\nContext:\n{context}"
-        headers = {"Authorization": f"Bearer {key}", "Content-Type": "application/json"}
-        body = {
-            "model": settings.openai_model,
-            "messages": [
-                {"role": "system", "content": sys_prompt},
-                {"role": "user", "content": user_prompt}
-            ],
-            "max_tokens": settings.max_answer_tokens,
-            "temperature": 0.2,
-        }
+        headers, body = _openai_answer_request(query, context)
         async with httpx.AsyncClient(timeout=60) as client:
             r = await client.post("https://api.openai.com/v1/chat/completions", headers=headers, json=body)
             r.raise_for_status()
             data = r.json()
             return data["choices"][0]["message"]["content"].strip()
     elif settings.llm_backend == "gemini":
-        import google.generativeai as genai
         from google.api_core.exceptions import ResourceExhausted
-        import asyncio
-        key = settings.gemini_api_key or os.getenv("GEMINI_API_KEY")
-        if not key:
-            raise HTTPException(500, "GEMINI_API_KEY not configured")
-        genai.configure(api_key=key)
-        model = genai.GenerativeModel(settings.gemini_model)
-        sys_prompt = "You are a helpful assistant answering with provided context. Cite filenames or function names when relevant."
-        user_prompt = f"Question: {query}\n\nContext:\n{context}"
+        model, prompt = _gemini_answer_request(query, context)
         
         max_retries = 3
         for attempt in range(max_retries):
             try:
-                response = model.generate_content(f"{sys_prompt}\n\n{user_prompt}")
+                response = await model.generate_content_async(prompt)
                 return response.text.strip()
             except ResourceExhausted as e:
                 if attempt < max_retries - 1:
@@ -465,9 +688,159 @@ async def _generate_answer(query: str, context: str) -> str:
                 logger.error(f"Gemini API error: {e}")
                 raise HTTPException(500, f"LLM generation failed: {str(e)}")
     else:
-        from transformers import pipeline
         n = min(settings.max_answer_tokens, 256)
-        generator = pipeline("text2text-generation", model=settings.hf_model_name)
-        prompt = f"You are a helpful assistant. Use the provided context to answer succinctly.\n\nContext:\n{context}\n\nQuestion: {query}\nAnswer:"
-        out = generator(prompt, max_new_tokens=n, do_sample=True)
+        prompt = _hf_prompt(query, context)
+        slots = await _hf_acquire()
+        try:
+            generator = await run_cpu(_hf_generator, settings.hf_model_name)
+        except BaseException:
+            slots.release()
+            raise
+        out = await _hf_run(slots, generator, prompt, max_new_tokens=n, do_sample=True)
         return out[0]["generated_text"].strip()
+
+
+async def _stream_answer(query: str, context: str, usage: Dict[str, Any]) -> AsyncIterator[str]:
+    """
+    ``_generate_answer`` as a stream of text deltas. Token usage reported by
+    the backend (prompt/completion tokens) is written into ``usage``.
+    """
+    if settings.llm_backend == "openai":
+        import httpx
+        headers, body = _openai_answer_request(query, context)
+        body = {**body, "stream": True, "stream_options": {"include_usage": True}}
+        async with httpx.AsyncClient(timeout=60) as client:
+            async with client.stream("POST", "https://api.openai.com/v1/chat/completions", headers=headers, json=body) as r:
+                r.raise_for_status()
+                async for line in r.aiter_lines():
+                    if not line.startswith("data:"):
+                        continue
+                    payload = line[5:].strip()
+                    if payload == "[DONE]":
+                        break
+                    data = json.loads(payload)
+                    if data.get("usage"):
+                        usage.update(data["usage"])
+                    for choice in data.get("choices") or []:
+                        text = (choice.get("delta") or {}).get("content")
+                        if text:
+                            yield text
+    elif settings.llm_backend == "gemini":
+        from google.api_core.exceptions import ResourceExhausted
+        model, prompt = _gemini_answer_request(query, context)
+        try:
+            response = await model.generate_content_async(prompt, stream=True)
+            async for chunk in response:
+                if chunk.candidates and chunk.candidates[0].content.parts:
+                    yield chunk.text
+        except ResourceExhausted as e:
+            raise HTTPException(429, f"LLM quota exceeded. Please wait 30s and retry. Error: {str(e)}")
+        meta = getattr(response, "usage_metadata", None)
+        if meta is not None:
+            usage.update({
+                "prompt_tokens": meta.prompt_token_count,
+                "completion_tokens": meta.candidates_token_count,
+                "total_tokens": meta.total_token_count,
+            })
+    else:
+        from transformers import TextIteratorStreamer
+        n = min(settings.max_answer_tokens, 256)
+        prompt = _hf_prompt(query, context)
+        slots = await _hf_acquire()
+        try:
+            generator = await run_cpu(_hf_generator, settings.hf_model_name)
+            streamer = TextIteratorStreamer(generator.tokenizer, skip_prompt=True, skip_special_tokens=True, timeout=_HF_STREAM_POLL)
+        except BaseException:
+            slots.release()
+            raise
+        job = _hf_run(slots, generator, prompt, max_new_tokens=n, do_sample=True, streamer=streamer)
+        pieces = iter(streamer)
+        parts: List[str] = []
+        try:
+            while True:
+                piece = await run_io(_next_piece, pieces)
+                if piece is _STREAM_END:
+                    break
+                if piece is _STREAM_PENDING:
+                    if job.done():
+                        job.result()  # re-raises a failed generation
+                        break
+                    continue
+                if piece:
+                    parts.append(piece)
+                    yield piece
+            await job
+        finally:
+            if not job.done():
+                # The generation thread cannot be interrupted; let it finish in the background.
+                job.add_done_callback(lambda f: f.exception())
+        tokenizer = generator.tokenizer
+        usage.update({
+            "prompt_tokens": len(tokenizer(prompt).input_ids),
+            "completion_tokens": len(tokenizer("".join(parts)).input_ids),
+        })
+
+
+# Seconds the HF streamer waits for the next token before the generation job is checked.
+_HF_STREAM_POLL = 1.0
+_STREAM_END = object()
+_STREAM_PENDING = object()
+
+
+def _next_piece(pieces):
+    try:
+        return next(pieces, _STREAM_END)
+    except queue.Empty:
+        return _STREAM_PENDING
+
+
+@lru_cache(maxsize=4)
+def _gemini_model(api_key: str, model_name: str):
+    import google.generativeai as genai
+    genai.configure(api_key=api_key)
+    return genai.GenerativeModel(model_name)
+
+
+@lru_cache(maxsize=2)
+def _hf_generator(model_name: str):
+    """Local text2text pipeline, loaded once per model instead of per request."""
+    from transformers import pipeline
+    return pipeline("text2text-generation", model=model_name)
+
+
+_hf_semaphore: Optional[asyncio.Semaphore] = None
+
+
+def _hf_slots() -> asyncio.Semaphore:
+    global _hf_semaphore
+    if _hf_semaphore is None:
+        _hf_semaphore = asyncio.Semaphore(max(1, settings.hf_max_concurrent_generations))
+    return _hf_semaphore
+
+
+async def _hf_acquire() -> asyncio.Semaphore:
+    slots = _hf_slots()
+    await slots.acquire()
+    return slots
+
+
+def _hf_run(slots: asyncio.Semaphore, generator: Any, prompt: str, **kwargs: Any) -> "asyncio.Future[Any]":
+    """
+    Start ``generator`` on the CPU pool, taking over an acquired HF slot. The
+    slot is released when the generation thread finishes rather than when the
+    caller stops waiting: a client disconnect cannot stop the thread, so
+    freeing the slot then would let more generations run than allowed.
+    """
+    loop = asyncio.get_running_loop()
+    try:
+        fut = cpu_pool().submit(partial(generator, prompt, **kwargs))
+    except BaseException:
+        slots.release()
+        raise
+
+    def _release(_):
+        if not loop.is_closed():
+            loop.call_soon_threadsafe(slots.release)
+
+    fut.add_done_callback(_release)
+    return asyncio.wrap_future(fut)
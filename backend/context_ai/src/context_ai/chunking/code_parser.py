@@ -1,8 +1,8 @@
 from __future__ import annotations
 import ast
 import re
-from typing import Dict, List, Optional
-from ..utils.tokenization import approximate_token_count, split_by_token_limit
+from typing import Dict, List, Optional, Tuple
+from ..utils.tokenization import approximate_token_count, count_tokens_many, fits_token_limit, split_by_token_limit
 
 
 PY_FUNC_RE = re.compile(r"^(def|class)\s+\w+\s*\(?.*", re.MULTILINE)
@@ -21,94 +21,119 @@ def _detect_language(path: str) -> str:
     return 'text'
 
 
-def chunk_python_code(text: str) -> List[Dict]:
-    chunks: List[Dict] = []
+_DEF_NODES = (ast.FunctionDef, ast.AsyncFunctionDef)
+
+# Chunk "kind" metadata values (Python AST names and js_parser kinds) per section.
+_FUNCTION_KINDS = {"FunctionDef", "AsyncFunctionDef", "function"}
+_CLASS_KINDS = {"ClassDef", "class"}
+
+
+def _node_span(node: ast.AST) -> Tuple[int, int]:
+    """0-based [start, end) line span of a definition, decorators included."""
+    start = min([node.lineno] + [d.lineno for d in getattr(node, "decorator_list", [])]) - 1
+    return start, getattr(node, "end_lineno", None) or node.lineno
+
+
+def chunk_python_code(text: str, max_tokens: int = 1500) -> List[Dict]:
+    """
+    One chunk per top-level function or class, prefixed with the file's imports,
+    module docstring and up to three preceding lines. Classes that would not
+    fit ``max_tokens`` are emitted as an outline chunk plus one chunk per
+    method, so they do not have to be cut mid-body. The shared header is built
+    once and token counts are computed in one batch at the end.
+    """
     try:
         tree = ast.parse(text)
     except SyntaxError:
         return chunk_code_by_regex(text, lang='python')
 
-    lines = text.splitlines()
+    lines = text.splitlines(keepends=True)
+    offsets = [0]
+    for line in lines:
+        offsets.append(offsets[-1] + len(line))
 
-    imports = []
-    module_docstring = ""
-    for node in tree.body:
-        if isinstance(node, (ast.Import, ast.ImportFrom)):
-            start = node.lineno - 1
-            end = getattr(node, 'end_lineno', start)
-            imports.append("\n".join(lines[start:end]))
-        elif isinstance(node, ast.Expr) and isinstance(node.value, ast.Constant):
-            if isinstance(node.value.value, str):
-                module_docstring = node.value.value
-                break
-
-    imports_text = "\n".join(imports)
-    
-    def get_src_with_context(node: ast.AST, include_docstring: bool = True) -> str:
-        if not hasattr(node, 'lineno'):
-            return ''
-        start = node.lineno - 1
-        end = getattr(node, 'end_lineno', start)
-        
-        src = "\n".join(lines[start:end])
-        
-        context_parts = []
-        if imports_text:
-            context_parts.append("# File imports:\n" + imports_text)
-        
-        if module_docstring and include_docstring:
-            context_parts.append('"""' + module_docstring[:200] + '..."""' if len(module_docstring) > 200 else '"""' + module_docstring + '"""')
-        
-        context_before = []
-        for i in range(max(0, start - 3), start):
-            line = lines[i].strip()
-            if line and not line.startswith('#'):
-                context_before.append(lines[i])
-        
-        if context_parts or context_before:
-            full_context = "\n".join(context_parts)
-            if context_before:
-                full_context += "\n# ... preceding context ...\n" + "\n".join(context_before)
-            full_context += "\n\n" + src
-            return full_context
-        
-        return src
+    def src_of(start: int, end: int) -> str:
+        return text[offsets[start]:offsets[min(end, len(lines))]].rstrip("\n")
 
-    chunk_id = 0
-    for node in tree.body:
-        if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)):
-            src = get_src_with_context(node)
-            if src.strip():
-                name = getattr(node, 'name', '')
-                
-                if isinstance(node, ast.ClassDef):
-                    methods = [n.name for n in node.body if isinstance(n, (ast.FunctionDef, ast.AsyncFunctionDef))]
-                    if methods:
-                        src = f"# Class methods: {', '.join(methods[:10])}\n\n" + src
-                
-                chunks.append({
-                    "chunk_id": f"{chunk_id}",
-                    "text": src,
-                    "metadata": {
-                        "language": "python",
-                        "symbol": name,
-                        "kind": node.__class__.__name__,
-                        "token_count": approximate_token_count(src),
-                        "file_ext": "py",
-                    }
-                })
-                chunk_id += 1
-    
-    if not chunks:
+    imports = [src_of(n.lineno - 1, n.end_lineno or n.lineno) for n in tree.body if isinstance(n, (ast.Import, ast.ImportFrom))]
+    module_docstring = ast.get_docstring(tree, clean=False) or ""
+
+    header_parts = []
+    if imports:
+        header_parts.append("# File imports:\n" + "\n".join(imports))
+    if module_docstring:
+        header_parts.append('"""' + module_docstring[:200] + '..."""' if len(module_docstring) > 200 else '"""' + module_docstring + '"""')
+    header = "\n".join(header_parts)
+    header_tokens = approximate_token_count(header) if header else 0
+
+    def with_context(start: int, src: str, prefix: str = "") -> str:
+        context_before = [lines[i].rstrip("\n") for i in range(max(0, start - 3), start)
+                          if lines[i].strip() and not lines[i].strip().startswith('#')]
+        if not header and not context_before:
+            return prefix + src
+        full = header
+        if context_before:
+            full += "\n# ... preceding context ...\n" + "\n".join(context_before)
+        return full + "\n\n" + prefix + src
+
+    chunks: List[Dict] = []
+
+    def add(text_: str, symbol: str, kind: str, **extra):
         chunks.append({
-            "chunk_id": "0",
-            "text": text,
-            "metadata": {
-                "language": "python",
-                "token_count": approximate_token_count(text),
-                "file_ext": "py",
-            }
+            "chunk_id": str(len(chunks)),
+            "text": text_,
+            "metadata": {"language": "python", "symbol": symbol, "kind": kind, "file_ext": "py", **extra},
         })
+
+    for node in tree.body:
+        if not isinstance(node, _DEF_NODES + (ast.ClassDef,)):
+            continue
+        start, end = _node_span(node)
+        src = src_of(start, end)
+        if not src.strip():
+            continue
+        kind = node.__class__.__name__
+        if not isinstance(node, ast.ClassDef):
+            add(with_context(start, src), node.name, kind)
+            continue
+
+        methods = [n for n in node.body if isinstance(n, _DEF_NODES)]
+        listing = f"# Class methods: {', '.join(m.name for m in methods[:10])}\n\n" if methods else ""
+        if not methods or fits_token_limit(src, max_tokens - header_tokens):
+            add(with_context(start, src, listing), node.name, kind)
+            continue
+
+        # Outline: the class body in order with method bodies elided (they get
+        # their own chunks). Attributes, comments and nested classes are kept whole.
+        body_start = _node_span(node.body[0])[0]
+        outline = [src_of(start, body_start)]
+        prev = body_start
+        for stmt in node.body:
+            s_start, s_end = _node_span(stmt)
+            between = src_of(prev, s_start)
+            if between.strip():
+                outline.append(between)
+            if not isinstance(stmt, _DEF_NODES):
+                outline.append(src_of(s_start, s_end))
+            elif stmt.body[0].lineno == stmt.lineno:
+                outline.append(src_of(s_start, stmt.lineno))
+            else:
+                outline.append(src_of(s_start, stmt.body[0].lineno - 1) + "\n" + " " * (stmt.col_offset + 4) + "...")
+            prev = s_end
+        outline = "\n".join(part for part in outline if part)
+        add(with_context(start, outline, listing), node.name, kind)
+
+        class_line = src_of(node.lineno - 1, node.lineno)
+        for m in methods:
+            m_start, m_end = _node_span(m)
+            method_src = f"{class_line}\n    # ... method of {node.name}\n" + src_of(m_start, m_end)
+            add(with_context(start, method_src), f"{node.name}.{m.name}", m.__class__.__name__, parent_class=node.name)
+
+    if not chunks:
+        chunks.append({"chunk_id": "0", "text": text, "metadata": {"language": "python", "file_ext": "py"}})
+
+    for ch, n in zip(chunks, count_tokens_many([c["text"] for c in chunks])):
+        ch["metadata"]["token_count"] = n
     return chunks
 
 
@@ -164,30 +189,33 @@ def chunk_code_by_regex(text: str, lang: str) -> List[Dict]:
     return chunks
 
 
-def chunk_code(path: str, text: str, max_tokens: int = 1500, overlap: int = 200) -> List[Dict]:
+def chunk_code(path: str, text: str, max_tokens: int = 1500, overlap: int = 200, chunkers: Optional[Dict[str, str]] = None) -> List[Dict]:
     """
     Improved chunking with better context preservation.
     Increased defaults: max_tokens=1500, overlap=200 for better context.
+    The chunker comes from the registry by file extension; ``chunkers``
+    overrides it per extension (see ``registry.resolve``).
     """
-    lang = _detect_language(path)
-    if lang == 'python':
-        chunks = chunk_python_code(text)
-    else:
-        chunks = chunk_code_by_regex(text, 'javascript' if lang in ['javascript', 'typescript'] else lang)
+    from .registry import resolve
+
+    ext = path.rsplit('.', 1)[-1].lower() if '.' in path else ''
+    chunker, lang = resolve(ext, chunkers)
+    chunks = chunker(text, lang, max_tokens)
 
     out: List[Dict] = []
     cid = 0
     for ch in chunks:
         t = ch["text"]
-        if approximate_token_count(t) <= max_tokens:
+        known = ch.get("metadata", {}).get("token_count")
+        if known <= max_tokens if known is not None else fits_token_limit(t, max_tokens):
             ch["chunk_id"] = str(cid)
             meta = ch.get("metadata", {})
             kind = meta.get("kind")
             symbol = meta.get("symbol")
-            if kind in ("FunctionDef", "AsyncFunctionDef"):
+            if kind in _FUNCTION_KINDS:
                 ch["function_name"] = symbol
                 ch["section"] = "function"
-            elif kind == "ClassDef":
+            elif kind in _CLASS_KINDS:
                 ch["function_name"] = None
                 ch["section"] = "class"
             ch["file_ext"] = meta.get("file_ext")
@@ -196,16 +224,15 @@ def chunk_code(path: str, text: str, max_tokens: int = 1500, overlap: int = 200)
             cid += 1
         else:
             parts = split_by_token_limit(t, max_tokens=max_tokens, overlap=overlap)
-            for idx, part in enumerate(parts):
-                meta = ch.get("metadata", {})
+            meta = ch.get("metadata", {})
+            symbol = meta.get("symbol")
+            if len(parts) > 1:
+                parts = [f"# Part {idx+1}/{len(parts)} of {symbol or 'chunk'}\n\n{part}" for idx, part in enumerate(parts)]
+            part_counts = count_tokens_many(parts)
+            for idx, part_text in enumerate(parts):
                 kind = meta.get("kind")
-                symbol = meta.get("symbol")
-                section = "function" if kind in ("FunctionDef", "AsyncFunctionDef") else ("class" if kind == "ClassDef" else None)
-                
-                part_text = part
-                if len(parts) > 1:
-                    part_text = f"# Part {idx+1}/{len(parts)} of {symbol or 'chunk'}\n\n{part}"
-                
+                section = "function" if kind in _FUNCTION_KINDS else ("class" if kind in _CLASS_KINDS else ch.get("section"))
+
                 out.append({
                     "chunk_id": str(cid),
                     "text": part_text,
@@ -213,7 +240,7 @@ def chunk_code(path: str, text: str, max_tokens: int = 1500, overlap: int = 200)
                     "section": section,
                     "file_ext": meta.get("file_ext"),
                     "language": meta.get("language") or lang,
-                    "metadata": {**meta, "token_count": approximate_token_count(part_text), "part_index": idx}
+                    "metadata": {**meta, "token_count": part_counts[idx], "part_index": idx}
                 })
                 cid += 1
     return out
@@ -0,0 +1,241 @@
+from __future__ import annotations
+import re
+from typing import Dict, List, Optional, Tuple
+from ..utils.tokenization import count_tokens_many
+
+
+# Leading modifiers stripped before classifying a top-level statement.
+_MODIFIERS_RE = re.compile(r"^(?:(?:export|default|declare|abstract|async)\s+)+")
+_DECL_RE = re.compile(
+    r"^(?:(?P<kind>function\*?|class|interface|enum|namespace|module)\s+(?P<name>[\w$]+)"
+    r"|(?:const|let|var)\s+(?P<var>[\w$]+)\s*(?::[^=]+)?=\s*(?P<value>.*))",
+    re.S,
+)
+_TYPE_RE = re.compile(r"^type\s+(?P<name>[\w$]+)")
+_FUNC_VALUE_RE = re.compile(r"^(?:async\s+)?(?:function\b|\([^)]*\)\s*(?::[^=]+)?=>|[\w$]+\s*=>|class\b)")
+_CONTINUATION_START = (".", "?", ":", "+", "-", "*", "/", "%", "&", "|", "^", ")", "]", ",", "=")
+_CONTINUATION_END = (",", "(", "[", "{", "=", "+", "-", "*", "/", "%", "&", "|", "^", "?", ":", "=>", ".")
+
+
+def _skip_string(text: str, i: int, quote: str) -> int:
+    """Index just past the string literal opening at ``i``."""
+    n = len(text)
+    i += 1
+    while i < n:
+        c = text[i]
+        if c == "\\":
+            i += 2
+            continue
+        if c == quote:
+            return i + 1
+        if quote != "`" and c == "\n":
+            return i
+        if quote == "`" and c == "$" and text.startswith("${", i):
+            i = _skip_block(text, i + 1)
+            continue
+        i += 1
+    return n
+
+
+def _skip_block(text: str, i: int) -> int:
+    """Index just past the brace block opening at ``text[i] == '{'``."""
+    depth = 0
+    n = len(text)
+    while i < n:
+        c = text[i]
+        if c in "\"'`":
+            i = _skip_string(text, i, c)
+            continue
+        if c == "/" and text.startswith("//", i):
+            i = text.find("\n", i)
+            i = n if i == -1 else i
+            continue
+        if c == "/" and text.startswith("/*", i):
+            j = text.find("*/", i + 2)
+            i = n if j == -1 else j + 2
+            continue
+        if c == "{":
+            depth += 1
+        elif c == "}":
+            depth -= 1
+            if depth == 0:
+                return i + 1
+        i += 1
+    return n
+
+
+def _regex_allowed(text: str, i: int) -> bool:
+    """Whether a ``/`` at ``i`` starts a regex literal rather than a division."""
+    j = i - 1
+    while j >= 0 and text[j] in " \t":
+        j -= 1
+    if j < 0 or text[j] in "(,=:[!&|?{};\n":
+        return True
+    m = re.search(r"\b(?:return|typeof|case|do|else|in|of)$", text[max(0, j - 7):j + 1])
+    return m is not None
+
+
+def _skip_regex(text: str, i: int) -> int:
+    n = len(text)
+    i += 1
+    in_class = False
+    while i < n:
+        c = text[i]
+        if c == "\\":
+            i += 2
+            continue
+        if c == "\n":
+            return i
+        if c == "[":
+            in_class = True
+        elif c == "]":
+            in_class = False
+        elif c == "/" and not in_class:
+            i += 1
+            while i < n and (text[i].isalnum() or text[i] == "_"):
+                i += 1
+            return i
+        i += 1
+    return n
+
+
+def split_statements(text: str) -> List[Tuple[int, int]]:
+    """
+    Character spans of the top-level statements of a JS/TS source.
+    Strings, template literals, comments and regex literals are skipped while
+    tracking bracket depth; a statement ends at a ``;`` or at a newline with
+    all brackets closed, unless the line ends in, or the next line starts
+    with, an operator that continues it. Comments before a statement belong
+    to it.
+    """
+    spans: List[Tuple[int, int]] = []
+    n = len(text)
+    depth = 0
+    start: Optional[int] = None
+    i = 0
+
+    def close(end: int):
+        nonlocal start
+        if start is not None and text[start:end].strip():
+            spans.append((start, end))
+        start = None
+
+    while i < n:
+        c = text[i]
+        if start is None and not c.isspace():
+            start = i
+        if c in "\"'`":
+            i = _skip_string(text, i, c)
+            continue
+        if c == "/" and text.startswith("//", i):
+            j = text.find("\n", i)
+            i = n if j == -1 else j
+            continue
+        if c == "/" and text.startswith("/*", i):
+            j = text.find("*/", i + 2)
+            i = n if j == -1 else j + 2
+            continue
+        if c == "/" and _regex_allowed(text, i):
+            i = _skip_regex(text, i)
+            continue
+        if c in "([{":
+            depth += 1
+        elif c in ")]}":
+            depth = max(0, depth - 1)
+        elif c == ";" and depth == 0:
+            close(i + 1)
+        elif c == "\n" and depth == 0 and start is not None:
+            line_end = text[start:i].rstrip()
+            nxt = text[i:].lstrip()
+            if _is_only_comments(text[start:i]):
+                pass
+            elif not line_end.endswith(_CONTINUATION_END) and not nxt.startswith(_CONTINUATION_START):
+                close(i)
+        i += 1
+    close(n)
+    return spans
+
+
+def _is_only_comments(segment: str) -> bool:
+    stripped = re.sub(r"/\*.*?\*/|//[^\n]*", "", segment, flags=re.S)
+    return not stripped.strip()
+
+
+def _strip_leading_comments(segment: str) -> str:
+    return re.sub(r"^(?:\s+|/\*.*?\*/|//[^\n]*)*", "", segment, flags=re.S)
+
+
+def _classify(statement: str) -> Tuple[Optional[str], Optional[str]]:
+    """(kind, name) of a declaration worth its own chunk, else (None, None)."""
+    body = _strip_leading_comments(statement)
+    if body.startswith("import ") or body.startswith("import{") or re.match(r"^(?:const|let|var)\s+[\w${},\s]+=\s*require\(", body):
+        return "import", None
+    core = _MODIFIERS_RE.sub("", body)
+    m = _TYPE_RE.match(core)
+    if m:
+        return "type", m.group("name")
+    m = _DECL_RE.match(core)
+    if not m:
+        return None, None
+    if m.group("kind"):
+        return m.group("kind").rstrip("*"), m.group("name")
+    if _FUNC_VALUE_RE.match(m.group("value").lstrip()):
+        return "function", m.group("var")
+    return None, None
+
+
+def chunk_js_code(text: str, lang: str = "javascript", max_tokens: int = 1500) -> List[Dict]:
+    """
+    One chunk per top-level function, class, interface, enum or
+    function-valued binding of a JS/TS file, exported or not. Each is
+    prefixed with the file's imports. Other top-level statements are merged
+    into module chunks of up to ``max_tokens``.
+    """
+    spans = split_statements(text)
+    imports: List[str] = []
+    units: List[Tuple[Optional[str], Optional[str], str]] = []
+    for s, e in spans:
+        statement = text[s:e]
+        kind, name = _classify(statement)
+        if kind == "import":
+            imports.append(statement.strip())
+        else:
+            units.append((kind, name, statement.strip()))
+
+    header = "// File imports/requires:\n" + "\n".join(imports) + "\n\n" if imports else ""
+    pieces: List[Tuple[Optional[str], Optional[str], str]] = []
+    pending: List[str] = []
+    pending_tokens = 0
+    loose = [u[2] for u in units if u[0] is None]
+    loose_counts = dict(zip(loose, count_tokens_many(loose))) if loose else {}
+
+    def flush():
+        nonlocal pending, pending_tokens
+        if pending:
+            pieces.append((None, None, "\n".join(pending)))
+        pending, pending_tokens = [], 0
+
+    for kind, name, statement in units:
+        if kind is None:
+            n = loose_counts.get(statement, 0)
+            if pending and pending_tokens + n > max_tokens:
+                flush()
+            pending.append(statement)
+            pending_tokens += n
+            continue
+        flush()
+        pieces.append((kind, name, statement))
+    flush()
+
+    if not pieces:
+        return [{"chunk_id": "0", "text": text, "metadata": {"language": lang, "token_count": count_tokens_many([text])[0]}}]
+
+    texts = [header + p[2] for p in pieces]
+    chunks: List[Dict] = []
+    for cid, ((kind, name, _), chunk_text, count) in enumerate(zip(pieces, texts, count_tokens_many(texts))):
+        meta: Dict = {"language": lang, "token_count": count}
+        if kind:
+            meta["kind"] = kind
+            meta["symbol"] = name
+        chunks.append({"chunk_id": str(cid), "text": chunk_text, "metadata": meta})
+    return chunks
@@ -0,0 +1,77 @@
+from __future__ import annotations
+import re
+from typing import Dict, List, Tuple
+from ..utils.tokenization import count_tokens_many
+
+
+_HEADING_RE = re.compile(r"^(#{1,6})[ \t]+(.+?)[ \t#]*$")
+_FENCE_RE = re.compile(r"^[ \t]{0,3}(`{3,}|~{3,})")
+
+
+def _sections(text: str) -> List[Tuple[List[str], str]]:
+    """(heading path, section text) pairs, splitting at ATX headings outside code fences."""
+    path: List[Tuple[int, str]] = []
+    sections: List[Tuple[List[str], str]] = []
+    current: List[str] = []
+    current_path: List[str] = []
+    fence = None
+
+    for line in text.splitlines(keepends=True):
+        m = _FENCE_RE.match(line)
+        if m:
+            marker = m.group(1)
+            if fence is None:
+                fence = marker[0] * 3
+            elif marker.startswith(fence):
+                fence = None
+        heading = _HEADING_RE.match(line.rstrip("\n")) if fence is None else None
+        if heading:
+            if "".join(current).strip():
+                sections.append((current_path, "".join(current)))
+            level = len(heading.group(1))
+            path = [p for p in path if p[0] < level] + [(level, heading.group(2).strip())]
+            current_path = [title for _, title in path]
+            current = [line]
+        else:
+            current.append(line)
+    if "".join(current).strip():
+        sections.append((current_path, "".join(current)))
+    return sections
+
+
+def chunk_markdown(text: str, max_tokens: int = 1500) -> List[Dict]:
+    """
+    Split Markdown at headings. Each chunk starts with the heading path
+    leading to it; consecutive sections under the same parent are merged
+    while they fit ``max_tokens``, and oversized sections are left to the
+    caller's token splitter.
+    """
+    sections = _sections(text)
+    if not sections:
+        return [{"chunk_id": "0", "text": text, "metadata": {"language": "markdown", "token_count": count_tokens_many([text])[0]}}]
+
+    counts = count_tokens_many([body for _, body in sections])
+    groups: List[Tuple[List[str], List[str], int]] = []
+    for (path, body), n in zip(sections, counts):
+        if groups:
+            g_path, g_bodies, g_tokens = groups[-1]
+            if g_path[:-1] == path[:-1] and g_tokens + n <= max_tokens:
+                g_bodies.append(body)
+                groups[-1] = (g_path, g_bodies, g_tokens + n)
+                continue
+        groups.append((path, [body], n))
+
+    texts = []
+    for path, bodies, _ in groups:
+        context = "Document context: " + " > ".join(path[:-1]) + "\n\n" if len(path) > 1 else ""
+        texts.append(context + "".join(bodies).strip())
+
+    chunks: List[Dict] = []
+    for cid, ((path, _, _), chunk_text, n) in enumerate(zip(groups, texts, count_tokens_many(texts))):
+        chunks.append({
+            "chunk_id": str(cid),
+            "text": chunk_text,
+            "section": path[-1] if path else None,
+            "metadata": {"language": "markdown", "headings": path, "token_count": n},
+        })
+    return chunks
@@ -1,8 +1,16 @@
 from __future__ import annotations
+import itertools
+import multiprocessing
+import os
 import re
+import threading
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
 from dataclasses import dataclass
-from typing import Dict, Iterable, List, Optional
+from typing import Deque, Dict, Iterable, Iterator, List, Optional
 import fitz
+from ..config import settings
 from ..utils.tokenization import approximate_token_count, split_by_token_limit
 
 
@@ -17,14 +25,90 @@ class PDFChunk:
 HEADING_RE = re.compile(r"^(?:\d+(?:\.\d+)*\s+)?[A-Z][A-Z\s\-:]{3,}$")
 
 
+def _extract_page_range(path: str, start: int, stop: int) -> List[str]:
+    """Text of pages ``start``..``stop - 1``; each worker opens its own document."""
+    with fitz.open(path) as doc:
+        return [doc.load_page(pno).get_text("text") for pno in range(start, stop)]
+
+
+_page_pool: Optional[ProcessPoolExecutor] = None
+_page_pool_lock = threading.Lock()
+
+
+def _get_page_pool(workers: int) -> ProcessPoolExecutor:
+    global _page_pool
+    with _page_pool_lock:
+        if _page_pool is None:
+            # Spawned like the ingest parse pool: it is created from a threaded server process.
+            _page_pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"))
+        return _page_pool
+
+
+def _drop_page_pool(pool: ProcessPoolExecutor):
+    """Forget a page pool whose worker died so the next document starts a fresh one."""
+    global _page_pool
+    with _page_pool_lock:
+        if _page_pool is pool:
+            _page_pool = None
+    pool.shutdown(wait=False, cancel_futures=True)
+
+
+def _uses_page_pool(page_count: int, workers: int, per_task: int) -> bool:
+    return workers > 1 and page_count >= 2 * per_task and multiprocessing.parent_process() is None
+
+
+def splits_pages(path: str) -> bool:
+    """
+    Whether ``iter_pages`` would extract this document on the page pool when
+    called from the current process, so callers can keep large PDFs out of
+    worker processes where extraction would fall back to one page at a time.
+    """
+    workers = settings.pdf_parse_workers or (os.cpu_count() or 1)
+    with fitz.open(path) as doc:
+        return _uses_page_pool(len(doc), workers, max(1, settings.pdf_pages_per_task))
+
+
+def iter_pages(path: str, workers: Optional[int] = None, pages_per_task: Optional[int] = None) -> Iterator[str]:
+    """
+    Yield page texts in order.
+    Documents spanning several ``pages_per_task`` ranges are extracted on a
+    process pool with at most two ranges per worker in flight, so memory
+    stays bounded by the window rather than the document. Inside a worker
+    process (e.g. the ingest parse pool) pages are extracted sequentially
+    instead of nesting another pool.
+    """
+    workers = workers or settings.pdf_parse_workers or (os.cpu_count() or 1)
+    per_task = max(1, pages_per_task or settings.pdf_pages_per_task)
+    with fitz.open(path) as doc:
+        page_count = len(doc)
+        if not _uses_page_pool(page_count, workers, per_task):
+            for pno in range(page_count):
+                yield doc.load_page(pno).get_text("text")
+            return
+
+    pool = _get_page_pool(workers)
+    ranges = iter([(start, min(start + per_task, page_count)) for start in range(0, page_count, per_task)])
+    pending: Deque[Future] = deque()
+    try:
+        for start, stop in itertools.islice(ranges, 2 * workers):
+            pending.append(pool.submit(_extract_page_range, path, start, stop))
+        while pending:
+            texts = pending.popleft().result()
+            nxt = next(ranges, None)
+            if nxt is not None:
+                pending.append(pool.submit(_extract_page_range, path, *nxt))
+            yield from texts
+    except BrokenProcessPool:
+        # A killed worker breaks the pool for good; later documents get a new one.
+        _drop_page_pool(pool)
+        raise
+    finally:
+        for fut in pending:
+            fut.cancel()
+
+
 def _extract_pages(path: str) -> List[str]:
-    doc = fitz.open(path)
-    pages = []
-    for pno in range(len(doc)):
-        page = doc.load_page(pno)
-        text = page.get_text("text")
-        pages.append(text)
-    return pages
+    return list(iter_pages(path))
 
 
 def _detect_headings(lines: List[str]) -> List[int]:
@@ -50,13 +134,20 @@ def chunk_pdf(path: str, max_tokens: int = 1500, overlap: int = 200) -> List[Dic
     - Includes previous heading context
     - Better paragraph boundary detection
     """
-    pages = _extract_pages(path)
-    chunks: List[Dict] = []
+    return list(iter_chunk_pdf(path, max_tokens=max_tokens, overlap=overlap))
+
+
+def iter_chunk_pdf(path: str, max_tokens: int = 1500, overlap: int = 200, workers: Optional[int] = None) -> Iterator[Dict]:
+    """
+    Yield ``chunk_pdf`` chunks as pages arrive from ``iter_pages``.
+    Heading context is carried across pages in document order, and only the
+    last three headings it uses are kept.
+    """
     chunk_id = 0
     previous_heading = None
-    all_headings = []
+    all_headings: List[str] = []
 
-    for page_idx, page_text in enumerate(pages):
+    for page_idx, page_text in enumerate(iter_pages(path, workers=workers)):
         lines = page_text.splitlines()
         if not lines:
             continue
@@ -64,8 +155,8 @@ def chunk_pdf(path: str, max_tokens: int = 1500, overlap: int = 200) -> List[Dic
         head_ix = _detect_headings(lines)
         for idx in head_ix:
             heading = lines[idx].strip()
-            if heading and heading not in all_headings[-3:]:
-                all_headings.append(heading)
+            if heading and heading not in all_headings:
+                all_headings = (all_headings + [heading])[-3:]
         
         boundaries = sorted(set([0] + head_ix + [len(lines)]))
         
@@ -99,7 +190,7 @@ def chunk_pdf(path: str, max_tokens: int = 1500, overlap: int = 200) -> List[Dic
             section_tokens = approximate_token_count(full_section)
             
             if section_tokens <= max_tokens:
-                chunks.append({
+                yield {
                     "chunk_id": f"{page_idx}-{chunk_id}",
                     "text": full_section,
                     "page": page_idx + 1,
@@ -112,7 +203,7 @@ def chunk_pdf(path: str, max_tokens: int = 1500, overlap: int = 200) -> List[Dic
                         "token_count": section_tokens,
                         "file_ext": "pdf",
                     }
-                })
+                }
                 chunk_id += 1
             else:
                 parts = split_by_token_limit(full_section, max_tokens=max_tokens, overlap=overlap)
@@ -123,7 +214,7 @@ def chunk_pdf(path: str, max_tokens: int = 1500, overlap: int = 200) -> List[Dic
                     else:
                         part_with_header = part
                     
-                    chunks.append({
+                    yield {
                         "chunk_id": f"{page_idx}-{chunk_id}",
                         "text": part_with_header,
                         "page": page_idx + 1,
@@ -138,7 +229,5 @@ def chunk_pdf(path: str, max_tokens: int = 1500, overlap: int = 200) -> List[Dic
                             "part_index": part_idx,
                             "total_parts": len(parts),
                         }
-                    })
+                    }
                     chunk_id += 1
-
-    return chunks
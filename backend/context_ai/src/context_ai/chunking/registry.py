@@ -0,0 +1,68 @@
+from __future__ import annotations
+from typing import Callable, Dict, List, Optional
+from .code_parser import chunk_code_by_regex, chunk_python_code
+from .js_parser import chunk_js_code
+from .markdown_parser import chunk_markdown
+from ..utils.tokenization import approximate_token_count
+
+# A chunker takes (text, language, max_tokens) and returns chunk dicts with
+# "chunk_id", "text" and "metadata" (including "token_count").
+Chunker = Callable[[str, str, int], List[Dict]]
+
+
+def _whole_file(text: str, lang: str, max_tokens: int) -> List[Dict]:
+    return [{"chunk_id": "0", "text": text, "metadata": {"language": lang, "token_count": approximate_token_count(text)}}]
+
+
+CHUNKERS: Dict[str, Chunker] = {
+    "python_ast": lambda text, lang, max_tokens: chunk_python_code(text, max_tokens=max_tokens),
+    "js_structural": lambda text, lang, max_tokens: chunk_js_code(text, lang=lang, max_tokens=max_tokens),
+    "markdown": lambda text, lang, max_tokens: chunk_markdown(text, max_tokens=max_tokens),
+    "regex": lambda text, lang, max_tokens: chunk_code_by_regex(text, lang),
+    "whole_file": _whole_file,
+}
+
+# Default chunker and language per file extension.
+EXTENSIONS: Dict[str, tuple] = {
+    "py": ("python_ast", "python"),
+    "js": ("js_structural", "javascript"),
+    "jsx": ("js_structural", "javascript"),
+    "mjs": ("js_structural", "javascript"),
+    "cjs": ("js_structural", "javascript"),
+    "ts": ("js_structural", "javascript"),
+    "tsx": ("js_structural", "javascript"),
+    "md": ("markdown", "markdown"),
+    "markdown": ("markdown", "markdown"),
+}
+
+
+def register_chunker(name: str, chunker: Chunker, extensions: Optional[Dict[str, str]] = None):
+    """Add a named chunker, optionally making it the default for ``{extension: language}``."""
+    CHUNKERS[name] = chunker
+    for ext, lang in (extensions or {}).items():
+        EXTENSIONS[ext.lower().lstrip(".")] = (name, lang)
+
+
+def has_chunker(ext: str) -> bool:
+    return ext in EXTENSIONS
+
+
+def language_for(ext: str) -> Optional[str]:
+    """The language registered for an extension, or None when it has no chunker."""
+    entry = EXTENSIONS.get(ext)
+    return entry[1] if entry else None
+
+
+def resolve(ext: str, overrides: Optional[Dict[str, str]] = None) -> tuple:
+    """
+    (chunker, language) for an extension. ``overrides`` maps extensions to
+    chunker names, letting a project pick e.g. ``{"js": "regex"}``; unknown
+    names raise ValueError.
+    """
+    name, lang = EXTENSIONS.get(ext, ("whole_file", "text"))
+    override = (overrides or {}).get(ext)
+    if override:
+        if override not in CHUNKERS:
+            raise ValueError(f"Unknown chunker '{override}' for .{ext}; available: {', '.join(sorted(CHUNKERS))}")
+        name = override
+    return CHUNKERS[name], lang
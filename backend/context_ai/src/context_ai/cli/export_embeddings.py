@@ -0,0 +1,22 @@
+from __future__ import annotations
+import argparse
+from ..config import settings
+from ..embeddings.onnx_backend import export_model, model_dir
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export the embedding model to ONNX (fp32 and int8) for EMBEDDING_BACKEND=onnx/onnx-int8")
+    parser.add_argument("--model", default=settings.embedding_model_name, help="SentenceTransformer model to export")
+    parser.add_argument("--out-dir", default=None, help="Export directory; defaults to the cache location the encoder loads from")
+    parser.add_argument("--no-quantize", action="store_true", help="Skip the int8-quantized copy")
+    parser.add_argument("--min-cosine", type=float, default=None, help="Parity threshold against the PyTorch model; overrides EMBEDDING_ONNX_MIN_COSINE")
+    args = parser.parse_args()
+
+    out_dir = args.out_dir or model_dir(args.model)
+    info = export_model(args.model, out_dir, quantize=not args.no_quantize, min_cosine=args.min_cosine)
+    print(f"Exported {args.model} to {out_dir}")
+    for variant, cosine in info["parity"].items():
+        print(f"  {variant}: min cosine vs PyTorch {cosine:.4f}")
+
+if __name__ == "__main__":
+    main()
@@ -1,13 +1,12 @@
 from __future__ import annotations
 import argparse
+import asyncio
 import os
 from glob import glob
-from pathlib import Path
 from ..storage.mongo_store import MongoStore
 from ..embeddings.encoder import EmbeddingEncoder
-from ..chunking.pdf_parser import chunk_pdf
-from ..chunking.code_parser import chunk_code
-from ..utils.tokenization import approximate_token_count
+from ..ingest.pipeline import IngestPipeline
+from ..chunking.registry import CHUNKERS
 from ..config import settings
 
 
@@ -18,7 +17,14 @@ def main():
     parser.add_argument("--recursive", action="store_true")
     parser.add_argument("--mongo-uri", help="MongoDB connection string; overrides env MONGO_URI", default=None)
     parser.add_argument("--mongo-db", help="MongoDB database name; overrides env MONGO_DB", default=None)
+    parser.add_argument("--chunker", action="append", default=[], metavar="EXT=NAME", help="Chunker override for an extension, e.g. js=regex (repeatable)")
     args = parser.parse_args()
+    chunkers = {}
+    for spec in args.chunker:
+        ext, _, name = spec.partition("=")
+        if not name or name not in CHUNKERS:
+            parser.error(f"--chunker {spec}: expected EXT=NAME with NAME one of {', '.join(sorted(CHUNKERS))}")
+        chunkers[ext.lower().lstrip(".")] = name
 
     mongo = MongoStore(uri=args.mongo_uri, db_name=args.mongo_db)
     encoder = EmbeddingEncoder()
@@ -30,27 +36,10 @@ def main():
     else:
         files = [args.path]
 
-    for path in files:
-        ext = Path(path).suffix.lower().lstrip('.')
-        if ext == 'pdf':
-            chunks = chunk_pdf(path)
-        else:
-            with open(path, "r", encoding="utf-8", errors="ignore") as f:
-                text = f.read()
-            if ext in ("py", "js", "ts", "md"):
-                chunks = chunk_code(path, text)
-            else:
-                chunks = [{"chunk_id": "0", "text": text, "metadata": {"token_count": approximate_token_count(text), "file_ext": ext}}]
-        for c in chunks:
-            meta = c.setdefault("metadata", {})
-            if args.project_id:
-                meta["project_id"] = args.project_id
-
-        doc_id = mongo.upsert_document(source_path=path, file_ext=ext, language=None, metadata={"project_id": args.project_id} if args.project_id else {})
-        embeddings = encoder.encode([c["text"] for c in chunks]).tolist()
-        mongo.insert_chunks(doc_id=doc_id, source_path=path, chunks=chunks, embeddings=embeddings)
-
-    print(f"Ingested {len(files)} files")
+    stats = asyncio.run(IngestPipeline(mongo, encoder, args.project_id, chunkers=chunkers or None).run(files))
+    for err in stats.errors:
+        print(f"Failed: {err}")
+    print(f"Ingested {stats.files_processed} files ({stats.files_skipped} unchanged, {stats.files_failed} failed)")
 
 if __name__ == "__main__":
     main()
@@ -18,7 +18,6 @@ def main():
     mongo = MongoStore(uri=args.mongo_uri, db_name=args.mongo_db)
     encoder = EmbeddingEncoder()
     retriever = Retriever(mongo, encoder)
-    retriever.index_all_from_mongo()
 
     filters = {}
     if args.project_id:
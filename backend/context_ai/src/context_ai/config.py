@@ -15,15 +15,56 @@ class Settings(BaseSettings):
     mongo_collection_chunks: str = Field(default="chunks")
     mongo_collection_agents: str = Field(default="agents")
     mongo_collection_conversations: str = Field(default="conversations")
+    mongo_collection_lexical_terms: str = Field(default="lexical_terms")
+    mongo_collection_lexical_stats: str = Field(default="lexical_stats")
+    mongo_collection_ingest_jobs: str = Field(default="ingest_jobs")
+    mongo_collection_project_settings: str = Field(default="project_settings")
 
     embedding_model_name: str = Field(default="sentence-transformers/all-MiniLM-L6-v2")
-    embedding_batch_size: int = Field(default=64)
+    embedding_batch_size: int = Field(default=64, description="Texts per embedding batch when embedding_batch_tokens is 0")
+    embedding_batch_tokens: int = Field(default=16384, description="Padded tokens per embedding batch; texts are sorted by length and batched up to this budget. 0 uses fixed embedding_batch_size batches")
+    embedding_coalesce_max_batch: int = Field(default=32, description="Concurrent query embeddings merged into one forward pass")
+    embedding_coalesce_max_wait_ms: float = Field(default=5.0, description="How long a query embedding waits for others to batch with")
+    embedding_cache_size: int = Field(default=2048, description="Query embeddings kept in the in-process LRU cache; 0 disables it")
+    embedding_backend: Literal["torch", "onnx", "onnx-int8"] = Field(default="torch", description="PyTorch SentenceTransformer, or its ONNX Runtime export (fp32 or int8-quantized) for CPU-only nodes")
+    embedding_onnx_dir: str = Field(default="models/onnx", description="Where ONNX exports of the embedding model are cached")
+    embedding_onnx_auto_export: bool = Field(default=False, description="Export the model on first use when no cached ONNX copy exists (needs torch); otherwise run context_ai.cli.export_embeddings first")
+    embedding_onnx_threads: int = Field(default=0, description="ONNX Runtime intra-op threads; 0 lets it use all cores")
+    embedding_onnx_min_cosine: float = Field(default=0.98, description="Lowest cosine similarity to the PyTorch embeddings an export must reach")
+
+    ingest_parse_workers: int = Field(default=0, description="Processes used to chunk files during ingest; 0 uses the CPU count, 1 parses in a thread")
+    ingest_io_workers: int = Field(default=8, description="Threads for file reads and Mongo writes during ingest")
+    ingest_queue_size: int = Field(default=32, description="Files buffered between ingest stages before upstream stages wait")
+    ingest_job_workers: int = Field(default=1, description="Ingest jobs run concurrently by the in-process job queue")
+    ingest_skip_dirs: str = Field(
+        default="node_modules,.git,vendor,dist,build,__pycache__,.venv,venv,.tox,.mypy_cache,.pytest_cache,.next,bower_components",
+        description="Comma-separated directory names never ingested from archives; matches GITHUB_IMPORT_SKIP_DIRS in the Django projects app",
+    )
+    ingest_job_lease_seconds: int = Field(default=60, description="Unfinished ingest jobs whose process stops renewing them for this long are marked failed")
+    pdf_parse_workers: int = Field(default=0, description="Processes extracting PDF pages in parallel; 0 uses the CPU count, 1 extracts sequentially")
+    pdf_pages_per_task: int = Field(default=16, description="Consecutive PDF pages extracted per worker task")
 
     vector_backend: Literal["faiss", "mongo"] = Field(default="faiss")
     index_dir: str = Field(default="index")
+    faiss_index_type: Literal["flat", "ivf_flat", "ivf_pq", "hnsw"] = Field(default="flat", description="ANN structure used once the index is large enough")
+    faiss_train_min_vectors: int = Field(default=20000, description="Stay on an exact flat index below this many vectors")
+    faiss_nlist: int = Field(default=0, description="IVF list count; 0 derives it from the corpus size")
+    faiss_pq_m: int = Field(default=48, description="PQ sub-quantizers (reduced to a divisor of the embedding dim)")
+    faiss_hnsw_m: int = Field(default=32)
+    faiss_nprobe: int = Field(default=16, description="Default IVF lists probed per query")
+    faiss_ef_search: int = Field(default=64, description="Default HNSW efSearch per query")
+    faiss_max_loaded_projects: int = Field(default=16, description="Per-project FAISS shards kept in memory (LRU)")
+    faiss_project_sync_seconds: int = Field(default=300, description="Re-sync a loaded project shard with Mongo after this many seconds")
     top_k: int = Field(default=6, description="Number of chunks to retrieve (reduced for larger chunks)")
     hybrid_alpha: float = Field(default=0.7, description="Weight for vector score in hybrid [0-1]")
-    mmr_lambda: float = Field(default=0.5)
+    hybrid_fusion: Literal["rrf", "weighted"] = Field(default="rrf", description="How vector and lexical rankings are combined")
+    rrf_k: int = Field(default=60, description="Rank offset for reciprocal-rank fusion")
+    lexical_candidates: int = Field(default=20, description="Candidates taken from the text index per query; 0 disables the lexical leg")
+    bm25_k1: float = Field(default=1.5)
+    bm25_b: float = Field(default=0.75)
+    mmr_enabled: bool = Field(default=True, description="Diversify retrieved chunks with Maximal Marginal Relevance")
+    mmr_lambda: float = Field(default=0.5, description="MMR trade-off: 1.0 is pure relevance, 0.0 pure diversity")
+    mmr_fetch_factor: int = Field(default=3, description="Vector candidates fetched per requested chunk when MMR is on")
     default_token_budget: int = Field(default=6000, description="Default token budget for query context")
     
     conversation_memory_enabled: bool = Field(default=True)
@@ -58,6 +99,9 @@ class Settings(BaseSettings):
 
     api_host: str = Field(default="0.0.0.0")
     api_port: int = Field(default=8000)
+    api_cpu_workers: int = Field(default=0, description="Threads for CPU-bound work in request handlers (retrieval, PDF rendering, local generation); 0 uses the CPU count")
+    api_io_workers: int = Field(default=16, description="Threads for blocking Mongo, S3 and SMTP calls in request handlers")
+    hf_max_concurrent_generations: int = Field(default=1, description="Local HF generations run at once; further requests wait")
     use_langchain: bool = Field(default=False)
     agent_planning_enabled: bool = Field(default=True)
     agent_plan_max_steps: int = Field(default=12)
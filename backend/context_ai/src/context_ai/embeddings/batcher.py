@@ -0,0 +1,123 @@
+from __future__ import annotations
+import asyncio
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional, Tuple
+import numpy as np
+from ..config import settings
+from .encoder import EmbeddingEncoder
+
+
+logger = logging.getLogger("context_ai.embeddings")
+
+_Request = Tuple[str, bool, "asyncio.Future[np.ndarray]"]
+
+
+class EmbeddingBatcher:
+    """
+    Coalesces concurrent single-text query encodes into batched forward passes.
+
+    ``encode`` queues the text and waits; a collector task on the event loop
+    takes the first queued request, gathers more for up to
+    ``embedding_coalesce_max_wait_ms`` (or until ``embedding_coalesce_max_batch``
+    are queued), and embeds them in one ``EmbeddingEncoder.encode`` call on a
+    dedicated thread. Requests arriving while a batch runs form the next one.
+    Queries already in the encoder's cache are answered before queueing, so
+    they never wait for a batch; results of a batch go into that cache.
+    """
+
+    def __init__(self, encoder: EmbeddingEncoder, max_batch: Optional[int] = None, max_wait_ms: Optional[float] = None):
+        self.encoder = encoder
+        self.max_batch = max(1, max_batch or settings.embedding_coalesce_max_batch)
+        wait_ms = settings.embedding_coalesce_max_wait_ms if max_wait_ms is None else max_wait_ms
+        self.max_wait = max(0.0, wait_ms) / 1000.0
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="embed-query")
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+        self.batches = 0
+        self.requests = 0
+
+    def _start(self):
+        loop = asyncio.get_running_loop()
+        if self._loop is loop and self._task is not None and not self._task.done():
+            return
+        self._loop = loop
+        self._queue = asyncio.Queue()
+        self._task = loop.create_task(self._collect())
+
+    async def encode(self, text: str, normalize: bool = True) -> np.ndarray:
+        """Embed one query, batched with other concurrent callers. Cached queries return without queueing."""
+        vec = self.encoder.cached_query(text, normalize)
+        if vec is not None:
+            return vec
+        self._start()
+        assert self._queue is not None
+        fut: "asyncio.Future[np.ndarray]" = asyncio.get_running_loop().create_future()
+        await self._queue.put((text, normalize, fut))
+        return await fut
+
+    def encode_sync(self, text: str, normalize: bool = True) -> np.ndarray:
+        """
+        ``encode`` for synchronous callers. From a worker thread the request
+        joins the batches of the running loop; on the loop thread itself, or
+        before any loop has used the batcher, it encodes directly.
+        """
+        vec = self.encoder.cached_query(text, normalize)
+        if vec is not None:
+            return vec
+        loop = self._loop
+        if loop is None or loop.is_closed() or not loop.is_running() or _running_loop() is loop:
+            return self.encoder.encode_query(text, normalize=normalize)
+        return asyncio.run_coroutine_threadsafe(self.encode(text, normalize), loop).result()
+
+    def stats(self) -> dict:
+        return {"requests": self.requests, "batches": self.batches, "max_batch": self.max_batch, "max_wait_ms": self.max_wait * 1000.0}
+
+    async def _collect(self):
+        assert self._queue is not None
+        loop = asyncio.get_running_loop()
+        while True:
+            batch: List[_Request] = [await self._queue.get()]
+            deadline = loop.time() + self.max_wait
+            while len(batch) < self.max_batch:
+                if not self._queue.empty():
+                    batch.append(self._queue.get_nowait())
+                    continue
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+            await self._run(batch)
+
+    async def _run(self, batch: List[_Request]):
+        loop = asyncio.get_running_loop()
+        self.batches += 1
+        self.requests += len(batch)
+        for normalize in (True, False):
+            group = [r for r in batch if r[1] == normalize and not r[2].done()]
+            if not group:
+                continue
+            try:
+                embs = await loop.run_in_executor(
+                    self._executor, lambda: self.encoder.encode([r[0] for r in group], normalize=normalize, use_cache=True)
+                )
+            except Exception as e:
+                logger.exception("Batched query embedding failed")
+                for _, _, fut in group:
+                    if not fut.done():
+                        fut.set_exception(e)
+                continue
+            for (_, _, fut), vec in zip(group, embs):
+                if not fut.done():
+                    fut.set_result(vec)
+
+
+def _running_loop() -> Optional[asyncio.AbstractEventLoop]:
+    try:
+        return asyncio.get_running_loop()
+    except RuntimeError:
+        return None
@@ -1,16 +1,131 @@
 from __future__ import annotations
-from typing import List
+from collections import OrderedDict
+from typing import Dict, List, Tuple
+import threading
 import numpy as np
-from sentence_transformers import SentenceTransformer
 from ..config import settings
+from ..utils.tokenization import count_tokens_many
 
 
 class EmbeddingEncoder:
-    def __init__(self, model_name: str | None = None, device: str | None = None):
+    def __init__(
+        self,
+        model_name: str | None = None,
+        device: str | None = None,
+        cache_size: int | None = None,
+        backend: str | None = None,
+    ):
         name = model_name or settings.embedding_model_name
-        self.model = SentenceTransformer(name, device=device)
+        self.model_name = name
+        self.backend = backend or settings.embedding_backend
+        if self.backend == "torch":
+            from sentence_transformers import SentenceTransformer
+            self.model = SentenceTransformer(name, device=device)
+        elif self.backend in ("onnx", "onnx-int8"):
+            from .onnx_backend import load_embedder
+            self.model = load_embedder(name, quantized=self.backend == "onnx-int8")
+        else:
+            raise ValueError(f"Unknown embedding backend '{self.backend}'; use torch, onnx or onnx-int8")
+        # Bounded LRU of query embeddings keyed by (model, normalized text, normalize flag).
+        self._cache: "OrderedDict[Tuple[str, str, bool], np.ndarray]" = OrderedDict()
+        self._cache_size = settings.embedding_cache_size if cache_size is None else cache_size
+        self._cache_lock = threading.Lock()
+        self.cache_hits = 0
+        self.cache_misses = 0
 
-    def encode(self, texts: List[str], batch_size: int | None = None, normalize: bool = True) -> np.ndarray:
-        bs = batch_size or settings.embedding_batch_size
-        embs = self.model.encode(texts, batch_size=bs, convert_to_numpy=True, normalize_embeddings=normalize, show_progress_bar=False)
-        return embs
+    @property
+    def dim(self) -> int:
+        return int(self.model.get_sentence_embedding_dimension())
+
+    def encode(self, texts: List[str], batch_size: int | None = None, normalize: bool = True, use_cache: bool = False) -> np.ndarray:
+        if not use_cache or self._cache_size <= 0 or not texts:
+            return self._encode(texts, batch_size, normalize)
+
+        keys = [self._cache_key(t, normalize) for t in texts]
+        found: Dict[int, np.ndarray] = {}
+        with self._cache_lock:
+            for i, key in enumerate(keys):
+                vec = self._cache.get(key)
+                if vec is not None:
+                    self._cache.move_to_end(key)
+                    found[i] = vec
+            self.cache_hits += len(found)
+            self.cache_misses += len(texts) - len(found)
+
+        missing = [i for i in range(len(texts)) if i not in found]
+        if missing:
+            # Encode the same whitespace-normalized text the entry is keyed on, so a
+            # hit returns exactly what a miss for that text would have produced.
+            embs = self._encode([keys[i][1] for i in missing], batch_size, normalize)
+            with self._cache_lock:
+                for i, vec in zip(missing, embs):
+                    vec = np.array(vec, dtype=np.float32)
+                    vec.setflags(write=False)
+                    found[i] = vec
+                    self._cache[keys[i]] = vec
+                    self._cache.move_to_end(keys[i])
+                while len(self._cache) > self._cache_size:
+                    self._cache.popitem(last=False)
+        return np.vstack([found[i] for i in range(len(texts))])
+
+    def encode_query(self, text: str, normalize: bool = True) -> np.ndarray:
+        """Embed a single query string through the LRU cache."""
+        return self.encode([text], normalize=normalize, use_cache=True)[0]
+
+    def cached_query(self, text: str, normalize: bool = True) -> np.ndarray | None:
+        """The cached embedding of ``text``, or None; a miss is not counted, since the caller goes on to encode it."""
+        if self._cache_size <= 0:
+            return None
+        key = self._cache_key(text, normalize)
+        with self._cache_lock:
+            vec = self._cache.get(key)
+            if vec is not None:
+                self._cache.move_to_end(key)
+                self.cache_hits += 1
+            return vec
+
+    def cache_info(self) -> Dict[str, int]:
+        with self._cache_lock:
+            return {"size": len(self._cache), "max_size": self._cache_size, "hits": self.cache_hits, "misses": self.cache_misses}
+
+    def _cache_key(self, text: str, normalize: bool) -> Tuple[str, str, bool]:
+        return (self.model_name, " ".join(text.split()), normalize)
+
+    def _encode(self, texts: List[str], batch_size: int | None, normalize: bool) -> np.ndarray:
+        budget = settings.embedding_batch_tokens
+        if budget <= 0 or len(texts) <= 1:
+            bs = batch_size or settings.embedding_batch_size
+            return self.model.encode(texts, batch_size=bs, convert_to_numpy=True, normalize_embeddings=normalize, show_progress_bar=False)
+
+        out: np.ndarray | None = None
+        for idx in self._length_batches(texts, budget, batch_size):
+            embs = self.model.encode(
+                [texts[i] for i in idx], batch_size=len(idx), convert_to_numpy=True, normalize_embeddings=normalize, show_progress_bar=False
+            )
+            if out is None:
+                out = np.empty((len(texts), embs.shape[1]), dtype=np.float32)
+            out[idx] = embs
+        assert out is not None
+        return out
+
+    def _length_batches(self, texts: List[str], budget: int, max_items: int | None) -> List[np.ndarray]:
+        """
+        Indices of ``texts`` sorted longest first and cut into batches whose
+        padded size (items x longest item) stays within ``budget`` tokens, so
+        short texts are not padded to the length of long ones. ``max_items``
+        additionally caps the items per batch.
+        """
+        max_len = int(getattr(self.model, "max_seq_length", None) or 512)
+        # Texts past the model's window are truncated anyway, so a bounded prefix is enough to measure them.
+        counts = count_tokens_many([t[:max_len * 8] for t in texts])
+        lengths = np.minimum(np.asarray(counts, dtype=np.int64) + 2, max_len)
+        order = np.argsort(-lengths, kind="stable")
+        batches: List[np.ndarray] = []
+        start = 0
+        while start < len(order):
+            size = max(1, budget // int(lengths[order[start]]))
+            if max_items:
+                size = min(size, max_items)
+            batches.append(order[start:start + size])
+            start += size
+        return batches
@@ -0,0 +1,232 @@
+from __future__ import annotations
+import json
+import os
+import shutil
+import tempfile
+import threading
+from typing import Any, Dict, List, Optional, Sequence
+import numpy as np
+from ..config import settings
+
+
+MODEL_FILE = "model.onnx"
+QUANTIZED_MODEL_FILE = "model_int8.onnx"
+EXPORT_INFO_FILE = "export.json"
+
+# Sentences embedded by both the PyTorch model and the export to check they agree.
+_PARITY_TEXTS = [
+    "How do I configure the ingest pipeline for a new project?",
+    "def chunk_code(path: str, text: str, max_tokens: int = 1500) -> List[Dict]:",
+    "The quarterly report summarizes revenue, churn and hiring across all regions.",
+    "FAISS shards are kept per project and re-synced with Mongo periodically.",
+    "import React from 'react';\nexport const App = () => <div>Hello</div>;",
+    "Short query",
+    "Los embeddings cuantizados deben coincidir con los del modelo original.",
+    "A long paragraph " + "about retrieval-augmented generation and context windows " * 20,
+]
+
+_export_lock = threading.Lock()
+
+
+def _require(module: str):
+    try:
+        return __import__(module, fromlist=["_"])
+    except ImportError:
+        raise ImportError(
+            f"Missing optional dependency '{module}' for the ONNX embedding backend. "
+            "Install it with `pip install context_ai[onnx]` or set EMBEDDING_BACKEND=torch"
+        )
+
+
+def model_dir(model_name: str, root: Optional[str] = None) -> str:
+    """Directory holding the exported copy of ``model_name``."""
+    return os.path.join(root or settings.embedding_onnx_dir, model_name.replace("/", "__"))
+
+
+def export_model(
+    model_name: str,
+    out_dir: Optional[str] = None,
+    quantize: bool = True,
+    min_cosine: Optional[float] = None,
+    check: Optional[Sequence[str]] = None,
+) -> Dict[str, Any]:
+    """
+    Export a SentenceTransformer's transformer to ONNX (plus a dynamically
+    int8-quantized copy) with its tokenizer, under ``model_dir(model_name)``.
+
+    Only mean-pooling models are supported, since pooling is reimplemented
+    on top of the exported hidden states. The variants in ``check`` ("fp32",
+    "int8"; default: every variant exported) are compared with the PyTorch
+    model on ``_PARITY_TEXTS`` and the export is rejected with ValueError
+    when the lowest cosine similarity is below ``min_cosine``. Returns the
+    export info written next to the models.
+    """
+    torch = _require("torch")
+    _require("onnxruntime")
+    from sentence_transformers import SentenceTransformer
+    from sentence_transformers.models import Normalize, Pooling, Transformer
+
+    out_dir = out_dir or model_dir(model_name)
+    min_cosine = settings.embedding_onnx_min_cosine if min_cosine is None else min_cosine
+    variants = ["fp32", "int8"] if quantize else ["fp32"]
+    check = variants if check is None else [v for v in variants if v in check]
+
+    st = SentenceTransformer(model_name, device="cpu")
+    modules = list(st)
+    if not isinstance(modules[0], Transformer) or len(modules) < 2 or not isinstance(modules[1], Pooling):
+        raise ValueError(f"{model_name} is not a Transformer + Pooling SentenceTransformer")
+    pooling = modules[1]
+    if pooling.get_pooling_mode_str() != "mean":
+        raise ValueError(f"{model_name} uses '{pooling.get_pooling_mode_str()}' pooling; only mean pooling is supported")
+
+    transformer = modules[0]
+    tokenizer = transformer.tokenizer
+    auto_model = transformer.auto_model.eval()
+    sample = tokenizer(["export sample", "a second, longer export sample"], padding=True, return_tensors="pt")
+    input_names = [n for n in ("input_ids", "attention_mask", "token_type_ids") if n in sample]
+
+    class _HiddenStates(torch.nn.Module):
+        def __init__(self, model):
+            super().__init__()
+            self.model = model
+
+        def forward(self, *inputs):
+            return self.model(**dict(zip(input_names, inputs))).last_hidden_state
+
+    parent = os.path.dirname(os.path.abspath(out_dir))
+    os.makedirs(parent, exist_ok=True)
+    # Build in a scratch directory and move it into place, so concurrent
+    # loaders never see a half-written export.
+    work_dir = tempfile.mkdtemp(dir=parent, prefix=".export-")
+    try:
+        dynamic_axes = {name: {0: "batch", 1: "sequence"} for name in input_names + ["last_hidden_state"]}
+        with torch.no_grad():
+            torch.onnx.export(
+                _HiddenStates(auto_model),
+                tuple(sample[n] for n in input_names),
+                os.path.join(work_dir, MODEL_FILE),
+                input_names=input_names,
+                output_names=["last_hidden_state"],
+                dynamic_axes=dynamic_axes,
+                opset_version=14,
+            )
+        if quantize:
+            from onnxruntime.quantization import QuantType, quantize_dynamic
+            quantize_dynamic(os.path.join(work_dir, MODEL_FILE), os.path.join(work_dir, QUANTIZED_MODEL_FILE), weight_type=QuantType.QInt8)
+        tokenizer.save_pretrained(work_dir)
+
+        info: Dict[str, Any] = {
+            "model_name": model_name,
+            "dim": int(st.get_sentence_embedding_dimension()),
+            "max_seq_length": int(st.max_seq_length),
+            "normalize": any(isinstance(m, Normalize) for m in modules),
+            "input_names": input_names,
+            "parity": {},
+        }
+        with open(os.path.join(work_dir, EXPORT_INFO_FILE), "w") as f:
+            json.dump(info, f)
+
+        reference = st.encode(_PARITY_TEXTS, convert_to_numpy=True, normalize_embeddings=True)
+        for variant in check:
+            got = OnnxEmbedder(work_dir, quantized=variant == "int8").encode(_PARITY_TEXTS, normalize_embeddings=True)
+            worst = float((reference * got).sum(axis=1).min())
+            info["parity"][variant] = worst
+            if worst < min_cosine:
+                raise ValueError(
+                    f"{variant} ONNX export of {model_name} diverges from the PyTorch model "
+                    f"(min cosine {worst:.4f} < {min_cosine})"
+                )
+        with open(os.path.join(work_dir, EXPORT_INFO_FILE), "w") as f:
+            json.dump(info, f, indent=2)
+
+        if os.path.isdir(out_dir):
+            shutil.rmtree(out_dir)
+        os.replace(work_dir, out_dir)
+    finally:
+        if os.path.isdir(work_dir):
+            shutil.rmtree(work_dir, ignore_errors=True)
+    return info
+
+
+class OnnxEmbedder:
+    """
+    Mean-pooled sentence embeddings from an ``export_model`` directory, run
+    on ONNX Runtime's CPU provider. Mirrors the parts of SentenceTransformer
+    that ``EmbeddingEncoder`` uses.
+    """
+
+    def __init__(self, path: str, quantized: bool = False, threads: Optional[int] = None):
+        ort = _require("onnxruntime")
+        _require("transformers")
+        from transformers import AutoTokenizer
+
+        with open(os.path.join(path, EXPORT_INFO_FILE)) as f:
+            info = json.load(f)
+        if quantized and not os.path.exists(os.path.join(path, QUANTIZED_MODEL_FILE)):
+            raise FileNotFoundError(f"No int8 model in {path}; re-export without --no-quantize")
+        self.dim = int(info["dim"])
+        self.max_seq_length = int(info["max_seq_length"])
+        self.always_normalize = bool(info.get("normalize"))
+        self.input_names: List[str] = info["input_names"]
+
+        opts = ort.SessionOptions()
+        opts.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        threads = settings.embedding_onnx_threads if threads is None else threads
+        if threads:
+            opts.intra_op_num_threads = threads
+        model_file = QUANTIZED_MODEL_FILE if quantized else MODEL_FILE
+        self.session = ort.InferenceSession(os.path.join(path, model_file), opts, providers=["CPUExecutionProvider"])
+        self.tokenizer = AutoTokenizer.from_pretrained(path)
+
+    def get_sentence_embedding_dimension(self) -> int:
+        return self.dim
+
+    def encode(
+        self,
+        texts: List[str],
+        batch_size: int = 32,
+        convert_to_numpy: bool = True,
+        normalize_embeddings: bool = False,
+        show_progress_bar: bool = False,
+    ) -> np.ndarray:
+        out = np.empty((len(texts), self.dim), dtype=np.float32)
+        # Longest first, like SentenceTransformer, so batches pad little.
+        order = np.argsort([-len(t) for t in texts], kind="stable")
+        for start in range(0, len(texts), max(1, batch_size)):
+            idx = order[start:start + batch_size]
+            enc = self.tokenizer(
+                [texts[i] for i in idx],
+                padding=True,
+                truncation=True,
+                max_length=self.max_seq_length,
+                return_tensors="np",
+            )
+            feeds = {name: enc[name].astype(np.int64) for name in self.input_names}
+            hidden = self.session.run(None, feeds)[0]
+            mask = enc["attention_mask"][..., None].astype(np.float32)
+            emb = (hidden * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+            if normalize_embeddings or self.always_normalize:
+                emb /= np.clip(np.linalg.norm(emb, axis=1, keepdims=True), 1e-12, None)
+            out[idx] = emb
+        return out
+
+
+def load_embedder(model_name: str, quantized: bool) -> OnnxEmbedder:
+    """
+    The ONNX embedder for ``model_name``. With ``embedding_onnx_auto_export``
+    a missing export is built first, quantizing and parity-checking only the
+    requested variant.
+    """
+    path = model_dir(model_name)
+    with _export_lock:
+        missing = not os.path.exists(os.path.join(path, EXPORT_INFO_FILE)) or (
+            quantized and not os.path.exists(os.path.join(path, QUANTIZED_MODEL_FILE))
+        )
+        if missing:
+            if not settings.embedding_onnx_auto_export:
+                raise FileNotFoundError(
+                    f"No {'int8' if quantized else 'fp32'} ONNX export of {model_name} in {path}. "
+                    f"Run `python -m context_ai.cli.export_embeddings --model {model_name}` first"
+                )
+            export_model(model_name, path, quantize=quantized, check=["int8" if quantized else "fp32"])
+    return OnnxEmbedder(path, quantized=quantized)
@@ -0,0 +1,129 @@
+from __future__ import annotations
+import asyncio
+import logging
+import os
+import socket
+import uuid
+from datetime import datetime, timezone
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+from ..config import settings
+from ..storage.mongo_store import MongoStore
+from .pipeline import IngestStats
+
+
+logger = logging.getLogger("context_ai.ingest")
+
+ProgressCallback = Callable[[IngestStats], None]
+JobRunner = Callable[[ProgressCallback], Awaitable[IngestStats]]
+
+# Seconds between progress writes of a running job to Mongo.
+_PROGRESS_INTERVAL = 1.0
+
+
+def _error_message(exc: BaseException) -> str:
+    return str(getattr(exc, "detail", None) or exc) or exc.__class__.__name__
+
+
+class IngestJobQueue:
+    """
+    In-process queue of ingest jobs with their state persisted in Mongo.
+
+    ``submit`` records a queued job and returns its id straight away; up to
+    ``ingest_job_workers`` jobs run concurrently on the event loop. Running
+    jobs write their ``IngestStats`` back periodically so ``GET /ingest/{job_id}``
+    can report progress.
+
+    Jobs are owned by the queue that created them and hold a lease the queue
+    renews while the process is alive. Any queue fails unfinished jobs whose
+    lease has lapsed for ``ingest_job_lease_seconds``, since their process is
+    gone and their work is not resumed; jobs of other live processes keep
+    running.
+    """
+
+    def __init__(self, mongo: MongoStore, workers: Optional[int] = None):
+        self.mongo = mongo
+        self.workers = max(1, workers or settings.ingest_job_workers)
+        self.owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self.lease_seconds = max(1, settings.ingest_job_lease_seconds)
+        self._queue: Optional[asyncio.Queue] = None
+        self._tasks: List[asyncio.Task] = []
+
+    async def _run_sync(self, fn, *args):
+        return await asyncio.get_running_loop().run_in_executor(None, fn, *args)
+
+    async def _start(self):
+        if self._queue is not None:
+            return
+        self._queue = asyncio.Queue()
+        self._tasks = [asyncio.ensure_future(self._worker()) for _ in range(self.workers)]
+        self._tasks.append(asyncio.ensure_future(self._heartbeat()))
+
+    async def _heartbeat(self):
+        """Renew this queue's job leases and fail jobs whose owner has stopped renewing theirs."""
+        while True:
+            try:
+                await self._run_sync(self.mongo.heartbeat_ingest_jobs, self.owner)
+                lapsed = await self._run_sync(
+                    self.mongo.fail_stale_ingest_jobs, self.lease_seconds, "Interrupted: the ingest process stopped"
+                )
+                if lapsed:
+                    logger.warning("Marked %d ingest jobs with lapsed leases as failed", lapsed)
+            except Exception:
+                logger.exception("Ingest job heartbeat failed")
+            await asyncio.sleep(self.lease_seconds / 4)
+
+    async def submit(self, project_id: Optional[str], request: Dict[str, Any], run: JobRunner) -> str:
+        """Queue ``run`` as a job and return its id. ``run`` receives a progress callback."""
+        await self._start()
+        assert self._queue is not None
+        job_id = await self._run_sync(self.mongo.create_ingest_job, project_id, request, self.owner)
+        await self._queue.put((job_id, run))
+        return job_id
+
+    async def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        return await self._run_sync(self.mongo.get_ingest_job, job_id)
+
+    async def _worker(self):
+        assert self._queue is not None
+        while True:
+            job_id, run = await self._queue.get()
+            try:
+                await self._run_job(job_id, run)
+            except Exception:
+                logger.exception("Ingest job %s could not be updated", job_id)
+            finally:
+                self._queue.task_done()
+
+    async def _run_job(self, job_id: str, run: JobRunner):
+        latest: List[Optional[IngestStats]] = [None]
+
+        def on_progress(stats: IngestStats):
+            latest[0] = stats
+
+        finished = asyncio.Event()
+
+        async def flush_progress():
+            while not finished.is_set():
+                try:
+                    await asyncio.wait_for(finished.wait(), _PROGRESS_INTERVAL)
+                except asyncio.TimeoutError:
+                    pass
+                if latest[0] is not None and not finished.is_set():
+                    await self._run_sync(self.mongo.update_ingest_job, job_id, {"stats": latest[0].as_dict()})
+
+        await self._run_sync(self.mongo.update_ingest_job, job_id, {"status": "running", "started_at": datetime.now(timezone.utc)})
+        flusher = asyncio.ensure_future(flush_progress())
+        update: Dict[str, Any]
+        try:
+            stats = await run(on_progress)
+            update = {"status": "completed", "stats": stats.as_dict()}
+        except Exception as e:
+            logger.exception("Ingest job %s failed", job_id)
+            update = {"status": "failed", "error": _error_message(e)}
+            if latest[0] is not None:
+                update["stats"] = latest[0].as_dict()
+        finally:
+            finished.set()
+            await flusher
+        update["finished_at"] = datetime.now(timezone.utc)
+        await self._run_sync(self.mongo.update_ingest_job, job_id, update)
@@ -0,0 +1,498 @@
+from __future__ import annotations
+import abc
+import asyncio
+import dataclasses
+import hashlib
+import itertools
+import logging
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Set, Tuple, Union
+import numpy as np
+from ..config import settings
+from ..chunking.code_parser import chunk_code
+from ..chunking.registry import has_chunker, language_for
+from ..chunking.pdf_parser import iter_chunk_pdf, splits_pages
+from ..embeddings.encoder import EmbeddingEncoder
+from ..storage.mongo_store import MongoStore
+from ..utils.tokenization import approximate_token_count
+
+
+logger = logging.getLogger("context_ai.ingest")
+
+
+def content_hash(text: str, model_name: str) -> str:
+    """Key under which a chunk's embedding can be reused: sha256 of model name and text."""
+    h = hashlib.sha256()
+    h.update(model_name.encode("utf-8"))
+    h.update(b"\0")
+    h.update(text.encode("utf-8", errors="surrogatepass"))
+    return h.hexdigest()
+
+
+def embed_chunks(mongo: MongoStore, encoder: EmbeddingEncoder, chunks: List[Dict]) -> np.ndarray:
+    """
+    Embed ``chunks``, reusing stored embeddings of byte-identical chunk texts.
+    Each chunk gets a ``content_hash`` that ``MongoStore.insert_chunks`` persists;
+    only texts whose hash is not already in the chunks collection are encoded.
+    """
+    if not chunks:
+        return np.zeros((0, encoder.dim), dtype=np.float32)
+    hashes = [content_hash(c["text"], encoder.model_name) for c in chunks]
+    for c, h in zip(chunks, hashes):
+        c["content_hash"] = h
+
+    known = mongo.embeddings_by_hash(list(set(hashes)), dim=encoder.dim)
+    todo: Dict[str, str] = {}
+    for c, h in zip(chunks, hashes):
+        if h not in known and h not in todo:
+            todo[h] = c["text"]
+    if todo:
+        embs = encoder.encode(list(todo.values()))
+        known.update(zip(todo.keys(), np.asarray(embs, dtype=np.float32)))
+    return np.vstack([known[h] for h in hashes]).astype(np.float32, copy=False)
+
+
+def parse_file(
+    path: str,
+    data: bytes,
+    local_path: Optional[str] = None,
+    chunkers: Optional[Dict[str, str]] = None,
+) -> Tuple[str, Optional[str], List[Dict]]:
+    """
+    Chunk a file's contents. Returns (file extension, language, chunks).
+    ``path`` names the source; PDFs are read from ``local_path`` when the
+    source itself is not a local file. ``chunkers`` overrides the registered
+    chunker per extension.
+    """
+    ext = Path(path).suffix.lower().lstrip('.')
+    language = None
+    if ext == 'pdf':
+        return ext, language, list(iter_chunk_pdf(local_path or path))
+    text = data.decode("utf-8", errors="ignore")
+    if has_chunker(ext) or ext in (chunkers or {}):
+        chunks = chunk_code(path, text, chunkers=chunkers)
+        language = language_for(ext)
+    else:
+        chunks = [{
+            "chunk_id": "0",
+            "text": text,
+            "file_ext": ext,
+            "metadata": {"token_count": approximate_token_count(text), "file_ext": ext}
+        }]
+    return ext, language, chunks
+
+
+def _is_unchanged(doc: Optional[Dict[str, Any]], project_id: Optional[str], fingerprint: Dict[str, Any]) -> bool:
+    if not doc or (doc.get("metadata") or {}).get("project_id") != project_id:
+        return False
+    previous = doc.get("fingerprint") or {}
+    return all(previous.get(k) == v for k, v in fingerprint.items())
+
+
+@dataclass
+class PendingFile:
+    """A file that changed since the last ingest and is on its way through the pipeline."""
+    path: str
+    data: bytes
+    fingerprint: Dict[str, Any]
+    local_path: Optional[str] = None
+    temp: bool = False
+    ext: str = ""
+    language: Optional[str] = None
+    chunks: List[Dict] = field(default_factory=list)
+    embeddings: Optional[np.ndarray] = None
+    # More chunks of the same file follow; set on all but the last part of a streamed PDF.
+    partial: bool = False
+
+    def cleanup(self):
+        """Remove the temporary download backing this file, if any."""
+        if self.temp and self.local_path:
+            try:
+                os.remove(self.local_path)
+            except OSError:
+                pass
+            self.temp = False
+
+
+class RemoteFile(abc.ABC):
+    """
+    A source that is not a local path, e.g. an S3 object.
+    ``fetch`` runs on an I/O thread and returns None when the stored document
+    is already up to date.
+    """
+    source_path: str
+
+    @abc.abstractmethod
+    def fetch(self, mongo: MongoStore, project_id: Optional[str]) -> Optional[PendingFile]:
+        ...
+
+
+@dataclass
+class IngestStats:
+    files_total: int = 0
+    files_processed: int = 0
+    files_skipped: int = 0
+    files_failed: int = 0
+    chunks_embedded: int = 0
+    errors: List[str] = field(default_factory=list)
+    started_at: float = field(default_factory=time.monotonic)
+
+    def as_dict(self) -> Dict[str, Any]:
+        elapsed = max(time.monotonic() - self.started_at, 1e-6)
+        return {
+            "files_total": self.files_total,
+            "files_processed": self.files_processed,
+            "files_skipped": self.files_skipped,
+            "files_failed": self.files_failed,
+            "chunks_embedded": self.chunks_embedded,
+            "elapsed_seconds": round(elapsed, 3),
+            "files_per_second": round((self.files_processed + self.files_skipped) / elapsed, 3),
+            "chunks_per_second": round(self.chunks_embedded / elapsed, 3),
+            "errors": self.errors[-50:],
+        }
+
+
+def prepare_file(mongo: MongoStore, path: str, project_id: Optional[str], source_path: Optional[str] = None) -> Optional[PendingFile]:
+    """
+    Read a file unless it is unchanged since the last ingest.
+    A document is skipped when its size and mtime match the stored fingerprint,
+    or when the content hash matches after reading it. Returns None when skipped.
+    The document is keyed by ``source_path`` when given, else by ``path``.
+    """
+    source_path = source_path or path
+    st = os.stat(path)
+    fingerprint: Dict[str, Any] = {"size": st.st_size, "mtime": st.st_mtime}
+    doc = mongo.get_document(source_path)
+    if _is_unchanged(doc, project_id, fingerprint):
+        return None
+
+    with open(path, "rb") as f:
+        data = f.read()
+    fingerprint["sha256"] = hashlib.sha256(data).hexdigest()
+    if doc and _is_unchanged(doc, project_id, {"sha256": fingerprint["sha256"]}):
+        mongo.set_document_fingerprint(str(doc["_id"]), fingerprint)
+        return None
+    return PendingFile(path=source_path, data=data, fingerprint=fingerprint, local_path=path)
+
+
+def write_file(mongo: MongoStore, item: PendingFile, project_id: Optional[str]):
+    for c in item.chunks:
+        meta = c.setdefault("metadata", {})
+        meta["project_id"] = project_id
+    mongo.replace_document_chunks(
+        source_path=item.path,
+        file_ext=item.ext,
+        language=item.language,
+        metadata={"project_id": project_id} if project_id else {},
+        chunks=item.chunks,
+        embeddings=item.embeddings,
+        fingerprint=item.fingerprint,
+    )
+
+
+def ingest_file(
+    mongo: MongoStore,
+    encoder: EmbeddingEncoder,
+    path: str,
+    project_id: Optional[str],
+    chunkers: Optional[Dict[str, str]] = None,
+) -> bool:
+    """
+    Ingest one file synchronously unless it is unchanged since the last run.
+    Changed files replace their previous chunks. Returns True when the file
+    was (re)ingested.
+    """
+    item = prepare_file(mongo, path, project_id)
+    if item is None:
+        return False
+    item.ext, item.language, item.chunks = parse_file(item.path, item.data, item.local_path, chunkers)
+    item.embeddings = embed_chunks(mongo, encoder, item.chunks)
+    write_file(mongo, item, project_id)
+    return True
+
+
+_parse_pool: Optional[ProcessPoolExecutor] = None
+_io_pool: Optional[ThreadPoolExecutor] = None
+_embed_pool: Optional[ThreadPoolExecutor] = None
+_pool_lock = threading.Lock()
+
+
+def _pools() -> Tuple[Optional[ProcessPoolExecutor], ThreadPoolExecutor, ThreadPoolExecutor]:
+    global _parse_pool, _io_pool, _embed_pool
+    with _pool_lock:
+        workers = settings.ingest_parse_workers or (os.cpu_count() or 1)
+        if _parse_pool is None and workers > 1:
+            # Spawned, not forked: the server holds Mongo clients, FAISS indexes and
+            # busy threads whose locks a forked child would inherit mid-use.
+            _parse_pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"))
+        if _io_pool is None:
+            _io_pool = ThreadPoolExecutor(max_workers=settings.ingest_io_workers, thread_name_prefix="ingest-io")
+        if _embed_pool is None:
+            _embed_pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="ingest-embed")
+        return _parse_pool, _io_pool, _embed_pool
+
+
+def _drop_parse_pool(pool: ProcessPoolExecutor):
+    """Forget a parse pool whose worker died so the next ``_pools()`` starts a fresh one."""
+    global _parse_pool
+    with _pool_lock:
+        if _parse_pool is pool:
+            _parse_pool = None
+    pool.shutdown(wait=False, cancel_futures=True)
+
+
+_DONE = object()
+
+
+def _take(chunks: Iterator[Dict], n: int) -> List[Dict]:
+    return list(itertools.islice(chunks, n))
+
+
+class IngestPipeline:
+    """
+    Staged ingest: read/parse -> embed -> write, connected by bounded queues.
+
+    Reading or downloading and fingerprint checks run on an I/O thread pool,
+    so remote objects feed the parse stage as each one lands. Chunking runs on a
+    process pool (``chunk_pdf``/``chunk_code`` are CPU-bound), except PDFs
+    long enough for page-parallel extraction, which are chunked from this
+    process on the PDF page pool and streamed to the embed stage a window of
+    chunks at a time, so their embedding starts before the last pages are
+    read; the write stage reassembles them. Embedding runs in a single worker that packs
+    chunks of several files into full ``embedding_batch_size`` batches, and
+    Mongo writes back on the I/O pool.
+    Full queues stall the upstream stage, so memory stays bounded and the
+    event loop is never blocked.
+    """
+
+    def __init__(
+        self,
+        mongo: MongoStore,
+        encoder: EmbeddingEncoder,
+        project_id: Optional[str],
+        on_progress: Optional[Callable[[IngestStats], None]] = None,
+        chunkers: Optional[Dict[str, str]] = None,
+    ):
+        self.mongo = mongo
+        self.encoder = encoder
+        self.project_id = project_id
+        self.on_progress = on_progress
+        self.chunkers = chunkers
+        self.stats = IngestStats()
+        self._failed: Set[str] = set()
+
+    def _project_chunkers(self) -> Optional[Dict[str, str]]:
+        """
+        Chunker overrides are a project setting: overrides passed for a run
+        replace the project's stored ones, and a run without overrides uses them.
+        """
+        if self.chunkers is not None:
+            self.mongo.set_project_chunkers(self.project_id, self.chunkers)
+            return self.chunkers
+        return self.mongo.get_project_chunkers(self.project_id)
+
+    def _progress(self):
+        if self.on_progress is not None:
+            try:
+                self.on_progress(self.stats)
+            except Exception:
+                logger.exception("Ingest progress callback failed")
+
+    def _fail(self, path: str, exc: BaseException):
+        # Parts of a streamed file can fail more than once; count the file once.
+        if path in self._failed:
+            return
+        self._failed.add(path)
+        logger.warning("Ingest of %s failed: %s", path, exc)
+        self.stats.files_failed += 1
+        self.stats.errors.append(f"{path}: {exc}")
+        self._progress()
+
+    async def run(self, sources: Iterable[Union[str, RemoteFile]]) -> IngestStats:
+        """Ingest local paths and ``RemoteFile`` sources; missing local paths are ignored."""
+        sources = [s for s in sources if not isinstance(s, str) or os.path.isfile(s)]
+        self.stats.files_total = len(sources)
+        self._progress()
+        if self.project_id is not None:
+            _, io_pool, _ = _pools()
+            self.chunkers = await asyncio.get_running_loop().run_in_executor(io_pool, self._project_chunkers)
+        qsize = max(1, settings.ingest_queue_size)
+        parsed: asyncio.Queue = asyncio.Queue(maxsize=qsize)
+        embedded: asyncio.Queue = asyncio.Queue(maxsize=qsize)
+        stages = [
+            asyncio.ensure_future(self._read_and_parse(sources, parsed)),
+            asyncio.ensure_future(self._embed(parsed, embedded)),
+            asyncio.ensure_future(self._write(embedded)),
+        ]
+        try:
+            await asyncio.gather(*stages)
+        except BaseException:
+            # The other stages would wait on their queues forever.
+            for stage in stages:
+                stage.cancel()
+            await asyncio.gather(*stages, return_exceptions=True)
+            raise
+        return self.stats
+
+    async def _read_and_parse(self, sources: List[Union[str, RemoteFile]], out: asyncio.Queue):
+        loop = asyncio.get_running_loop()
+        parse_pool, io_pool, _ = _pools()
+        limit = asyncio.Semaphore(max(2, settings.ingest_queue_size))
+
+        async def _one(source: Union[str, RemoteFile]):
+            name = source if isinstance(source, str) else source.source_path
+            item: Optional[PendingFile] = None
+            try:
+                if isinstance(source, str):
+                    item = await loop.run_in_executor(io_pool, prepare_file, self.mongo, source, self.project_id)
+                else:
+                    item = await loop.run_in_executor(io_pool, source.fetch, self.mongo, self.project_id)
+                if item is None:
+                    self.stats.files_skipped += 1
+                    self._progress()
+                    return
+                pool = parse_pool or io_pool
+                is_pdf = Path(item.path).suffix.lower() == ".pdf"
+                if parse_pool is not None and is_pdf:
+                    # Inside a parse worker a long PDF would be read one page at a time;
+                    # from this process its pages are spread over the PDF page pool.
+                    if await loop.run_in_executor(io_pool, splits_pages, item.local_path or item.path):
+                        pool = io_pool
+                if is_pdf and pool is io_pool:
+                    await self._stream_pdf(item, out)
+                    item.cleanup()
+                    return
+                item.ext, item.language, item.chunks = await self._parse(pool, item)
+                item.data = b""
+                item.cleanup()
+                await out.put(item)
+            except Exception as e:
+                if item is not None:
+                    item.cleanup()
+                self._fail(name, e)
+            finally:
+                limit.release()
+
+        tasks = []
+        try:
+            for source in sources:
+                await limit.acquire()
+                tasks.append(asyncio.ensure_future(_one(source)))
+            await asyncio.gather(*tasks)
+        except BaseException:
+            for task in tasks:
+                task.cancel()
+            raise
+        await out.put(_DONE)
+
+    async def _parse(self, pool, item: PendingFile) -> Tuple[str, Optional[str], List[Dict]]:
+        """``parse_file`` on ``pool``, retried once on a fresh parse pool if a worker died."""
+        loop = asyncio.get_running_loop()
+        for attempt in range(2):
+            try:
+                return await loop.run_in_executor(pool, parse_file, item.path, item.data, item.local_path, self.chunkers)
+            except BrokenProcessPool:
+                # A killed worker (e.g. out of memory) breaks the pool for every later file.
+                _drop_parse_pool(pool)
+                if attempt:
+                    raise
+                parse_pool, io_pool, _ = _pools()
+                pool = parse_pool or io_pool
+
+    async def _stream_pdf(self, item: PendingFile, out: asyncio.Queue):
+        """Queue a PDF chunked in this process as parts of ``embedding_batch_size`` chunks."""
+        loop = asyncio.get_running_loop()
+        _, io_pool, _ = _pools()
+        window = max(1, settings.embedding_batch_size)
+        item.ext, item.language, item.data = "pdf", None, b""
+        chunks = iter_chunk_pdf(item.local_path or item.path)
+        try:
+            part = await loop.run_in_executor(io_pool, _take, chunks, window)
+            while True:
+                # Read one window ahead so the last part can be marked as such.
+                nxt = await loop.run_in_executor(io_pool, _take, chunks, window) if len(part) == window else []
+                await out.put(dataclasses.replace(item, chunks=part, partial=bool(nxt)))
+                if not nxt:
+                    return
+                part = nxt
+        finally:
+            try:
+                chunks.close()
+            except ValueError:
+                # Still running on an I/O thread after a cancellation; it stops with the pool.
+                pass
+
+    async def _embed(self, inp: asyncio.Queue, out: asyncio.Queue):
+        loop = asyncio.get_running_loop()
+        _, _, embed_pool = _pools()
+        batch: List[PendingFile] = []
+        pending_chunks = 0
+
+        async def _flush():
+            nonlocal batch, pending_chunks
+            items, batch, pending_chunks = batch, [], 0
+            chunks = [c for item in items for c in item.chunks]
+            try:
+                embs = await loop.run_in_executor(embed_pool, embed_chunks, self.mongo, self.encoder, chunks)
+            except Exception as e:
+                for item in items:
+                    self._fail(item.path, e)
+                return
+            offset = 0
+            for item in items:
+                item.embeddings = embs[offset:offset + len(item.chunks)]
+                offset += len(item.chunks)
+                await out.put(item)
+
+        while True:
+            item = await inp.get()
+            if item is _DONE:
+                break
+            batch.append(item)
+            pending_chunks += len(item.chunks)
+            if pending_chunks >= settings.embedding_batch_size:
+                await _flush()
+        if batch:
+            await _flush()
+        await out.put(_DONE)
+
+    async def _write(self, inp: asyncio.Queue):
+        loop = asyncio.get_running_loop()
+        _, io_pool, _ = _pools()
+        # Streamed files collect their parts here until the last one arrives.
+        parts: Dict[str, Tuple[PendingFile, List[np.ndarray]]] = {}
+        while True:
+            item = await inp.get()
+            if item is _DONE:
+                break
+            if item.path in self._failed:
+                parts.pop(item.path, None)
+                continue
+            head = parts.pop(item.path, None)
+            if head is not None:
+                first, embs = head
+                first.chunks.extend(item.chunks)
+                embs.append(item.embeddings)
+                if item.partial:
+                    parts[item.path] = head
+                    continue
+                first.embeddings = np.vstack(embs)
+                item = first
+            elif item.partial:
+                parts[item.path] = (item, [item.embeddings])
+                continue
+            try:
+                await loop.run_in_executor(io_pool, write_file, self.mongo, item, self.project_id)
+            except Exception as e:
+                self._fail(item.path, e)
+                continue
+            self.stats.files_processed += 1
+            self.stats.chunks_embedded += len(item.chunks)
+            self._progress()
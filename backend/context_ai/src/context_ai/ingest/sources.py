@@ -0,0 +1,202 @@
+from __future__ import annotations
+import hashlib
+import os
+import tempfile
+import zipfile
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Set, Tuple
+from ..config import settings
+from ..storage.mongo_store import MongoStore
+from .pipeline import PendingFile, RemoteFile, _is_unchanged, prepare_file
+
+# Extensions whose parsers read from a file rather than from bytes in memory.
+_NEEDS_LOCAL_FILE = {"pdf"}
+
+# Extensions never ingested from archives, mirroring the Django GitHub import
+# (``GITHUB_IMPORT_BINARY_EXTENSIONS``). Other members are ingested unless
+# their first bytes contain NUL; files without a chunker are stored as text.
+ARCHIVE_BINARY_EXTENSIONS = {
+    "png", "jpg", "jpeg", "gif", "bmp", "ico", "webp", "tiff", "psd",
+    "mp3", "mp4", "wav", "ogg", "mov", "avi", "webm",
+    "zip", "gz", "tgz", "bz2", "xz", "7z", "rar", "tar", "jar", "war",
+    "exe", "dll", "so", "dylib", "o", "a", "lib", "bin", "class", "pyc", "pyo", "wasm",
+    "woff", "woff2", "ttf", "otf", "eot",
+    "sqlite", "db", "pkl", "npy", "npz", "h5", "pt", "onnx",
+}
+
+# Bytes of an archive entry checked for NUL to tell text from binary content.
+_SNIFF_BYTES = 8192
+
+
+def _spool(stream: Any, source_path: str, temp_dir: str, suffix: str, fingerprint: Dict[str, Any]) -> PendingFile:
+    """Stream ``stream`` to a unique temp file, hashing it on the way."""
+    os.makedirs(temp_dir, exist_ok=True)
+    fd, local_path = tempfile.mkstemp(dir=temp_dir, suffix=suffix)
+    digest = hashlib.sha256()
+    try:
+        with os.fdopen(fd, "wb") as f:
+            for block in iter(lambda: stream.read(1 << 20), b""):
+                digest.update(block)
+                f.write(block)
+    except Exception:
+        os.remove(local_path)
+        raise
+    fingerprint["sha256"] = digest.hexdigest()
+    return PendingFile(path=source_path, data=b"", fingerprint=fingerprint, local_path=local_path, temp=True)
+
+
+def join_source(prefix: str, relative: str) -> str:
+    return prefix.rstrip("/") + "/" + relative.lstrip("/")
+
+
+def parse_s3_uri(uri: str) -> Tuple[str, str]:
+    """Split ``s3://bucket/key`` into (bucket, key); raises ValueError when malformed."""
+    if not uri.startswith("s3://"):
+        raise ValueError(f"Invalid S3 URI: {uri}. Must start with s3://")
+    parts = uri[5:].split("/", 1)
+    if len(parts) != 2 or not parts[0] or not parts[1]:
+        raise ValueError(f"Invalid S3 URI format: {uri}")
+    return parts[0], parts[1]
+
+
+class S3Object(RemoteFile):
+    """
+    An S3 object ingested under its ``s3://`` URI.
+    The object's size and ETag come from a HEAD request and are compared with
+    the stored fingerprint before its body is requested, so unchanged objects
+    are never transferred.
+    Text objects are processed in memory; only PDFs are streamed to a
+    uniquely named file under ``temp_dir``, which the pipeline removes once
+    the file is parsed.
+    """
+
+    def __init__(self, client: Any, uri: str, temp_dir: str):
+        self.client = client
+        self.source_path = uri
+        self.bucket, self.key = parse_s3_uri(uri)
+        self.temp_dir = temp_dir
+
+    def fetch(self, mongo: MongoStore, project_id: Optional[str]) -> Optional[PendingFile]:
+        head = self.client.head_object(Bucket=self.bucket, Key=self.key)
+        fingerprint: Dict[str, Any] = {"size": head.get("ContentLength"), "etag": head.get("ETag")}
+        doc = mongo.get_document(self.source_path)
+        if _is_unchanged(doc, project_id, fingerprint):
+            return None
+
+        resp = self.client.get_object(Bucket=self.bucket, Key=self.key)
+        body = resp["Body"]
+        try:
+            # The object may have been replaced since the HEAD; describe what was read.
+            fingerprint = {"size": resp.get("ContentLength"), "etag": resp.get("ETag")}
+            suffix = Path(self.key).suffix
+            if suffix.lower().lstrip(".") in _NEEDS_LOCAL_FILE:
+                item = _spool(body, self.source_path, self.temp_dir, suffix, fingerprint)
+            else:
+                data = body.read()
+                fingerprint["sha256"] = hashlib.sha256(data).hexdigest()
+                item = PendingFile(path=self.source_path, data=data, fingerprint=fingerprint)
+
+            if doc and _is_unchanged(doc, project_id, {"sha256": fingerprint["sha256"]}):
+                mongo.set_document_fingerprint(str(doc["_id"]), fingerprint)
+                item.cleanup()
+                return None
+            return item
+        finally:
+            body.close()
+
+
+class LocalFile(RemoteFile):
+    """A local file stored under another source path, e.g. the S3 URI it was uploaded to."""
+
+    def __init__(self, path: str, source_path: str):
+        self.path = path
+        self.source_path = source_path
+
+    def fetch(self, mongo: MongoStore, project_id: Optional[str]) -> Optional[PendingFile]:
+        return prepare_file(mongo, self.path, project_id, source_path=self.source_path)
+
+
+class ArchiveMember(RemoteFile):
+    """
+    A file inside a zip archive, read straight from the archive.
+    Size and CRC-32 from the zip directory serve as the fingerprint, so
+    unchanged members are skipped without being decompressed. Members whose
+    first bytes contain NUL are treated as binary and skipped.
+    ``zipfile`` serializes reads of the shared archive handle, so members of
+    one ``ZipFile`` can be fetched from several threads.
+    """
+
+    def __init__(self, archive: zipfile.ZipFile, info: zipfile.ZipInfo, source_path: str, temp_dir: str):
+        self.archive = archive
+        self.info = info
+        self.source_path = source_path
+        self.temp_dir = temp_dir
+
+    def fetch(self, mongo: MongoStore, project_id: Optional[str]) -> Optional[PendingFile]:
+        fingerprint: Dict[str, Any] = {"size": self.info.file_size, "crc": self.info.CRC}
+        doc = mongo.get_document(self.source_path)
+        if _is_unchanged(doc, project_id, fingerprint):
+            return None
+
+        suffix = Path(self.info.filename).suffix
+        with self.archive.open(self.info) as fh:
+            if suffix.lower().lstrip(".") in _NEEDS_LOCAL_FILE:
+                item = _spool(fh, self.source_path, self.temp_dir, suffix, fingerprint)
+            else:
+                data = fh.read()
+                if b"\0" in data[:_SNIFF_BYTES]:
+                    return None
+                fingerprint["sha256"] = hashlib.sha256(data).hexdigest()
+                item = PendingFile(path=self.source_path, data=data, fingerprint=fingerprint)
+
+        if doc and _is_unchanged(doc, project_id, {"sha256": fingerprint["sha256"]}):
+            mongo.set_document_fingerprint(str(doc["_id"]), fingerprint)
+            item.cleanup()
+            return None
+        return item
+
+
+def skip_dirs() -> Set[str]:
+    """Vendored or generated directories never ingested from archives (``ingest_skip_dirs``)."""
+    return {d.strip() for d in settings.ingest_skip_dirs.split(",") if d.strip()}
+
+
+def _wanted(relative: str, extensions: Optional[Set[str]], skip: Set[str]) -> bool:
+    parts = relative.split("/")
+    if any(p in skip for p in parts[:-1]):
+        return False
+    ext = Path(parts[-1]).suffix.lower().lstrip(".")
+    if extensions is not None:
+        return ext in extensions
+    return ext not in ARCHIVE_BINARY_EXTENSIONS
+
+
+def archive_sources(
+    archive: zipfile.ZipFile,
+    source_prefix: str,
+    temp_dir: str,
+    strip_components: int = 1,
+    extensions: Optional[Set[str]] = None,
+) -> List[ArchiveMember]:
+    """
+    Members of ``archive`` to ingest, keyed by ``source_prefix`` plus their path
+    with ``strip_components`` leading directories removed (GitHub zipballs wrap
+    everything in one ``<owner>-<repo>-<sha>/`` directory). Members under
+    ``ingest_skip_dirs`` or with a known binary extension are left out;
+    ``extensions`` restricts the rest to the given extensions.
+    """
+    skip = skip_dirs()
+    out: List[ArchiveMember] = []
+    for info in archive.infolist():
+        if info.is_dir():
+            continue
+        parts = info.filename.split("/")
+        relative = "/".join(parts[strip_components:]) if len(parts) > strip_components else parts[-1]
+        if relative and _wanted(relative, extensions, skip):
+            out.append(ArchiveMember(archive, info, join_source(source_prefix, relative), temp_dir))
+    return out
+
+
+def tree_sources(root: str, paths: List[str], source_prefix: str) -> List[LocalFile]:
+    """Local files under ``root`` keyed by ``source_prefix`` plus their path relative to ``root``."""
+    return [LocalFile(p, join_source(source_prefix, os.path.relpath(p, root).replace(os.sep, "/"))) for p in paths]
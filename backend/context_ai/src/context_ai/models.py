@@ -8,6 +8,8 @@ class IngestRequest(BaseModel):
     recursive: bool = True
     patterns: List[str] = Field(default_factory=lambda: ["**/*.pdf", "**/*.py", "**/*.js", "**/*.ts", "**/*.md"])  # md optional
     project_id: Optional[str] = None
+    source_prefix: Optional[str] = Field(default=None, description="Store files from 'directory' under this prefix plus their relative path, e.g. the S3 location they were uploaded to")
+    chunkers: Optional[Dict[str, str]] = Field(default=None, description="Chunker per file extension overriding the defaults, e.g. {\"js\": \"regex\"}; see chunking.registry.CHUNKERS. Stored for the project and used by later ingests that omit it; {} resets to the defaults")
 
 class QueryFilters(BaseModel):
     path_contains: Optional[str] = None
@@ -24,6 +26,8 @@ class QueryRequest(BaseModel):
     filters: Optional[QueryFilters] = None
     user_id: Optional[str] = None
     project_id: Optional[str] = None
+    nprobe: Optional[int] = Field(default=None, description="IVF lists probed (ANN FAISS indexes only)")
+    ef_search: Optional[int] = Field(default=None, description="HNSW efSearch (ANN FAISS indexes only)")
 
 class DocumentRecord(BaseModel):
     _id: Optional[str] = None
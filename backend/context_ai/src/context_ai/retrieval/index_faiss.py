@@ -1,48 +1,303 @@
 from __future__ import annotations
 import os
+import re
 import json
-from typing import Dict, List, Tuple
+import math
+import hashlib
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Dict, Iterable, List, Optional, Set, Tuple
 import numpy as np
 import faiss
+from ..config import settings
+
+
+# Share of removed-but-still-stored HNSW vectors that triggers a compaction.
+_TOMBSTONE_RATIO = 0.2
+
+
+class _RWLock:
+    """Shared/exclusive lock: many readers or one writer. Waiting writers hold off new readers."""
+
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._readers = 0
+        self._writer = False
+        self._writers_waiting = 0
+
+    @contextmanager
+    def read(self):
+        with self._cond:
+            while self._writer or self._writers_waiting:
+                self._cond.wait()
+            self._readers += 1
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._readers -= 1
+                if not self._readers:
+                    self._cond.notify_all()
+
+    @contextmanager
+    def write(self):
+        with self._cond:
+            self._writers_waiting += 1
+            while self._writer or self._readers:
+                self._cond.wait()
+            self._writers_waiting -= 1
+            self._writer = True
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._writer = False
+                self._cond.notify_all()
+
 
 class FaissIndex:
-    def __init__(self, dim: int, index_dir: str):
+    """Inner-product FAISS index keyed by Mongo chunk ids.
+
+    Vectors live under sequential int64 labels so individual chunks can be
+    removed again. ``high_water`` is the newest chunk id that has been indexed
+    and lets callers sync only what was added since.
+
+    The index starts as an exact ``IndexIDMap2`` over ``IndexFlatIP`` and is
+    migrated to the configured ANN structure (IVF-Flat, IVF-PQ or HNSW) once it
+    holds ``faiss_train_min_vectors`` vectors, training IVF quantizers on the
+    vectors already stored. HNSW cannot delete, so removed labels are only
+    dropped from the id map and the graph is compacted when they pile up.
+
+    FAISS indexes are not safe to search while they are being modified, so
+    searches and reads of the id map share a lock that ``add``, ``remove`` and
+    ``reset`` take exclusively.
+    """
+
+    def __init__(self, dim: int, index_dir: str, index_type: Optional[str] = None):
         self.dim = dim
         self.index_dir = index_dir
+        self.index_type = index_type or settings.faiss_index_type
         os.makedirs(index_dir, exist_ok=True)
         self.index_path = os.path.join(index_dir, "faiss.index")
         self.map_path = os.path.join(index_dir, "id_map.json")
-        self.id_map: List[str] = []
-        self.index = faiss.IndexFlatIP(dim)
+        self.id_map: Dict[int, str] = {}
+        self._labels: Dict[str, int] = {}
+        self._next_label = 0
+        self._tombstones = 0
+        self.kind = "flat"
+        self.high_water: Optional[str] = None
+        self._rw = _RWLock()
+        self.index = self._new_index()
         self._maybe_load()
 
+    def _new_index(self):
+        return faiss.IndexIDMap2(faiss.IndexFlatIP(self.dim))
+
     def _maybe_load(self):
-        if os.path.exists(self.index_path) and os.path.exists(self.map_path):
-            self.index = faiss.read_index(self.index_path)
-            with open(self.map_path, "r", encoding="utf-8") as f:
-                self.id_map = json.load(f)
+        if not (os.path.exists(self.index_path) and os.path.exists(self.map_path)):
+            return
+        with open(self.map_path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        # Indexes written before ids were tracked hold a bare list and cannot
+        # remove vectors; leave them behind so the next sync rebuilds from Mongo.
+        if not isinstance(data, dict):
+            return
+        index = faiss.read_index(self.index_path)
+        if index.d != self.dim:
+            return
+        self.index = index
+        self.kind = data.get("kind", "flat")
+        self._labels = {str(k): int(v) for k, v in data.get("labels", {}).items()}
+        self.id_map = {label: cid for cid, label in self._labels.items()}
+        self._next_label = int(data.get("next_label", max(self.id_map, default=-1) + 1))
+        self._tombstones = int(data.get("tombstones", 0))
+        self.high_water = data.get("high_water")
+
+    def __len__(self) -> int:
+        with self._rw.read():
+            return len(self._labels)
+
+    def __contains__(self, chunk_id: object) -> bool:
+        with self._rw.read():
+            return chunk_id in self._labels
+
+    def ids(self) -> Set[str]:
+        with self._rw.read():
+            return set(self._labels)
+
+    def reset(self):
+        with self._rw.write():
+            self.index = self._new_index()
+            self.kind = "flat"
+            self.id_map = {}
+            self._labels = {}
+            self._next_label = 0
+            self._tombstones = 0
+            self.high_water = None
 
-    def add(self, ids: List[str], embeddings: np.ndarray):
+    def add(self, ids: List[str], embeddings: np.ndarray, save: bool = True):
         assert embeddings.shape[1] == self.dim
-        faiss.normalize_L2(embeddings)
-        self.index.add(embeddings.astype(np.float32))
-        self.id_map.extend(ids)
-        self._save()
+        with self._rw.write():
+            self._add(ids, embeddings)
+            if save:
+                self._save()
 
-    def search(self, query: np.ndarray, top_k: int) -> List[Tuple[str, float]]:
+    def _add(self, ids: List[str], embeddings: np.ndarray):
+        replaced = [i for i in ids if i in self._labels]
+        if replaced:
+            self._remove(replaced)
+        vecs = np.ascontiguousarray(embeddings, dtype=np.float32)
+        faiss.normalize_L2(vecs)
+        labels = np.arange(self._next_label, self._next_label + len(ids), dtype=np.int64)
+        self.index.add_with_ids(vecs, labels)
+        for cid, label in zip(ids, labels.tolist()):
+            self._labels[cid] = label
+            self.id_map[label] = cid
+        self._next_label += len(ids)
+        self._maybe_train()
+
+    def remove(self, ids: Iterable[str], save: bool = True) -> int:
+        with self._rw.write():
+            removed = self._remove(ids)
+            if save:
+                self._save()
+        return removed
+
+    def _remove(self, ids: Iterable[str]) -> int:
+        labels = [self._labels.pop(cid) for cid in ids if cid in self._labels]
+        if not labels:
+            return 0
+        for label in labels:
+            self.id_map.pop(label, None)
+        try:
+            self.index.remove_ids(np.array(labels, dtype=np.int64))
+        except RuntimeError:
+            self._tombstones += len(labels)
+            if self._tombstones > _TOMBSTONE_RATIO * max(self.index.ntotal, 1):
+                self._compact()
+        return len(labels)
+
+    def search(self, query: np.ndarray, top_k: int, nprobe: Optional[int] = None, ef_search: Optional[int] = None) -> List[Tuple[str, float]]:
         if query.ndim == 1:
             query = query.reshape(1, -1)
+        query = np.array(query, dtype=np.float32)
         faiss.normalize_L2(query)
-        D, I = self.index.search(query.astype(np.float32), top_k)
-        results: List[Tuple[str, float]] = []
-        for score, idx in zip(D[0], I[0]):
-            if idx == -1:
-                continue
-            if idx < len(self.id_map):
-                results.append((self.id_map[idx], float(score)))
-        return results
+        with self._rw.read():
+            k = top_k + self._tombstones
+            params = None
+            if self.kind in ("ivf_flat", "ivf_pq"):
+                params = faiss.SearchParametersIVF(nprobe=nprobe or settings.faiss_nprobe)
+            elif self.kind == "hnsw":
+                params = faiss.SearchParametersHNSW(efSearch=max(ef_search or settings.faiss_ef_search, k))
+            D, I = self.index.search(query, k, params=params)
+            results: List[Tuple[str, float]] = []
+            for score, idx in zip(D[0], I[0]):
+                if idx == -1:
+                    continue
+                cid = self.id_map.get(int(idx))
+                if cid is not None:
+                    results.append((cid, float(score)))
+        return results[:top_k]
+
+    def _maybe_train(self):
+        if self.kind != "flat" or self.index_type == "flat":
+            return
+        if len(self._labels) < settings.faiss_train_min_vectors:
+            return
+        vecs, labels = self._export()
+        self.index = self._build(self.index_type, vecs, labels)
+        self.kind = self.index_type
+        self._tombstones = 0
+
+    def _export(self) -> Tuple[np.ndarray, np.ndarray]:
+        """Vectors and labels still referenced by the id map (IDMap2-wrapped indexes only)."""
+        inner = faiss.downcast_index(self.index.index)
+        vecs = inner.reconstruct_n(0, inner.ntotal)
+        labels = faiss.vector_to_array(self.index.id_map).astype(np.int64)
+        keep = np.fromiter((int(l) in self.id_map for l in labels), dtype=bool, count=len(labels))
+        return np.ascontiguousarray(vecs[keep]), labels[keep]
+
+    def _compact(self):
+        vecs, labels = self._export()
+        self.index = self._build(self.kind, vecs, labels)
+        self._tombstones = 0
+
+    def _build(self, kind: str, vecs: np.ndarray, labels: np.ndarray):
+        n = len(vecs)
+        if kind == "hnsw":
+            index = faiss.index_factory(self.dim, f"IDMap2,HNSW{settings.faiss_hnsw_m}", faiss.METRIC_INNER_PRODUCT)
+        elif kind in ("ivf_flat", "ivf_pq"):
+            nlist = settings.faiss_nlist or int(4 * math.sqrt(n))
+            nlist = max(1, min(nlist, n // 39))
+            if kind == "ivf_pq":
+                m = max(d for d in range(1, min(settings.faiss_pq_m, self.dim) + 1) if self.dim % d == 0)
+                desc = f"IVF{nlist},PQ{m}"
+            else:
+                desc = f"IVF{nlist},Flat"
+            index = faiss.index_factory(self.dim, desc, faiss.METRIC_INNER_PRODUCT)
+            index.train(vecs)
+        else:
+            index = self._new_index()
+        if n:
+            index.add_with_ids(vecs, labels)
+        return index
+
+    def save(self):
+        with self._rw.read():
+            self._save()
 
     def _save(self):
-        faiss.write_index(self.index, self.index_path)
-        with open(self.map_path, "w", encoding="utf-8") as f:
-            json.dump(self.id_map, f)
+        faiss.write_index(self.index, self.index_path + ".tmp")
+        os.replace(self.index_path + ".tmp", self.index_path)
+        with open(self.map_path + ".tmp", "w", encoding="utf-8") as f:
+            json.dump({
+                "kind": self.kind,
+                "labels": self._labels,
+                "next_label": self._next_label,
+                "tombstones": self._tombstones,
+                "high_water": self.high_water,
+            }, f)
+        os.replace(self.map_path + ".tmp", self.map_path)
+
+
+class ProjectIndexes:
+    """Per-project FaissIndex shards stored under ``<index_dir>/projects``.
+
+    Shards are opened on first use and the least recently used one is
+    dropped from memory once more than ``capacity`` are loaded; evicted
+    shards stay on disk and reopen cheaply.
+    """
+
+    def __init__(self, dim: int, index_dir: str, capacity: Optional[int] = None):
+        self.dim = dim
+        self.root = os.path.join(index_dir, "projects")
+        self.capacity = max(1, capacity or settings.faiss_max_loaded_projects)
+        self._loaded: "OrderedDict[str, FaissIndex]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def shard_dir(self, project_id: str) -> str:
+        safe = re.sub(r"[^A-Za-z0-9_.-]", "_", project_id)[:64]
+        digest = hashlib.sha1(project_id.encode("utf-8")).hexdigest()[:8]
+        return os.path.join(self.root, f"{safe}-{digest}")
+
+    def get(self, project_id: str) -> Tuple[FaissIndex, bool]:
+        """Return the shard for ``project_id`` and whether it was just loaded."""
+        with self._lock:
+            index = self._loaded.get(project_id)
+            if index is not None:
+                self._loaded.move_to_end(project_id)
+                return index, False
+            index = FaissIndex(dim=self.dim, index_dir=self.shard_dir(project_id))
+            self._loaded[project_id] = index
+            while len(self._loaded) > self.capacity:
+                self._loaded.popitem(last=False)
+            return index, True
+
+    def evict(self, project_id: str):
+        with self._lock:
+            self._loaded.pop(project_id, None)
+
+    def loaded(self) -> List[str]:
+        with self._lock:
+            return list(self._loaded)
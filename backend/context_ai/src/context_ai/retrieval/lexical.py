@@ -0,0 +1,59 @@
+from __future__ import annotations
+from typing import Dict, List, Optional
+import logging
+import math
+import numpy as np
+from ..config import settings
+from ..storage.mongo_store import MongoStore, lexical_fields
+from ..utils.tokenization import lexical_terms
+
+
+logger = logging.getLogger("context_ai.retrieval")
+
+
+class LexicalScorer:
+    """BM25 over corpus-wide statistics kept per project in Mongo.
+
+    Term frequencies are stored on each chunk at ingest and document
+    frequencies/lengths in the lexical collections, so a query only looks up
+    the df of its own terms instead of re-tokenizing candidate texts.
+    """
+
+    def __init__(self, mongo: MongoStore, k1: Optional[float] = None, b: Optional[float] = None):
+        self.mongo = mongo
+        self.k1 = settings.bm25_k1 if k1 is None else k1
+        self.b = settings.bm25_b if b is None else b
+
+    def stats(self, project_id: Optional[str], terms: List[str]) -> Optional[Dict]:
+        stats = self.mongo.lexical_stats(project_id, terms)
+        if stats is None and project_id is not None:
+            logger.info("Building lexical statistics for project_id=%s", project_id)
+            self.mongo.rebuild_lexical_stats(project_id)
+            stats = self.mongo.lexical_stats(project_id, terms)
+        return stats
+
+    def raw_scores(self, project_id: Optional[str], query: str, candidates: List[Dict]) -> np.ndarray:
+        terms = list(dict.fromkeys(lexical_terms(query)))
+        scores = np.zeros(len(candidates), dtype=np.float32)
+        if not terms or not candidates:
+            return scores
+        stats = self.stats(project_id, terms)
+        if stats is None:
+            return scores
+
+        n_docs = stats["n_docs"]
+        avg_len = stats["avg_len"] or 1.0
+        idf = {t: math.log(1.0 + (n_docs - stats["df"].get(t, 0) + 0.5) / (stats["df"].get(t, 0) + 0.5)) for t in terms}
+        for i, c in enumerate(candidates):
+            tf = c.get("lex_tf")
+            length = c.get("lex_len")
+            if tf is None:
+                tf, length = lexical_fields(c.get("text", ""))
+            norm = self.k1 * (1.0 - self.b + self.b * (length or 0) / avg_len)
+            s = 0.0
+            for t in terms:
+                f = tf.get(t)
+                if f:
+                    s += idf[t] * f * (self.k1 + 1.0) / (f + norm)
+            scores[i] = s
+        return scores
@@ -1,66 +1,140 @@
 from __future__ import annotations
-from typing import Dict, List, Tuple, Optional
+from typing import Callable, Dict, List, Tuple, Optional
 import logging
-import math
-from rank_bm25 import BM25Okapi
+import threading
+import time
 import numpy as np
 from ..config import settings
 from ..embeddings.encoder import EmbeddingEncoder
 from ..storage.mongo_store import MongoStore
-from .index_faiss import FaissIndex
-from ..utils.tokenization import approximate_token_count
+from .index_faiss import FaissIndex, ProjectIndexes
+from .lexical import LexicalScorer
+from ..utils.tokenization import chunk_token_counts
+from ..utils.vectors import cosine_top_k, embeddings_to_matrix, mmr_select, normalize_rows
 
 
-def _bm25_scores(corpus: List[str], query: str) -> List[float]:
-    tokenized_corpus = [doc.split() for doc in corpus]
-    if not any(tokenized_corpus):
-        return [0.0 for _ in corpus]
+_INDEX_BATCH = 4096
 
-    try:
-        bm25 = BM25Okapi(tokenized_corpus)
-        scores = bm25.get_scores(query.split())
-    except Exception:
-        return [0.0 for _ in corpus]
 
-    if not getattr(scores, 'size', None):
-        return [0.0 for _ in corpus]
-    smin, smax = float(np.min(scores)), float(np.max(scores))
-    if math.isclose(smax, smin):
-        return [0.0 for _ in corpus]
-    return [float((s - smin) / (smax - smin)) for s in scores]
+def _as_vector(emb) -> Optional[np.ndarray]:
+    if emb is None or len(emb) == 0:
+        return None
+    if isinstance(emb, (bytes, bytearray)):
+        return np.frombuffer(emb, dtype=np.float32)
+    return np.asarray(emb, dtype=np.float32)
 
 
 class Retriever:
-    def __init__(self, mongo: MongoStore, encoder: EmbeddingEncoder, backend: Optional[str] = None):
+    def __init__(
+        self,
+        mongo: MongoStore,
+        encoder: EmbeddingEncoder,
+        backend: Optional[str] = None,
+        query_embedder: Optional[Callable[[str], np.ndarray]] = None,
+    ):
         self.mongo = mongo
         self.encoder = encoder
+        # Embeds query strings; defaults to the encoder's cached single-query path.
+        self.query_embedder = query_embedder or encoder.encode_query
         self.backend = backend or settings.vector_backend
+        self.lexical = LexicalScorer(mongo)
         self._faiss: Optional[FaissIndex] = None
+        self._projects: Optional[ProjectIndexes] = None
+        self._project_synced: Dict[str, float] = {}
+        self._sync_lock = threading.RLock()
         self._dim: Optional[int] = None
 
+    def _ensure_dim(self) -> int:
+        if self._dim is None:
+            self._dim = self.encoder.dim
+        return self._dim
+
     def _ensure_faiss(self):
         if self._faiss is None:
-            if self._dim is None:
-                emb = self.encoder.encode(["dim"])
-                self._dim = emb.shape[1]
-            self._faiss = FaissIndex(dim=self._dim, index_dir=settings.index_dir)
+            self._faiss = FaissIndex(dim=self._ensure_dim(), index_dir=settings.index_dir)
+
+    def _ensure_projects(self) -> ProjectIndexes:
+        if self._projects is None:
+            self._projects = ProjectIndexes(dim=self._ensure_dim(), index_dir=settings.index_dir)
+        return self._projects
 
-    def index_all_from_mongo(self):
+    def index_all_from_mongo(self, rebuild: bool = False) -> Dict[str, int]:
+        """
+        Bring the FAISS index in line with the chunks collection.
+        Only chunks missing from the index are loaded (mostly those past its
+        high-water mark) and vectors of chunks deleted from Mongo are removed.
+        Pass ``rebuild=True`` to discard the persisted index and start over.
+        """
         self._ensure_faiss()
+        assert self._faiss is not None
+        with self._sync_lock:
+            return self._sync_index(self._faiss, {}, rebuild=rebuild)
+
+    def project_index(self, project_id: str, rebuild: bool = False) -> FaissIndex:
+        """
+        Return the FAISS shard holding only ``project_id``'s chunks.
+        The shard is synced with Mongo when it is first loaded, after
+        ``mark_stale`` and every ``faiss_project_sync_seconds``.
+        """
+        index, loaded = self._ensure_projects().get(project_id)
+        last = self._project_synced.get(project_id)
+        if rebuild or loaded or last is None or time.monotonic() - last > settings.faiss_project_sync_seconds:
+            with self._sync_lock:
+                self._sync_index(index, {"project_id": project_id}, rebuild=rebuild)
+                self._project_synced[project_id] = time.monotonic()
+        return index
+
+    def mark_stale(self, project_id: str):
+        """Force the project's shard to re-sync before its next search."""
+        self._project_synced.pop(project_id, None)
+
+    def _sync_index(self, index: FaissIndex, filters: Dict[str, object], rebuild: bool = False) -> Dict[str, int]:
+        if rebuild:
+            index.reset()
+
+        live = self.mongo.chunk_ids(filters)
+        indexed = index.ids()
+        removed = index.remove(indexed - live, save=False)
+
+        added = 0
+        seen: set = set()
         ids: List[str] = []
-        vecs: List[List[float]] = []
-        for row in self.mongo.all_chunks_for_index():
-            emb = row.get("embedding")
-            if emb is None:
-                continue
-            if isinstance(emb, (bytes, bytearray)):
-                v = np.frombuffer(emb, dtype=np.float32)
-            else:
-                v = np.array(emb, dtype=np.float32)
-            ids.append(str(row["_id"]))
-            vecs.append(v.tolist())
-        if vecs:
-            self._faiss.add(ids, np.array(vecs, dtype=np.float32))
+        vecs: List[np.ndarray] = []
+
+        def _flush():
+            nonlocal added
+            if ids:
+                index.add(ids, np.vstack(vecs), save=False)
+                added += len(ids)
+                ids.clear()
+                vecs.clear()
+
+        def _consume(row):
+            cid = str(row["_id"])
+            seen.add(cid)
+            v = _as_vector(row.get("embedding"))
+            if v is None or cid in indexed:
+                return
+            ids.append(cid)
+            vecs.append(v)
+            if len(ids) >= _INDEX_BATCH:
+                _flush()
+
+        high_water = index.high_water
+        for row in self.mongo.chunks_for_index(after_id=high_water, filters=filters):
+            high_water = str(row["_id"])
+            _consume(row)
+        # Chunks committed out of _id order end up below the high-water mark.
+        stragglers = list(live - indexed - seen)
+        for start in range(0, len(stragglers), _INDEX_BATCH):
+            for row in self.mongo.chunks_for_index(ids=stragglers[start:start + _INDEX_BATCH]):
+                _consume(row)
+        _flush()
+
+        if added or removed or high_water != index.high_water:
+            index.high_water = high_water
+            index.save()
+        return {"added": added, "removed": removed, "total": len(index)}
 
     def _mongo_vector_search(self, query_vec: List[float], top_k: int, filters: Dict) -> List[Tuple[str, float]]:
         try:
@@ -85,42 +159,112 @@ class Retriever:
         except Exception:
             pass
 
-        results: List[Tuple[str, float]] = []
-        q = np.array(query_vec, dtype=np.float32)
-        for row in self.mongo.col_chunks.find(filters, projection={"_id": 1, "embedding": 1, "text": 1}).limit(5000):
-            emb = row.get("embedding")
-            if not emb:
-                continue
-            if isinstance(emb, (bytes, bytearray)):
-                v = np.frombuffer(emb, dtype=np.float32)
-            else:
-                v = np.array(emb, dtype=np.float32)
-            denom = (np.linalg.norm(q) * np.linalg.norm(v) + 1e-8)
-            score = float(np.dot(q, v) / denom)
-            results.append((str(row["_id"]), score))
-        results.sort(key=lambda x: x[1], reverse=True)
-        return results[:top_k]
-
-    def retrieve(self, query: str, top_k: int, token_budget: Optional[int], filters: Optional[Dict[str, object]] = None) -> List[Dict]:
+        rows = list(self.mongo.col_chunks.find(filters, projection={"_id": 1, "embedding": 1}).limit(5000).batch_size(5000))
+        matrix, kept = embeddings_to_matrix([row.get("embedding") for row in rows])
+        return [(str(rows[kept[i]]["_id"]), score) for i, score in cosine_top_k(matrix, np.asarray(query_vec), top_k)]
+
+    @staticmethod
+    def _candidate_matrix(candidates: List[Dict], dim: int) -> Tuple[np.ndarray, List[int]]:
+        """Unit-length stored embeddings of ``candidates`` (zero rows where missing)."""
+        matrix = np.zeros((len(candidates), dim), dtype=np.float32)
+        stored, kept = embeddings_to_matrix([c.get("embedding") for c in candidates])
+        if kept and stored.shape[1] == dim:
+            matrix[kept] = normalize_rows(stored)
+        else:
+            kept = []
+        return matrix, kept
+
+    def _fuse_scores(
+        self,
+        query: str,
+        qvec: np.ndarray,
+        candidates: List[Dict],
+        vec_scores: Dict[str, float],
+        project_id: Optional[str],
+        matrix: np.ndarray,
+        kept: List[int],
+    ) -> np.ndarray:
+        """
+        Combine vector and BM25 relevance over the union of both legs.
+        Cosine scores are recomputed from the stored embeddings so lexical-only
+        candidates are ranked on the same scale as vector hits.
+        """
+        vec = np.array([vec_scores.get(str(c["_id"]), 0.0) for c in candidates], dtype=np.float32)
+        if kept:
+            q = np.asarray(qvec, dtype=np.float32)
+            vec[kept] = matrix[kept] @ (q / (np.linalg.norm(q) + 1e-8))
+        lex = self.lexical.raw_scores(project_id, query, candidates)
+        alpha = settings.hybrid_alpha
+
+        if settings.hybrid_fusion == "weighted":
+            span = float(lex.max() - lex.min()) if lex.size else 0.0
+            lex_norm = (lex - lex.min()) / span if span > 0 else np.zeros_like(lex)
+            return alpha * vec + (1 - alpha) * lex_norm
+
+        fused = np.zeros(len(candidates), dtype=np.float32)
+        ranks = 1.0 / (settings.rrf_k + np.arange(1, len(candidates) + 1, dtype=np.float32))
+        fused[np.argsort(-vec, kind="stable")] += alpha * ranks
+        lex_order = [i for i in np.argsort(-lex, kind="stable") if lex[i] > 0]
+        fused[lex_order] += (1 - alpha) * ranks[:len(lex_order)]
+        return fused
+
+    def retrieve(
+        self,
+        query: str,
+        top_k: int,
+        token_budget: Optional[int],
+        filters: Optional[Dict[str, object]] = None,
+        nprobe: Optional[int] = None,
+        ef_search: Optional[int] = None,
+        query_vector: Optional[np.ndarray] = None,
+    ) -> List[Dict]:
+        chunks, _ = self.retrieve_with_vector(query, top_k, token_budget, filters, nprobe=nprobe, ef_search=ef_search, query_vector=query_vector)
+        return chunks
+
+    def retrieve_with_vector(
+        self,
+        query: str,
+        top_k: int,
+        token_budget: Optional[int],
+        filters: Optional[Dict[str, object]] = None,
+        nprobe: Optional[int] = None,
+        ef_search: Optional[int] = None,
+        query_vector: Optional[np.ndarray] = None,
+    ) -> Tuple[List[Dict], np.ndarray]:
+        """Same as ``retrieve`` but also returns the query embedding for reuse by the caller."""
         filters = filters or {}
-        qvec = self.encoder.encode([query])[0]
+        qvec = query_vector if query_vector is not None else self.query_embedder(query)
         vec_results: List[Tuple[str, float]]
         logger = logging.getLogger("context_ai.retrieval")
 
-        prefer_mongo = False
-        if filters and isinstance(filters, dict) and "project_id" in filters:
-            prefer_mongo = True
+        project_id = filters.get("project_id") if isinstance(filters, dict) else None
+        # FAISS shards only know about projects, so any other filter is applied
+        # when the hits are loaded from Mongo; over-fetch to keep top_k filled.
+        extra_filters = {k: v for k, v in filters.items() if k != "project_id"}
+        fetch_k = top_k * 4 if extra_filters else top_k
+        if settings.mmr_enabled:
+            fetch_k *= max(1, settings.mmr_fetch_factor)
 
-        if (self.backend or settings.vector_backend) == "faiss" and not prefer_mongo:
-            self._ensure_faiss()
-            vec_results = self._faiss.search(qvec, top_k=top_k) if self._faiss else []
+        if (self.backend or settings.vector_backend) == "faiss":
+            if project_id is not None:
+                index = self.project_index(str(project_id))
+            else:
+                if self._faiss is None:
+                    self.index_all_from_mongo()
+                index = self._faiss
+            vec_results = index.search(qvec, top_k=fetch_k, nprobe=nprobe, ef_search=ef_search) if index else []
         else:
-            vec_results = self._mongo_vector_search(qvec.tolist(), top_k=top_k, filters=filters)
+            extra_filters = {}
+            vec_results = self._mongo_vector_search(qvec.tolist(), top_k=fetch_k, filters=filters)
 
         logger.debug("Vector search returned %d id(s)", len(vec_results))
 
-        ids = [rid for rid, _ in vec_results]
-        candidates = self.mongo.get_chunks_by_ids(ids)
+        # Lexical leg: exact identifiers and error strings the embedding misses.
+        lex_results = self.mongo.text_search(query, filters, limit=settings.lexical_candidates)
+        logger.debug("Text search returned %d id(s)", len(lex_results))
+
+        ids = list(dict.fromkeys([rid for rid, _ in vec_results] + [rid for rid, _ in lex_results]))
+        candidates = self.mongo.get_chunks_by_ids(ids, filters=extra_filters)
         id_to_score = dict(vec_results)
 
         try:
@@ -134,14 +278,18 @@ class Retriever:
                 candidates = [c for c in candidates if (c.get("project_id") == pid) or (c.get("metadata", {}).get("project_id") == pid)]
                 logger.debug("Filtered candidates by project_id=%s, remaining=%d", pid, len(candidates))
 
-        texts = [c["text"] for c in candidates]
-        if texts:
-            bm25 = _bm25_scores(texts, query)
-            alpha = settings.hybrid_alpha
-            for i, c in enumerate(candidates):
-                vec_s = id_to_score.get(str(c["_id"]), 0.0)
-                c["_score"] = alpha * vec_s + (1 - alpha) * bm25[i]
-        candidates.sort(key=lambda c: c.get("_score", 0.0), reverse=True)
+        if candidates:
+            matrix, kept = self._candidate_matrix(candidates, qvec.shape[0])
+            fused = self._fuse_scores(query, qvec, candidates, id_to_score, str(project_id) if project_id is not None else None, matrix, kept)
+            for c, score in zip(candidates, fused.tolist()):
+                c["_score"] = score
+            # MMR runs before token-budget packing so near-duplicate parts of
+            # the same function or page don't crowd out other sources.
+            if settings.mmr_enabled and len(candidates) > 1:
+                order = mmr_select(matrix, fused, len(candidates), settings.mmr_lambda)
+            else:
+                order = np.argsort(-fused, kind="stable").tolist()
+            candidates = [candidates[i] for i in order]
 
         try:
             preview = [{"_id": str(c.get("_id")), "project_id": c.get("project_id") or c.get("metadata", {}).get("project_id"), "score": c.get("_score", 0.0), "text_preview": (c.get("text", "")[:120] + "...") if len(c.get("text", "")) > 120 else c.get("text", "")} for c in candidates[:top_k]]
@@ -152,12 +300,11 @@ class Retriever:
         if token_budget:
             out: List[Dict] = []
             total = 0
-            for c in candidates:
-                ctok = c.get("metadata", {}).get("token_count") or approximate_token_count(c.get("text", ""))
+            for c, ctok in zip(candidates, chunk_token_counts(candidates)):
                 if total + ctok > token_budget:
                     break
                 out.append(c)
                 total += ctok
             candidates = out
 
-        return candidates[:top_k]
+        return candidates[:top_k], qvec
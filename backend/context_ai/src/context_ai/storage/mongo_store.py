@@ -1,11 +1,20 @@
 from __future__ import annotations
-from typing import Any, Dict, Iterable, List, Optional, Tuple
-from datetime import datetime, timezone
-from pymongo import MongoClient, ASCENDING
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+from collections import Counter
+from datetime import datetime, timedelta, timezone
+from pymongo import MongoClient, ASCENDING, UpdateOne
 from bson import Binary
 import numpy as np
 from pymongo.collection import Collection
 from ..config import settings
+from ..utils.vectors import cosine_top_k, embeddings_to_matrix
+from ..utils.tokenization import lexical_terms
+
+
+def lexical_fields(text: str) -> Tuple[Dict[str, int], int]:
+    """Term frequencies and length of a chunk as stored for BM25 scoring."""
+    terms = lexical_terms(text)
+    return dict(Counter(terms)), len(terms)
 
 
 class MongoStore:
@@ -16,6 +25,10 @@ class MongoStore:
         self.col_chunks: Collection = self.db[settings.mongo_collection_chunks]
         self.col_agents: Collection = self.db[settings.mongo_collection_agents]
         self.col_conversations: Collection = self.db[settings.mongo_collection_conversations]
+        self.col_lexical_terms: Collection = self.db[settings.mongo_collection_lexical_terms]
+        self.col_lexical_stats: Collection = self.db[settings.mongo_collection_lexical_stats]
+        self.col_ingest_jobs: Collection = self.db[settings.mongo_collection_ingest_jobs]
+        self.col_project_settings: Collection = self.db[settings.mongo_collection_project_settings]
         self._ensure_indexes()
 
     def _ensure_indexes(self):
@@ -25,8 +38,10 @@ class MongoStore:
         self.col_chunks.create_index([("metadata.file_ext", ASCENDING)])
         self.col_chunks.create_index([("metadata.token_count", ASCENDING)])
         self.col_chunks.create_index([("source_path", ASCENDING)])
+        self.col_chunks.create_index([("content_hash", ASCENDING)])
         try:
             self.col_chunks.create_index([("project_id", ASCENDING)])
+            self.col_chunks.create_index([("project_id", ASCENDING), ("_id", ASCENDING)])
         except Exception:
             pass
         try:
@@ -34,6 +49,24 @@ class MongoStore:
         except Exception:
             pass
 
+        try:
+            self.col_lexical_terms.create_index([("project_id", ASCENDING), ("term", ASCENDING)], unique=True)
+            self.col_lexical_stats.create_index([("project_id", ASCENDING)], unique=True)
+        except Exception:
+            pass
+
+        try:
+            self.col_ingest_jobs.create_index([("status", ASCENDING)])
+            self.col_ingest_jobs.create_index([("owner", ASCENDING), ("status", ASCENDING)])
+            self.col_ingest_jobs.create_index([("project_id", ASCENDING), ("created_at", ASCENDING)])
+        except Exception:
+            pass
+
+        try:
+            self.col_project_settings.create_index([("project_id", ASCENDING)], unique=True)
+        except Exception:
+            pass
+
         try:
             self.col_agents.create_index([("name", ASCENDING)], unique=True)
         except Exception:
@@ -57,6 +90,45 @@ class MongoStore:
         doc = self.col_docs.find_one({"source_path": source_path})
         return str(doc["_id"])  # type: ignore
 
+    def get_document(self, source_path: str) -> Optional[Dict[str, Any]]:
+        return self.col_docs.find_one({"source_path": source_path})
+
+    def set_document_fingerprint(self, doc_id: str, fingerprint: Dict[str, Any]):
+        from bson import ObjectId
+        self.col_docs.update_one({"_id": ObjectId(doc_id)}, {"$set": {"fingerprint": fingerprint}})
+
+    def replace_document_chunks(
+        self,
+        source_path: str,
+        file_ext: str,
+        language: Optional[str],
+        metadata: Dict[str, Any],
+        chunks: List[Dict[str, Any]],
+        embeddings: Optional[object],
+        fingerprint: Dict[str, Any],
+    ) -> Tuple[str, List[str]]:
+        """
+        Swap a document's chunks for a new set.
+        New chunks are inserted before the old ones are deleted, so readers see
+        the old or the new version but never a document without chunks. The
+        fingerprint is written last; an interrupted run is redone next time.
+        """
+        from bson import ObjectId
+        doc_id = self.upsert_document(source_path=source_path, file_ext=file_ext, language=language, metadata=metadata)
+        new_ids = self.insert_chunks(doc_id=doc_id, source_path=source_path, chunks=chunks, embeddings=embeddings)
+        self.delete_chunks({"doc_id": doc_id, "_id": {"$nin": [ObjectId(i) for i in new_ids]}})
+        self.set_document_fingerprint(doc_id, fingerprint)
+        return doc_id, new_ids
+
+    def delete_chunks(self, filters: Dict[str, Any]) -> int:
+        """Delete chunks matching ``filters`` and take them out of the BM25 statistics."""
+        rows = list(self.col_chunks.find(filters, projection={"_id": 1, "project_id": 1, "lex_tf": 1, "lex_len": 1}))
+        if not rows:
+            return 0
+        res = self.col_chunks.delete_many({"_id": {"$in": [r["_id"] for r in rows]}})
+        self.update_lexical_stats(rows, sign=-1)
+        return res.deleted_count
+
     def insert_chunks(self, doc_id: str, source_path: str, chunks: List[Dict[str, Any]], embeddings: Optional[object] = None) -> List[str]:
         now = datetime.now(timezone.utc)
         rows = []
@@ -65,6 +137,7 @@ class MongoStore:
             token_count = meta.get("token_count")
             language = meta.get("language") or ch.get("language")
             file_ext = meta.get("file_ext") or ch.get("file_ext")
+            lex_tf, lex_len = lexical_fields(ch["text"])
 
             row = {
                 "doc_id": doc_id,
@@ -80,6 +153,9 @@ class MongoStore:
                 "file_ext": file_ext,
                 "metadata": meta,
                 "project_id": meta.get("project_id") if isinstance(meta, dict) else None,
+                "content_hash": ch.get("content_hash"),
+                "lex_tf": lex_tf,
+                "lex_len": lex_len,
                 "created_at": now,
                 "updated_at": now,
             }
@@ -93,15 +169,175 @@ class MongoStore:
         if not rows:
             return []
         res = self.col_chunks.insert_many(rows)
+        self.update_lexical_stats(rows, sign=1)
         return [str(_id) for _id in res.inserted_ids]
 
+    def update_lexical_stats(self, rows: List[Dict[str, Any]], sign: int = 1):
+        """
+        Add (``sign=1``) or subtract (``sign=-1``) chunk rows from their
+        project's BM25 statistics: document frequency per term, chunk count
+        and total chunk length.
+        """
+        by_project: Dict[Any, Tuple[Counter, int, int]] = {}
+        for row in rows:
+            tf = row.get("lex_tf")
+            if tf is None:
+                continue
+            df, n_docs, total_len = by_project.get(row.get("project_id"), (Counter(), 0, 0))
+            df.update(tf.keys())
+            by_project[row.get("project_id")] = (df, n_docs + 1, total_len + int(row.get("lex_len") or 0))
+
+        for project_id, (df, n_docs, total_len) in by_project.items():
+            ops = [
+                UpdateOne({"project_id": project_id, "term": term}, {"$inc": {"df": sign * count}}, upsert=True)
+                for term, count in df.items()
+            ]
+            if ops:
+                self.col_lexical_terms.bulk_write(ops, ordered=False)
+            res = self.col_lexical_stats.update_one(
+                {"project_id": project_id},
+                {"$inc": {"n_docs": sign * n_docs, "total_len": sign * total_len}},
+                upsert=True,
+            )
+            # A project whose stats doc starts here may already hold chunks
+            # from before lexical statistics were kept; leave it unmarked so
+            # the first query rebuilds it instead of trusting these counts.
+            if res.upserted_id is not None and not self.col_chunks.find_one(
+                {"project_id": project_id, "lex_tf": {"$exists": False}}, projection={"_id": 1}
+            ):
+                self.col_lexical_stats.update_one({"_id": res.upserted_id}, {"$set": {"backfilled": True}})
+            if sign < 0:
+                self.col_lexical_terms.delete_many({"project_id": project_id, "df": {"$lte": 0}})
+
+    def lexical_stats(self, project_id: Optional[str], terms: List[str]) -> Optional[Dict[str, Any]]:
+        """
+        BM25 corpus statistics for ``terms``: ``n_docs``, ``avg_len`` and a
+        ``df`` map. ``project_id=None`` aggregates over every project.
+        Returns None when no statistics have been recorded yet, or when a
+        project's statistics have not been rebuilt over its older chunks.
+        """
+        match: Dict[str, Any] = {} if project_id is None else {"project_id": project_id}
+        stats = list(self.col_lexical_stats.find(match, projection={"n_docs": 1, "total_len": 1, "backfilled": 1}))
+        if project_id is not None and not any(st.get("backfilled") for st in stats):
+            return None
+        n_docs = sum(int(st.get("n_docs") or 0) for st in stats)
+        if n_docs <= 0:
+            return None
+        total_len = sum(int(st.get("total_len") or 0) for st in stats)
+        df: Dict[str, int] = {}
+        for row in self.col_lexical_terms.find({**match, "term": {"$in": list(set(terms))}}, projection={"term": 1, "df": 1}):
+            df[row["term"]] = df.get(row["term"], 0) + int(row.get("df") or 0)
+        return {"n_docs": n_docs, "avg_len": total_len / n_docs, "df": df}
+
+    def rebuild_lexical_stats(self, project_id: Optional[str]):
+        """
+        Recompute a project's BM25 statistics, backfilling term frequencies on
+        older chunks. Totals are computed first and written with ``$set``, so
+        concurrent rebuilds of the same project converge instead of adding up.
+        """
+        df: Counter = Counter()
+        n_docs = 0
+        total_len = 0
+        backfill: List[UpdateOne] = []
+        for row in self.col_chunks.find({"project_id": project_id}, projection={"text": 1, "lex_tf": 1, "lex_len": 1}):
+            if row.get("lex_tf") is None:
+                row["lex_tf"], row["lex_len"] = lexical_fields(row.get("text") or "")
+                backfill.append(UpdateOne({"_id": row["_id"]}, {"$set": {"lex_tf": row["lex_tf"], "lex_len": row["lex_len"]}}))
+            df.update(row["lex_tf"].keys())
+            n_docs += 1
+            total_len += int(row.get("lex_len") or 0)
+            if len(backfill) >= 1000:
+                self.col_chunks.bulk_write(backfill, ordered=False)
+                backfill.clear()
+        if backfill:
+            self.col_chunks.bulk_write(backfill, ordered=False)
+
+        ops = [UpdateOne({"project_id": project_id, "term": term}, {"$set": {"df": count}}, upsert=True) for term, count in df.items()]
+        for start in range(0, len(ops), 1000):
+            self.col_lexical_terms.bulk_write(ops[start:start + 1000], ordered=False)
+        stale = [
+            row["term"]
+            for row in self.col_lexical_terms.find({"project_id": project_id}, projection={"term": 1})
+            if row["term"] not in df
+        ]
+        for start in range(0, len(stale), 1000):
+            self.col_lexical_terms.delete_many({"project_id": project_id, "term": {"$in": stale[start:start + 1000]}})
+        self.col_lexical_stats.update_one(
+            {"project_id": project_id},
+            {"$set": {"n_docs": n_docs, "total_len": total_len, "backfilled": True}},
+            upsert=True,
+        )
+
+    def embeddings_by_hash(self, hashes: List[str], dim: Optional[int] = None) -> Dict[str, np.ndarray]:
+        """Stored embeddings for the given chunk content hashes (first match per hash)."""
+        out: Dict[str, np.ndarray] = {}
+        for start in range(0, len(hashes), 1000):
+            batch = hashes[start:start + 1000]
+            cur = self.col_chunks.find(
+                {"content_hash": {"$in": batch}, "embedding": {"$exists": True}},
+                projection={"_id": 0, "content_hash": 1, "embedding": 1},
+            )
+            for row in cur:
+                h = row["content_hash"]
+                if h in out:
+                    continue
+                emb = row["embedding"]
+                vec = np.frombuffer(emb, dtype=np.float32) if isinstance(emb, (bytes, bytearray)) else np.asarray(emb, dtype=np.float32)
+                if dim is None or vec.shape[0] == dim:
+                    out[h] = vec
+        return out
+
     def find_chunks(self, filters: Dict[str, Any], limit: int = 10) -> List[Dict[str, Any]]:
         return list(self.col_chunks.find(filters).limit(limit))
 
     def all_chunks_for_index(self) -> Iterable[Dict[str, Any]]:
         return self.col_chunks.find({}, projection={"_id": 1, "embedding": 1})
 
-    def get_chunks_by_ids(self, ids: List[Any]) -> List[Dict[str, Any]]:
+    def chunk_ids(self, filters: Optional[Dict[str, Any]] = None) -> Set[str]:
+        """Ids of every chunk matching ``filters``, without loading embeddings."""
+        return {str(row["_id"]) for row in self.col_chunks.find(filters or {}, projection={"_id": 1})}
+
+    def chunks_for_index(
+        self,
+        after_id: Optional[str] = None,
+        ids: Optional[List[str]] = None,
+        filters: Optional[Dict[str, Any]] = None,
+    ) -> Iterable[Dict[str, Any]]:
+        """
+        Stream chunk ids and embeddings in ``_id`` order for index maintenance.
+        ``after_id`` restricts to chunks inserted after that id, ``ids`` to an explicit set.
+        """
+        from bson import ObjectId
+        query: Dict[str, Any] = dict(filters or {})
+        if after_id:
+            try:
+                query["_id"] = {"$gt": ObjectId(after_id)}
+            except Exception:
+                pass
+        if ids is not None:
+            query["_id"] = {"$in": [ObjectId(i) if ObjectId.is_valid(i) else i for i in ids]}
+        return self.col_chunks.find(query, projection={"_id": 1, "embedding": 1}).sort("_id", ASCENDING)
+
+    def text_search(self, query: str, filters: Optional[Dict[str, Any]] = None, limit: int = 20) -> List[Tuple[str, float]]:
+        """
+        Lexical candidates from the chunks text index as (id, textScore), best first.
+        Returns an empty list when the text index is unavailable.
+        """
+        if not query.strip() or limit <= 0:
+            return []
+        q: Dict[str, Any] = dict(filters or {})
+        q["$text"] = {"$search": query}
+        try:
+            cur = (
+                self.col_chunks.find(q, projection={"_id": 1, "score": {"$meta": "textScore"}})
+                .sort([("score", {"$meta": "textScore"})])
+                .limit(limit)
+            )
+            return [(str(row["_id"]), float(row.get("score", 0.0))) for row in cur]
+        except Exception:
+            return []
+
+    def get_chunks_by_ids(self, ids: List[Any], filters: Optional[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
         from bson import ObjectId
         conv: List[Any] = []
         for i in ids:
@@ -112,7 +348,76 @@ class MongoStore:
                     conv.append(i)
             else:
                 conv.append(i)
-        return list(self.col_chunks.find({"_id": {"$in": conv}}))
+        query: Dict[str, Any] = dict(filters or {})
+        query["_id"] = {"$in": conv}
+        return list(self.col_chunks.find(query))
+
+    def create_ingest_job(self, project_id: Optional[str], request: Dict[str, Any], owner: Optional[str] = None) -> str:
+        now = datetime.now(timezone.utc)
+        res = self.col_ingest_jobs.insert_one({
+            "project_id": project_id,
+            "request": request,
+            "status": "queued",
+            "stats": {},
+            "error": None,
+            "owner": owner,
+            "heartbeat_at": now,
+            "created_at": now,
+            "updated_at": now,
+        })
+        return str(res.inserted_id)
+
+    def update_ingest_job(self, job_id: str, fields: Dict[str, Any]):
+        from bson import ObjectId
+        fields = dict(fields, updated_at=datetime.now(timezone.utc))
+        self.col_ingest_jobs.update_one({"_id": ObjectId(job_id)}, {"$set": fields})
+
+    def get_ingest_job(self, job_id: str) -> Optional[Dict[str, Any]]:
+        from bson import ObjectId
+        try:
+            oid = ObjectId(job_id)
+        except Exception:
+            return None
+        return self.col_ingest_jobs.find_one({"_id": oid})
+
+    def heartbeat_ingest_jobs(self, owner: str) -> int:
+        """Renew the lease on the unfinished jobs held by ``owner``."""
+        res = self.col_ingest_jobs.update_many(
+            {"owner": owner, "status": {"$in": ["queued", "running"]}},
+            {"$set": {"heartbeat_at": datetime.now(timezone.utc)}},
+        )
+        return res.modified_count
+
+    def fail_stale_ingest_jobs(self, lease_seconds: float, error: str) -> int:
+        """
+        Mark unfinished jobs whose owner has not renewed their lease for
+        ``lease_seconds`` as failed. Jobs of live processes are left alone.
+        """
+        now = datetime.now(timezone.utc)
+        cutoff = now - timedelta(seconds=lease_seconds)
+        res = self.col_ingest_jobs.update_many(
+            {
+                "status": {"$in": ["queued", "running"]},
+                "$or": [
+                    {"heartbeat_at": {"$lt": cutoff}},
+                    {"heartbeat_at": {"$exists": False}, "created_at": {"$lt": cutoff}},
+                ],
+            },
+            {"$set": {"status": "failed", "error": error, "updated_at": now}},
+        )
+        return res.modified_count
+
+    def get_project_chunkers(self, project_id: Optional[str]) -> Optional[Dict[str, str]]:
+        """The chunker overrides last stored for a project, or None."""
+        doc = self.col_project_settings.find_one({"project_id": project_id}, projection={"chunkers": 1})
+        return (doc or {}).get("chunkers")
+
+    def set_project_chunkers(self, project_id: Optional[str], chunkers: Dict[str, str]):
+        self.col_project_settings.update_one(
+            {"project_id": project_id},
+            {"$set": {"chunkers": chunkers, "updated_at": datetime.now(timezone.utc)}},
+            upsert=True,
+        )
 
     def save_agent(self, doc: Dict[str, Any]) -> str:
         existing = self.col_agents.find_one({"name": doc.get("name")})
@@ -183,24 +488,16 @@ class MongoStore:
         Search for relevant past conversations using vector similarity.
         Returns conversations sorted by relevance (highest first).
         """
-        q = np.array(query_embedding, dtype=np.float32)
-        results: List[Tuple[Dict[str, Any], float]] = []
-
-        for conv in self.col_conversations.find({"user_id": user_id}):
-            emb = conv.get("query_embedding")
-            if not emb:
-                continue
-
-            if isinstance(emb, (bytes, bytearray)):
-                v = np.frombuffer(emb, dtype=np.float32)
-            else:
-                v = np.array(emb, dtype=np.float32)
-
-            denom = (np.linalg.norm(q) * np.linalg.norm(v) + 1e-8)
-            score = float(np.dot(q, v) / denom)
-
-            if score >= min_score:
-                results.append((conv, score))
-
-        results.sort(key=lambda x: x[1], reverse=True)
-        return [conv for conv, _ in results[:top_k]]
+        rows = list(
+            self.col_conversations.find(
+                {"user_id": user_id, "query_embedding": {"$exists": True}},
+                projection={"_id": 1, "query_embedding": 1},
+            ).batch_size(5000)
+        )
+        matrix, kept = embeddings_to_matrix([row.get("query_embedding") for row in rows])
+        hits = cosine_top_k(matrix, np.asarray(query_embedding), top_k, min_score=min_score)
+        if not hits:
+            return []
+        ids = [rows[kept[i]]["_id"] for i, _ in hits]
+        by_id = {conv["_id"]: conv for conv in self.col_conversations.find({"_id": {"$in": ids}})}
+        return [by_id[_id] for _id in ids if _id in by_id]
@@ -0,0 +1,48 @@
+from __future__ import annotations
+import asyncio
+import functools
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Optional, TypeVar
+from ..config import settings
+
+
+T = TypeVar("T")
+
+_cpu_pool: Optional[ThreadPoolExecutor] = None
+_io_pool: Optional[ThreadPoolExecutor] = None
+_pool_lock = threading.Lock()
+
+
+def cpu_pool() -> ThreadPoolExecutor:
+    """
+    Threads for compute in request handlers (FAISS search, PDF rendering,
+    local generation). numpy, FAISS, PyMuPDF and torch release the GIL, and
+    the models they use cannot be shared with a process pool.
+    """
+    global _cpu_pool
+    with _pool_lock:
+        if _cpu_pool is None:
+            workers = settings.api_cpu_workers or (os.cpu_count() or 1)
+            _cpu_pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="api-cpu")
+        return _cpu_pool
+
+
+def io_pool() -> ThreadPoolExecutor:
+    """Threads for blocking I/O in request handlers: pymongo, boto3, SMTP."""
+    global _io_pool
+    with _pool_lock:
+        if _io_pool is None:
+            _io_pool = ThreadPoolExecutor(max_workers=settings.api_io_workers, thread_name_prefix="api-io")
+        return _io_pool
+
+
+async def run_cpu(fn: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+    """Run ``fn`` on the CPU pool without blocking the event loop."""
+    return await asyncio.get_running_loop().run_in_executor(cpu_pool(), functools.partial(fn, *args, **kwargs))
+
+
+async def run_io(fn: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+    """Run ``fn`` on the I/O pool without blocking the event loop."""
+    return await asyncio.get_running_loop().run_in_executor(io_pool(), functools.partial(fn, *args, **kwargs))
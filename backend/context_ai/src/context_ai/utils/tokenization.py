@@ -1,6 +1,11 @@
 from __future__ import annotations
+import hashlib
 import re
-from typing import List
+import threading
+from bisect import bisect_left
+from collections import OrderedDict
+from typing import Dict, List, Optional, Sequence
+import numpy as np
 
 try:
     import tiktoken
@@ -9,100 +14,191 @@ except Exception:
     _ENC = None
 
 _WORD_RE = re.compile(r"\w+|[^\w\s]", re.UNICODE)
+_SENTENCE_END_RE = re.compile(r"[.!?][\"')\]]*\s+")
+_TERM_RE = re.compile(r"\w+", re.UNICODE)
+_MAX_TERM_LEN = 64
+
+# Texts up to this many characters have their token counts memoized; chunkers
+# count the same chunk text several times. Entries are keyed by a 16-byte
+# digest, so the memo never keeps the texts themselves alive.
+_MEMO_MAX_CHARS = 32768
+_MEMO_SIZE = 8192
+_memo: "OrderedDict[bytes, int]" = OrderedDict()
+_memo_lock = threading.Lock()
+
+
+def _heuristic_count(text: str) -> int:
+    return int(len(_WORD_RE.findall(text)) * 1.3)
+
+
+def encode_tokens(text: str) -> Optional[List[int]]:
+    """tiktoken ids of ``text`` (special-token markers are encoded as plain text), or None without tiktoken."""
+    if _ENC is None:
+        return None
+    try:
+        return _ENC.encode_ordinary(text)
+    except Exception:
+        return None
+
+
+def _memo_count(text: str) -> int:
+    key = hashlib.blake2b(text.encode("utf-8", errors="surrogatepass"), digest_size=16).digest()
+    with _memo_lock:
+        count = _memo.get(key)
+        if count is not None:
+            _memo.move_to_end(key)
+            return count
+    tokens = encode_tokens(text)
+    count = len(tokens) if tokens is not None else _heuristic_count(text)
+    with _memo_lock:
+        _memo[key] = count
+        while len(_memo) > _MEMO_SIZE:
+            _memo.popitem(last=False)
+    return count
+
+
+def token_upper_bound(text: str) -> Optional[int]:
+    """Cheap upper bound on the tiktoken count: BPE tokens span at least one UTF-8 byte.
+    Returns None without tiktoken, where the word heuristic has no such bound.
+    """
+    if _ENC is None:
+        return None
+    return len(text) if text.isascii() else len(text.encode("utf-8", errors="surrogatepass"))
+
+
+def fits_token_limit(text: str, max_tokens: int) -> bool:
+    """Whether ``text`` fits ``max_tokens``, skipping tokenization when the length bound settles it."""
+    bound = token_upper_bound(text)
+    if bound is not None and bound <= max_tokens:
+        return True
+    return approximate_token_count(text) <= max_tokens
+
 
 def approximate_token_count(text: str) -> int:
     """Approximate token count using tiktoken if available, otherwise fallback.
     The fallback uses a heuristic of ~1.3 tokens per word.
     """
-    if _ENC is not None:
+    if len(text) <= _MEMO_MAX_CHARS:
+        return _memo_count(text)
+    tokens = encode_tokens(text)
+    return len(tokens) if tokens is not None else _heuristic_count(text)
+
+
+def count_tokens_many(texts: Sequence[str]) -> List[int]:
+    """Token counts of many texts, encoded in one threaded tiktoken batch."""
+    if _ENC is None:
+        return [approximate_token_count(t) for t in texts]
+    counts: List[Optional[int]] = [None] * len(texts)
+    todo: List[int] = []
+    for i, t in enumerate(texts):
+        if t:
+            todo.append(i)
+        else:
+            counts[i] = 0
+    if todo:
         try:
-            return len(_ENC.encode(text))
+            batch = _ENC.encode_ordinary_batch([texts[i] for i in todo])
+            for i, tokens in zip(todo, batch):
+                counts[i] = len(tokens)
         except Exception:
-            pass
-    words = _WORD_RE.findall(text)
-    return int(len(words) * 1.3)
+            for i in todo:
+                counts[i] = approximate_token_count(texts[i])
+    return [int(c) for c in counts]  # type: ignore[arg-type]
+
+
+def chunk_token_counts(chunks: Sequence[Dict]) -> List[int]:
+    """Token counts of stored chunks, using ``metadata.token_count`` where present."""
+    counts = [(c.get("metadata") or {}).get("token_count") for c in chunks]
+    missing = [i for i, n in enumerate(counts) if not isinstance(n, int)]
+    if missing:
+        for i, n in zip(missing, count_tokens_many([chunks[i].get("text") or "" for i in missing])):
+            counts[i] = n
+    return counts  # type: ignore[return-value]
 
 
 def split_by_token_limit(text: str, max_tokens: int, overlap: int = 50) -> List[str]:
     """
     Split text into chunks respecting a token budget with intelligent overlap.
-    Improved to prefer splitting on sentence/paragraph boundaries when possible.
+    Windows are snapped back to the last paragraph break, line break or
+    sentence end in their second half, and chunks are slices of ``text``.
+    Token offsets are computed once with tiktoken, or from word spans scaled
+    by the ~1.3 tokens-per-word heuristic without it.
     """
     if max_tokens <= 0:
         return [text]
-    
-    if approximate_token_count(text) <= max_tokens:
+
+    bound = token_upper_bound(text)
+    if bound is not None and bound <= max_tokens:
         return [text]
-    
-    tokens = []
-    if _ENC is not None:
-        try:
-            tokens = _ENC.encode(text)
-        except Exception:
-            tokens = []
-    
-    if not tokens:
-        paragraphs = text.split('\n\n')
-        if len(paragraphs) > 1:
-            chunks = []
-            current_chunk = []
-            current_tokens = 0
-            
-            for para in paragraphs:
-                para_tokens = approximate_token_count(para)
-                
-                if current_tokens + para_tokens <= max_tokens:
-                    current_chunk.append(para)
-                    current_tokens += para_tokens
-                else:
-                    if current_chunk:
-                        chunks.append('\n\n'.join(current_chunk))
-                    
-                    if para_tokens > max_tokens:
-                        sub_chunks = _split_text_by_words(para, max_tokens, overlap)
-                        chunks.extend(sub_chunks)
-                        current_chunk = []
-                        current_tokens = 0
-                    else:
-                        if chunks and overlap > 0:
-                            overlap_text = chunks[-1][-overlap*2:]
-                            current_chunk = [overlap_text, para]
-                            current_tokens = approximate_token_count(overlap_text) + para_tokens
-                        else:
-                            current_chunk = [para]
-                            current_tokens = para_tokens
-            
-            if current_chunk:
-                chunks.append('\n\n'.join(current_chunk))
-            
-            return chunks if chunks else [text]
-        
-        return _split_text_by_words(text, max_tokens, overlap)
-
-    chunks = []
-    start = 0
-    while start < len(tokens):
-        end = min(start + max_tokens, len(tokens))
-        chunk = _ENC.decode(tokens[start:end])
-        chunks.append(chunk)
-        step = max(max_tokens - overlap, max_tokens // 2, 1)
-        start += step
-    return chunks
-
-
-def _split_text_by_words(text: str, max_tokens: int, overlap: int) -> List[str]:
-    """Helper to split text by words when tiktoken unavailable."""
-    words = text.split()
-    chunks = []
-    start = 0
-    approx_ratio = 1.3
-    max_words = max(int(max_tokens / approx_ratio), 1)
-    ovlp_words = max(int(overlap / approx_ratio), 0)
-    
-    while start < len(words):
-        end = min(start + max_words, len(words))
-        chunks.append(" ".join(words[start:end]))
-        step = max(max_words - ovlp_words, 1)
-        start += step
-    
-    return chunks
+
+    # Encode once and reuse the ids both to test the fit and to cut windows.
+    tokens = encode_tokens(text)
+    if tokens is not None:
+        if len(tokens) <= max_tokens:
+            return [text]
+        return _split_at_offsets(text, _token_char_offsets(text, tokens), max_tokens, overlap)
+
+    offsets = [m.start() for m in _WORD_RE.finditer(text)]
+    if int(len(offsets) * 1.3) <= max_tokens:
+        return [text]
+    return _split_at_offsets(text, offsets, max(int(max_tokens / 1.3), 1), int(overlap / 1.3))
+
+
+def _token_char_offsets(text: str, tokens: List[int]) -> List[int]:
+    """Character offset in ``text`` at which each token starts, without decoding text.
+    A token starting inside a multi-byte character maps to the next character.
+    """
+    lengths = np.fromiter(map(len, _ENC.decode_tokens_bytes(tokens)), dtype=np.int64, count=len(tokens))
+    byte_starts = np.concatenate(([0], np.cumsum(lengths)[:-1]))
+    if text.isascii():
+        return byte_starts.tolist()
+    raw = np.frombuffer(text.encode("utf-8", errors="surrogatepass"), dtype=np.uint8)
+    # Characters started before each byte: count bytes that are not UTF-8 continuations.
+    char_index = np.concatenate(([0], np.cumsum((raw & 0xC0) != 0x80)))
+    return char_index[byte_starts].tolist()
+
+
+def _boundary(text: str, lo: int, hi: int) -> int:
+    """End of the last paragraph break, line break or sentence in ``text[lo:hi]``, or -1."""
+    for sep in ("\n\n", "\n"):
+        i = text.rfind(sep, lo, hi)
+        if i != -1:
+            return i + len(sep)
+    end = -1
+    for m in _SENTENCE_END_RE.finditer(text, lo, hi):
+        end = m.end()
+    return end
+
+
+def _split_at_offsets(text: str, offsets: List[int], max_units: int, overlap: int) -> List[str]:
+    """Cut ``text`` into windows of at most ``max_units`` units starting at ``offsets``."""
+    n = len(offsets)
+    starts = offsets + [len(text)]
+    chunks: List[str] = []
+    s = 0
+    while s < n:
+        e = min(s + max_units, n)
+        if e < n:
+            lo = starts[s + max(1, max_units // 2)]
+            cut = _boundary(text, lo, starts[e])
+            if cut > lo:
+                e = max(bisect_left(starts, cut, s + 1, e), s + 1)
+        piece = text[(starts[s] if s else 0):(starts[e] if e < n else len(text))]
+        if piece.strip():
+            chunks.append(piece)
+        if e >= n:
+            break
+        nxt = max(e - min(overlap, (e - s) // 2), s + 1)
+        # Start the overlap on a fresh line when one begins inside it.
+        nl = text.find("\n", starts[nxt], starts[e])
+        if nl != -1:
+            nxt = min(bisect_left(starts, nl + 1, nxt, e), e)
+        s = nxt
+    return chunks or [text]
+
+
+def lexical_terms(text: str) -> List[str]:
+    """Lower-cased word terms used by the BM25 lexical index.
+    Terms contain only word characters, so they are safe as Mongo field names.
+    """
+    return [t for t in _TERM_RE.findall(text.lower()) if len(t) <= _MAX_TERM_LEN]
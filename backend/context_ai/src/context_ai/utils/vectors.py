@@ -0,0 +1,84 @@
+from __future__ import annotations
+from typing import List, Optional, Sequence, Tuple
+import numpy as np
+
+
+def embeddings_to_matrix(embeddings: Sequence[object]) -> Tuple[np.ndarray, List[int]]:
+    """Stack stored embeddings into one contiguous float32 matrix.
+    Embeddings are raw float32 bytes (as written by ``MongoStore``) or lists of
+    floats. Returns the matrix and the positions of the inputs it holds, since
+    missing or mis-sized embeddings are skipped.
+    """
+    positions = [i for i, e in enumerate(embeddings) if e is not None and len(e) > 0]
+    if not positions:
+        return np.zeros((0, 0), dtype=np.float32), []
+
+    first = embeddings[positions[0]]
+    if isinstance(first, (bytes, bytearray)) and all(
+        isinstance(embeddings[i], (bytes, bytearray)) and len(embeddings[i]) == len(first) for i in positions
+    ):
+        buf = b"".join(bytes(embeddings[i]) for i in positions)
+        return np.frombuffer(buf, dtype=np.float32).reshape(len(positions), -1), positions
+
+    vecs: List[np.ndarray] = []
+    kept: List[int] = []
+    dim: Optional[int] = None
+    for i in positions:
+        e = embeddings[i]
+        v = np.frombuffer(e, dtype=np.float32) if isinstance(e, (bytes, bytearray)) else np.asarray(e, dtype=np.float32)
+        if dim is None:
+            dim = v.shape[0]
+        if v.shape[0] != dim:
+            continue
+        vecs.append(v)
+        kept.append(i)
+    return np.ascontiguousarray(np.vstack(vecs), dtype=np.float32), kept
+
+
+def normalize_rows(matrix: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    return matrix / (norms + 1e-8)
+
+
+def cosine_top_k(matrix: np.ndarray, query: np.ndarray, top_k: int, min_score: Optional[float] = None) -> List[Tuple[int, float]]:
+    """Row indices and cosine scores of the ``top_k`` rows most similar to ``query``, best first."""
+    if matrix.size == 0 or top_k <= 0:
+        return []
+    q = np.asarray(query, dtype=np.float32).reshape(-1)
+    q = q / (np.linalg.norm(q) + 1e-8)
+    scores = normalize_rows(matrix) @ q
+    k = min(top_k, scores.shape[0])
+    top = np.argpartition(-scores, k - 1)[:k]
+    top = top[np.argsort(-scores[top], kind="stable")]
+    out = [(int(i), float(scores[i])) for i in top]
+    if min_score is not None:
+        out = [(i, s) for i, s in out if s >= min_score]
+    return out
+
+
+def mmr_select(matrix: np.ndarray, relevance: np.ndarray, k: int, lambda_: float) -> List[int]:
+    """Greedy Maximal Marginal Relevance over row vectors.
+    Each step picks the row maximising ``lambda_ * relevance - (1 - lambda_) *
+    max cosine similarity to the rows already picked``. Relevance is divided
+    by its maximum first so both terms share a comparable scale. Returns row
+    indices in selection order.
+    """
+    n = matrix.shape[0]
+    k = min(k, n)
+    if k <= 0:
+        return []
+    rel = np.asarray(relevance, dtype=np.float32)
+    top = float(rel.max())
+    rel = rel / top if top > 0 else np.ones_like(rel)
+    unit = normalize_rows(np.asarray(matrix, dtype=np.float32))
+    max_sim = np.zeros(n, dtype=np.float32)
+    available = np.ones(n, dtype=bool)
+    selected: List[int] = []
+    for _ in range(k):
+        scores = lambda_ * rel - (1.0 - lambda_) * max_sim
+        scores[~available] = -np.inf
+        i = int(np.argmax(scores))
+        selected.append(i)
+        available[i] = False
+        np.maximum(max_sim, unit @ unit[i], out=max_sim)
+    return selected
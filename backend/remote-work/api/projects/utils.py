@@ -2,6 +2,8 @@
 from django.core.mail import send_mail
 from django.conf import settings
 from ..auth.models import User
+import os
+import tempfile
 import threading
 from mongoengine.queryset.visitor import Q
 from rest_framework.exceptions import AuthenticationFailed
@@ -136,3 +138,85 @@ def setup_project_calendar(project, user):
 def serialize_basic_users(users):
     return {str(u.id): u.username for u in users}
 
+
+# -------------------------------------------------------
+# GitHub Import Utilities
+# -------------------------------------------------------
+# Keep in step with INGEST_SKIP_DIRS of the context_ai service, which skips the
+# same directories when it ingests the archive.
+GITHUB_IMPORT_SKIP_DIRS = {
+    'node_modules', '.git', 'vendor', 'dist', 'build', '__pycache__',
+    '.venv', 'venv', '.tox', '.mypy_cache', '.pytest_cache', '.next', 'bower_components',
+}
+
+GITHUB_IMPORT_BINARY_EXTENSIONS = {
+    '.png', '.jpg', '.jpeg', '.gif', '.bmp', '.ico', '.webp', '.tiff', '.psd',
+    '.mp3', '.mp4', '.wav', '.ogg', '.mov', '.avi', '.webm',
+    '.zip', '.gz', '.tgz', '.bz2', '.xz', '.7z', '.rar', '.tar', '.jar', '.war',
+    '.exe', '.dll', '.so', '.dylib', '.o', '.a', '.lib', '.bin', '.class', '.pyc', '.pyo', '.wasm',
+    '.woff', '.woff2', '.ttf', '.otf', '.eot',
+    '.sqlite', '.db', '.pkl', '.npy', '.npz', '.h5', '.pt', '.onnx',
+}
+
+# Bytes read from the start of an entry to tell text from binary content.
+GITHUB_IMPORT_SNIFF_BYTES = 8192
+
+
+def is_importable_repo_path(inner_path):
+    """
+    Whether a path inside a repository archive is worth importing:
+    skips vendored/build directories and known binary extensions.
+    """
+    parts = inner_path.split('/')
+    if any(p in GITHUB_IMPORT_SKIP_DIRS for p in parts[:-1]):
+        return False
+    ext = os.path.splitext(parts[-1])[1].lower()
+    return ext not in GITHUB_IMPORT_BINARY_EXTENSIONS
+
+
+def looks_binary(head):
+    """A NUL byte in the first bytes of a file marks it as binary."""
+    return b'\0' in head
+
+
+class PrefixedReader:
+    """
+    Read-only stream that returns ``head`` (bytes already read from
+    ``stream``) before the rest of ``stream``, so an entry can be sniffed
+    and then uploaded without opening it a second time. Reads return the
+    full requested size until the end of the stream.
+    """
+
+    def __init__(self, head, stream):
+        self._head = head
+        self._stream = stream
+
+    def readable(self):
+        return True
+
+    def read(self, size=-1):
+        if size is None or size < 0:
+            data, self._head = self._head + self._stream.read(), b''
+            return data
+        data, self._head = self._head[:size], self._head[size:]
+        if len(data) < size:
+            data += self._stream.read(size - len(data))
+        return data
+
+
+def spool_response(resp, chunk_size=1024 * 1024, suffix='.zip'):
+    """
+    Copy a streamed HTTP response into a named temp file, chunk by chunk,
+    so large downloads never sit in memory. Returns the file's path; the
+    caller removes it.
+    """
+    fd, path = tempfile.mkstemp(suffix=suffix)
+    try:
+        with os.fdopen(fd, 'wb') as spool:
+            for block in resp.iter_content(chunk_size=chunk_size):
+                if block:
+                    spool.write(block)
+    except Exception:
+        os.remove(path)
+        raise
+    return path
@@ -23,12 +23,13 @@ from ..file_sharing.views import get_s3_client
 from mongoengine.errors import DoesNotExist, ValidationError as MongoValidationError
 from mongoengine.queryset.visitor import Q
 
+import logging
 import requests
-import io
 import zipfile
 import mimetypes
 import os
 import threading
+from concurrent.futures import ThreadPoolExecutor
 
 from .utils import (
     prepare_invited_members,
@@ -38,11 +39,18 @@ from .utils import (
     mark_project_invitations_as_read,
     serialize_basic_users,
     setup_project_calendar,
+    is_importable_repo_path,
+    looks_binary,
+    spool_response,
+    PrefixedReader,
+    GITHUB_IMPORT_SNIFF_BYTES,
     send_invitations_background,
 )
 from ..utils import ERROR_AUTH_HEADER_MISSING, ERROR_INVALID_AUTH_HEADER, ERROR_INVALID_TOKEN
 from ..utils import authenticate_user_from_request
 
+logger = logging.getLogger(__name__)
+
 PROJECT_NOT_FOUND_ERROR = "Project not found"
 
 
@@ -450,8 +458,7 @@ class ProjectViewSet(viewsets.ViewSet):
             if resp.status_code >= 400:
                 return Response({"error": f"GitHub responded with {resp.status_code}: {resp.text}"}, status=400)
 
-            content = io.BytesIO(resp.content)
-            z = zipfile.ZipFile(content)
+            archive_path = spool_response(resp)
         except Exception as e:
             return Response({"error": f"Failed to download or open repository archive: {str(e)}"}, status=400)
 
@@ -459,78 +466,153 @@ class ProjectViewSet(viewsets.ViewSet):
             s3_client = get_s3_client()
             bucket_name = getattr(settings, 'AWS_STORAGE_BUCKET_NAME', None)
             if not bucket_name:
+                os.remove(archive_path)
                 return Response({"error": "AWS_STORAGE_BUCKET_NAME is not configured"}, status=500)
         except Exception as e:
+            os.remove(archive_path)
             return Response({"error": f"S3 client initialization failed: {str(e)}"}, status=500)
 
-        uploaded = []
         prefix_base = f"files/{str(project.id)}/github/{owner}_{repo_name}"
 
+        try:
+            z = zipfile.ZipFile(archive_path)
+        except Exception as e:
+            os.remove(archive_path)
+            return Response({"error": f"Failed to download or open repository archive: {str(e)}"}, status=400)
+
+        def _call_ingest(project_id, path, source_prefix):
+            # Hand the archive to the context service directly so it chunks the
+            # bytes already in hand instead of downloading every object back
+            # from S3, and keep the job id so the import can be tracked through
+            # GET /ingest/{job_id}.
+            try:
+                with open(path, 'rb') as fh:
+                    resp = requests.post(
+                        'http://localhost:5000/ingest/archive',
+                        data={'project_id': str(project_id), 'source_prefix': source_prefix},
+                        files={'archive': (f"{owner}_{repo_name}.zip", fh, 'application/zip')},
+                        timeout=120,
+                    )
+                resp.raise_for_status()
+                job_id = resp.json().get('job_id')
+                if job_id:
+                    Project.objects(id=project_id).update(set__github_import_metadata__ingest_job_id=job_id)
+            except Exception as e:
+                pass
+            finally:
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+
+        # Ingest runs alongside the S3 uploads below, which are for storage only.
+        # The ingest thread owns the spooled archive and removes it when done.
+        ingest_started = False
+        try:
+            t = threading.Thread(target=_call_ingest, args=(project.id, archive_path, f"s3://{bucket_name}/{prefix_base}"))
+            t.daemon = True
+            t.start()
+            ingest_started = True
+        except Exception as e:
+            pass
+
+        entries = []
         for zi in z.infolist():
             if zi.is_dir():
                 continue
-            filename = zi.filename
-            parts = filename.split('/', 1)
+            parts = zi.filename.split('/', 1)
             inner_path = parts[1] if len(parts) > 1 else parts[0]
-            if not inner_path or inner_path.endswith('/'):
+            if not inner_path or inner_path.endswith('/') or not is_importable_repo_path(inner_path):
                 continue
+            entries.append((zi, inner_path))
 
+        def _upload_entry(entry):
+            zi, inner_path = entry
             s3_key = f"{prefix_base}/{inner_path}"
-
+            name = os.path.basename(inner_path)
+            content_type = mimetypes.guess_type(name)[0] or 'application/octet-stream'
             try:
+                # Sniff and upload from one pass over the entry, so it is only decompressed once.
                 with z.open(zi) as fh:
-                    name = os.path.basename(inner_path)
-                    content_type = mimetypes.guess_type(name)[0] or 'application/octet-stream'
-
-                    s3_client.upload_fileobj(fh, bucket_name, s3_key, ExtraArgs={'ContentType': content_type})
-
-                    file_obj = File(
-                        name=name,
-                        s3_key=s3_key,
-                        file_size=zi.file_size,
-                        content_type=content_type,
-                        uploaded_by=user,
-                        project=project,
-                    )
-                    file_obj.save()
-
-                    uploaded.append({
-                        'file_name': name,
-                        's3_key': s3_key,
-                        's3_uri': f"s3://{bucket_name}/{s3_key}",
-                        'size': zi.file_size,
-                        'content_type': content_type,
-                    })
-            except Exception as e:
-                continue
-
+                    head = fh.read(GITHUB_IMPORT_SNIFF_BYTES)
+                    if looks_binary(head):
+                        return None
+                    s3_client.upload_fileobj(PrefixedReader(head, fh), bucket_name, s3_key, ExtraArgs={'ContentType': content_type})
+            except Exception:
+                return None
+            return {
+                'file_name': name,
+                's3_key': s3_key,
+                's3_uri': f"s3://{bucket_name}/{s3_key}",
+                'size': zi.file_size,
+                'content_type': content_type,
+            }
+
+        # zipfile serializes reads of the shared archive handle, so entries can
+        # be decompressed and uploaded from several threads at once.
+        workers = getattr(settings, 'GITHUB_IMPORT_UPLOAD_WORKERS', 8)
         try:
-            project.github_imported = True
-            project.github_import_date = timezone.now()
-            project.github_repo_name = f"{owner}/{repo_name}"
-            project.github_repo_url = repo_url
-            project.github_import_metadata = {'imported_count': len(uploaded)}
-            project.save()
+            with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+                uploaded = [u for u in pool.map(_upload_entry, entries) if u]
+        finally:
+            z.close()
+            if not ingest_started:
+                os.remove(archive_path)
+
+        # Only files with a stored record count as imported; a failed bulk
+        # insert falls back to saving the records that did not make it.
+        failed = []
+        if uploaded:
+            records = [
+                File(
+                    name=u['file_name'],
+                    s3_key=u['s3_key'],
+                    file_size=u['size'],
+                    content_type=u['content_type'],
+                    uploaded_by=user,
+                    project=project,
+                )
+                for u in uploaded
+            ]
+            try:
+                File.objects.insert(records, load_bulk=False)
+            except Exception:
+                logger.exception("Bulk insert of %d imported file records failed for project %s", len(records), project.id)
+                try:
+                    stored = set(File.objects(project=project, s3_key__in=[u['s3_key'] for u in uploaded]).distinct('s3_key'))
+                except Exception:
+                    stored = set()
+                saved = []
+                for u, record in zip(uploaded, records):
+                    if u['s3_key'] not in stored:
+                        try:
+                            record.save()
+                        except Exception:
+                            logger.exception("Could not store file record for %s", u['s3_key'])
+                            failed.append(u)
+                            continue
+                    saved.append(u)
+                uploaded = saved
+
+        # Update fields in place: the ingest thread may already have stored
+        # its job id under github_import_metadata.
+        try:
+            project.update(
+                set__github_imported=True,
+                set__github_import_date=timezone.now(),
+                set__github_repo_name=f"{owner}/{repo_name}",
+                set__github_repo_url=repo_url,
+                set__github_import_metadata__imported_count=len(uploaded),
+            )
         except Exception:
             pass
 
-        s3_uris = [u['s3_uri'] for u in uploaded]
-
-        def _call_ingest(project_id, uris):
-            try:
-                requests.post('http://localhost:5000/ingest', json={'project_id': str(project_id), 's3_uris': uris}, timeout=30)
-            except Exception as e:
-                pass
-
-        if s3_uris:
-            try:
-                t = threading.Thread(target=_call_ingest, args=(project.id, s3_uris))
-                t.daemon = True
-                t.start()
-            except Exception as e:
-                pass
-
-        return Response({"message": "Import completed", "files": uploaded, "ingest_started": bool(s3_uris)}, status=201)
+        return Response({
+            "message": "Import completed",
+            "files": uploaded,
+            "failed_files": [u['s3_key'] for u in failed],
+            "ingest_started": ingest_started,
+        }, status=201)
 
         # ---------------------------------------------------------
         # 1. Notify all members (accepted + invited + leader)